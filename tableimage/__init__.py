@@ -2,39 +2,27 @@
 Module for converting images into HTML tables with (or without) CSS. Because why not?
 """
 from . import data
+from . import stats
 from ._typing import *
+import array
+import functools
+import heapq
+import io
+import itertools
 import string
 import random
 
 
 class _Node:
-    def __init__(self, contents: Union[List["_Node"], Any], branch_prefix: str):
+    def __init__(self, contents: Union[List["_Node"], Any], is_leaf: bool):
         """
-        branch_prefix is the prefix to this node on the tree.
-        contents is either a list of subnodes or a value.
-        Note that branch_prefix is used to update the prefixes of subnodes.
+        contents is either a list of subnodes or, if is_leaf is True, a value.
         """
-        self._prefix = branch_prefix
         self._contents = contents
+        self._is_leaf = is_leaf
 
-    def _sub_prepend_prefix(self, prefix: str):
-        """
-        Tell all the subnodes to add a prefix onto their current prefix.
-        """
-        if isinstance(self._contents, list):
-            for c in self._contents:
-                if isinstance(c, _Node):
-                    c.prepend_prefix(prefix)
-
-    def prepend_prefix(self, prefix: str):
-        """
-        Tell this to prepend a prefix to its prefix, and tell this to tell its children nodes to do the same.
-        """
-        self._prefix = prefix + self._prefix
-        self._sub_prepend_prefix(prefix)
-
-    def get_prefix(self) -> str:
-        return self._prefix
+    def is_leaf(self) -> bool:
+        return self._is_leaf
 
     def get_contents_or_subnodes(self) -> Union[List["_Node"], Any]:
         """
@@ -46,152 +34,565 @@ class _Node:
 def _encoding(count: Dict[T, int], alphabet: str="01") -> Dict[T, str]:
     """
     Use the Huffman tree algorithm to generate an encoding from a set of counts.
-    Duplicate characters in the alphabet are removed.
+    Duplicate characters in the alphabet are removed. The alphabet must have at least two distinct characters.
+
+    The tree is built with a heap, and the code words are assigned in one pass down the finished tree, so this takes 
+    O(n log n) time for n counts. Ties between equal weights are broken by the order of count, so the result is deterministic.
     """
-    
-    # Remove duplicates
-    alphabet = "".join(set((a for a in alphabet))) 
-    
-    # Generate nodes for the actual encoded colours in a tuple with their weight.
-    queue = list((_Node(contents=item[0], branch_prefix=""), item[1]) for item in count.items())
-
-    # Extract them so we do not have to search later
-    leaf_nodes = list(item[0] for item in queue)
-
-    while len(queue) > 1:
-        queue.sort(key=lambda item: item[1], reverse=True)  # End bits have lowest weights.
-        # Remove the end parts of the queue so each part can be assigned a letter in the alphabet.
-        if len(queue) > len(alphabet):
-            # Split 'n pop
-            queue, assigning_nodes = queue[:-len(alphabet)], queue[-len(alphabet):]
-        else: # make q empty
-            queue, assigning_nodes = [], queue
-        new_weight = sum(item[1] for item in assigning_nodes)
-        
-        # Now to give all the assigned nodes prefixes, associated with the provided alphabet:
-        for i in range(len(assigning_nodes)):
-            assigning_nodes[i][0].prepend_prefix(alphabet[i])
-
-        # Create a new node on the queue with the cumulative weight.
-        queue.append((_Node(list(item[0] for item in assigning_nodes), ""), new_weight))
-    
-    # Go through the initial nodes and combine their contents with prefixes to create a mapping.
-    mapping = {}
-    for node in leaf_nodes:
-        mapping[node.get_contents_or_subnodes()] = node.get_prefix()
-    return mapping
+    # Remove duplicates, keeping the order so the same alphabet always gives the same encoding.
+    alphabet = "".join(dict.fromkeys(alphabet))
+    if len(alphabet) < 2:
+        raise ValueError("alphabet must contain at least two distinct characters")
+    if len(count) <= 1:
+        return {item: alphabet[0] for item in count}
+
+    # Generate nodes for the actual encoded colours in a tuple with their weight and a tie-breaker, so nodes are never compared.
+    heap = [(weight, order, _Node(item, True)) for order, (item, weight) in enumerate(count.items())]
+    heapq.heapify(heap)
+    order = len(heap)
+
+    # Every merge replaces len(alphabet) nodes with one, so the tree is only full if (leaves - 1) is a multiple of 
+    # (len(alphabet) - 1). If it is not, the first merge takes fewer nodes, which keeps the code lengths optimal (this is the 
+    # same as padding the counts with zero-weight dummies).
+    merge_size = 2 + (len(heap) - 2) % (len(alphabet) - 1)
+    while len(heap) > 1:
+        merging = [heapq.heappop(heap) for _ in range(merge_size)]
+        # Heaviest first, so it gets the first letter of the alphabet.
+        merging.reverse()
+        heapq.heappush(heap, (sum(item[0] for item in merging), order, _Node(list(item[2] for item in merging), False)))
+        order += 1
+        merge_size = len(alphabet)
+
+    # Go down the tree, giving each subnode its parent's code word plus its letter of the alphabet.
+    codes = {}
+    stack = [(heap[0][2], "")]
+    while len(stack) > 0:
+        node, prefix = stack.pop()
+        if node.is_leaf():
+            codes[node.get_contents_or_subnodes()] = prefix
+        else:
+            for letter, subnode in zip(alphabet, node.get_contents_or_subnodes()):
+                stack.append((subnode, prefix + letter))
+
+    # Keep the mapping in the same order as the counts.
+    return {item: codes[item] for item in count}
 
 
-def _to_palette(rowlist: List[Union[Tuple[int, data.RGB], data.RowDivider]]) -> Dict[data.RGB, str]:
+def _count_colours(rowlist: data.RowList) -> Dict[data.RGB, int]:
     """
-    Turn an image specified by rowlist format into a string based palette of colours.
+    Count how many pixels of each colour an image specified by rowlist format (or a data.RunTable) has.
     """
+    if isinstance(rowlist, data.RunTable):
+        return rowlist.colour_counts()
+
     count = {}
     for item in rowlist:
         if not isinstance(item, data.RowDivider):
             if not item[1] in count.keys():
                 count[item[1]]=0
             count[item[1]] += item[0]
+    return count
+
 
+def _counts_to_palette(count: Dict[data.RGB, int]) -> Dict[data.RGB, str]:
+    """
+    Turn a set of colour counts into a string based palette of colours.
+    """
     # Huffman tree based mapping over the upper and lowercase characters...
     return _encoding(count, string.ascii_letters)
 
 
-def rgb_to_html(colour: data.RGB) -> str:
+def _to_palette(rowlist: data.RowList) -> Dict[data.RGB, str]:
+    """
+    Turn an image specified by rowlist format (or a data.RunTable) into a string based palette of colours.
+    """
+    return _counts_to_palette(_count_colours(rowlist))
+
+
+def _iter_rows(rowlist: data.RowList) -> Iterator[List[Tuple[int, data.RGB]]]:
+    """
+    Turn the linear rowlist (or a data.RunTable) into a sequence of rows, each being a list of (count, colour) tuples.
+    """
+    if isinstance(rowlist, data.RunTable):
+        yield from rowlist.iterrows()
+        return
+
+    currow = []
+    for subrow in rowlist:
+        # We know rowlists always have data where a RowDivider is at the end.
+        if isinstance(subrow, data.RowDivider):
+            yield currow
+            currow = []
+        else:
+            currow.append(subrow)
+
+
+def rgb_to_html(colour: data.RGB, shorten: bool=False) -> str:
     """
-    Convert an RGB triplet into a HTML colour of the form "#ff0054" (or the 3-digit version if it can be shortened, maybe, but not right now)
+    Convert an RGB triplet into a HTML colour of the form "#ff0054", or if shorten is set, the 3-digit version (like "#f05" for 
+    "#ff0055") when the colour can be shortened.
 
     Out of range numbers will be clamped.
     """
     colour = tuple(min(max(0, a), 255) for a in colour)
+    # Each component can be shortened if both its hex digits are the same, i.e. it is a multiple of 0x11.
+    if shorten and all(component % 0x11 == 0 for component in colour):
+        return "#" + "".join(format(component // 0x11, 'x') for component in colour)
     # Format to 2 hex digits with 0s padding
     htmlcolour = "#" + "".join(format(component, '02x') for component in colour)
-    # TODO: Implement shortened htmlcolour 
     return htmlcolour
 
 
-def rowlist_to_html_css(rowlist: List[Union[Tuple[int, data.RGB], data.RowDivider]], no_css: bool=False, 
-        pixel_size: int=3) -> Tuple[str, str]:
+def _sink_writer(sink: Any) -> Callable[[str], Any]:
     """
-    Turn a list of colour rows as specified by data.PixelAccess.getcontiguousrows into a pair of strings which 
-    contain html and css code, respectively.
+    Get a function which writes a string to sink. Binary sinks (files opened with 'b', io.BytesIO, etc.) get UTF-8 encoded 
+    bytes, anything else gets the string as-is.
+    """
+    mode = getattr(sink, 'mode', None)
+    if isinstance(sink, (io.RawIOBase, io.BufferedIOBase)) or (isinstance(mode, str) and 'b' in mode):
+        return lambda text: sink.write(text.encode('utf-8'))
+    return sink.write
 
-    pixel_size is how many html pixels each image pixel takes up in the x and y axis.
 
-    If no_css is set to True, NO css will be used (probably inflating the size massively), and the border/styling/colour/etc will be 
-    directly injected into the HTML with style="...". This will most likely produce a MUCH bigger file. Also, CSS is 
-    more compatible when using HTML5.
+def random_table_id() -> str:
+    """
+    Generate a random id for a table, so that its CSS can target it without wrecking the rest of a page.
     """
-    # Get a mapping/stringpalette:
-    palette = _to_palette(rowlist)
+    return "".join([random.choice(string.ascii_letters) for _ in range(16)])
 
-    # Turn the linear rowlist into a 2d set of rows.
-    page_rows = []
-    currow = []
-    for subrow in rowlist:
-        # We know rowlists always have data where a RowDivider is at the end.
-        if subrow == data.RowDivider():
-            page_rows.append(currow)
-            currow = []
-        else:
-            currow.append(subrow)
 
-    html = ""
-    css = ""
+def _attribute_value(value: str) -> str:
+    """
+    Get the shortest valid form of an attribute value, which is without quotes unless it has characters that need them.
+    """
+    if value and not any(character in value for character in ' \t\n\f\r"\'=<>`'):
+        return value
+    return '"{}"'.format(value.replace('"', '&quot;'))
 
+
+def _table_start(no_css: bool, table_id: str, minify: bool=False, width: int=0, pixel_size: int=3, 
+        table_class: Optional[str]=None) -> str:
+    """
+    Get the opening tag of a table. When minifying, it is followed by a <col> setting the width of all width columns, rather 
+    than setting the width on every cell. table_class is the class of a shared stylesheet the table uses, if any.
+    """
+    if minify:
+        span = ' span={!s}'.format(width) if width > 1 else ''
+        if no_css:
+            start = '<table style=table-layout:fixed;border:0;border-spacing:0>'
+            col = '<col style=width:{!s}px{}>'.format(pixel_size, span)
+        else:
+            start = '<table style=table-layout:fixed;border:0;border-spacing:0 id={}{}>'.format(
+                _attribute_value(table_id), ' class=' + _attribute_value(table_class) if table_class is not None else ''
+            )
+            col = '<col{}>'.format(span)
+        return start + col if width > 0 else start
     # No CSS means Loads'a HTML. Good Luck...
     if no_css:
-        html += '<table style="table-layout:fixed;border:0;border-spacing:0;">\n'
-        
-        for row in page_rows:
-            html += '<tr style="height:{!s}px;">\n'.format(pixel_size)
-            for colour_row in row:
-                count, colour = colour_row
-                if count <= 1:
-                    html += '<td style="background:{};width:{!s}px;"/>\n'.format(rgb_to_html(colour), count*pixel_size)
-                else:  # We need colspan
-                    html += '<td style="background:{};width:{!s}px;" colspan="{!s}"/>\n'.format(
-                            rgb_to_html(colour), 
-                            count*pixel_size,
-                            count
-                    )
-                 
-            html += '</tr>\n'
-        html += '</table>\n'
-    else:  # Generate CSS and HTML. Should be fun!
-        table_unique_id = "".join([random.choice(string.ascii_letters) for _ in range(16)])
-
-        # First create a table with the random ID, so we can use targeted CSS rather than wrecking a page.
-        html += '<table style="table-layout:fixed;border:0;border-spacing:0;" id="{}">\n'.format(table_unique_id)
-
-        # Then we can just make tr's with no style property - height can be managed later in CSS.
-        for row in page_rows:
-            html += '<tr>\n'
-            for count, colour in row:
-                # Time to use that mapping we made...
-                clazz = palette[colour]
-                if count <= 1:
-                    html += '<td style="width:{!s}px;" class="{}"/>\n'.format(count*pixel_size, clazz)
-                else:
-                    html += '<td style="width:{!s}px;" class="{}" colspan="{!s}"/>\n'.format(
-                            count*pixel_size,
-                            clazz,
-                            count
-                    )
-            html += '</tr>\n'
-        html += '</table>\n'
+        return '<table style="table-layout:fixed;border:0;border-spacing:0;">\n'
+    # Create a table with the random ID, so we can use targeted CSS rather than wrecking a page.
+    if table_class is not None:
+        return '<table style="table-layout:fixed;border:0;border-spacing:0;" id="{}" class="{}">\n'.format(table_id, table_class)
+    return '<table style="table-layout:fixed;border:0;border-spacing:0;" id="{}">\n'.format(table_id)
+
+
+def _rowspans(rows: Iterable[List[Tuple[int, data.RGB]]]) -> List[List[int]]:
+    """
+    Work out how to merge vertically adjacent runs which start at the same column, and have the same length and colour, into 
+    single cells with a rowspan. Returns a list for each row with the rowspan of each run, where 0 means the run is covered by a 
+    cell from a row above it and is not rendered.
+
+    Each row is only compared with the row above it using a dictionary, so this takes time linear in the number of runs.
+    """
+    spans = []
+    # (start column, count, colour) -> (row, index) of the cell covering the run on the previous row.
+    previous = {}
+    for y, row in enumerate(rows):
+        row_spans = [1] * len(row)
+        current = {}
+        start = 0
+        for index, (count, colour) in enumerate(row):
+            key = (start, count, colour)
+            cell = previous.get(key)
+            if cell is not None:  # Extend the cell from above down into this row.
+                row_spans[index] = 0
+                spans[cell[0]][cell[1]] += 1
+                current[key] = cell
+            else:
+                current[key] = (y, index)
+            start += count
+        spans.append(row_spans)
+        previous = current
+    return spans
+
+
+def _cell_count(rowspans: List[List[int]]) -> int:
+    """
+    Count the cells which are actually rendered given the output of _rowspans.
+    """
+    return sum(len(row_spans) - row_spans.count(0) for row_spans in rowspans)
+
+
+def _iter_columns(rowlist: data.RowList) -> Iterator[Tuple[Sequence[int], Sequence[Any]]]:
+    """
+    Turn a rowlist (or a data.RunTable) into a sequence of rows for _render_rows, each being a sequence of counts and a 
+    sequence of colours. The colours of a RunTable are left packed, which saves making a tuple for every run.
+    """
+    if isinstance(rowlist, data.RunTable):
+        for y in range(rowlist.getheight()):
+            start, end = rowlist.row_offsets[y], rowlist.row_offsets[y + 1]
+            yield rowlist.lengths[start:end], rowlist.colours[start:end]
+        return
+    yield from _row_columns(_iter_rows(rowlist))
 
-    
-        # Now to generate CSS
 
-        # First, apply the height to all tr children of the table
-        css += 'table#{} tr{{height:{!s}px;}}\n'.format(table_unique_id, pixel_size)
+def _row_columns(rows: Iterable[List[Tuple[int, data.RGB]]]) -> Iterator[Tuple[Sequence[int], Sequence[Any]]]:
+    """
+    Turn rows of (count, colour) runs into a sequence of rows for _render_rows.
+    """
+    for row in rows:
+        yield tuple(zip(*row)) or ((), ())
+
+
+class _Strings(dict):
+    """
+    Dictionary which works out missing values with a function the first time they are needed. Used to cache the strings that 
+    make up each cell, so rendering a cell is a few lookups rather than formatting a string. If max_size is given, the cache is 
+    cleared when it gets that big, so it cannot grow with the image.
+    """
+    def __init__(self, function: Callable[[Any], str], max_size: Optional[int]=None):
+        super().__init__()
+        self._function = function
+        self._max_size = max_size
+
+    def __missing__(self, key: Any) -> str:
+        if self._max_size is not None and len(self) >= self._max_size:
+            self.clear()
+        value = self[key] = self._function(key)
+        return value
+
 
-        # Now we generate CSS for the mappings.
+def _html_colour(colour: Union[data.RGB, int], shorten: bool=False) -> str:
+    """
+    Faster version of rgb_to_html, which also takes packed 0xRRGGBB integers. Only colours which are out of range go through 
+    rgb_to_html to be clamped. None is no colour at all, for cells which are left see-through.
+    """
+    if colour is None:
+        return 'transparent'
+    if not isinstance(colour, int):
+        r, g, b = colour
+        if not (0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255):
+            return rgb_to_html(colour, shorten)
+        colour = (r << 16) | (g << 8) | b
+    # Every component is a multiple of 0x11 if the high and low digits of each are the same.
+    if shorten and (colour >> 4) & 0x0f0f0f == colour & 0x0f0f0f:
+        return '#{:x}{:x}{:x}'.format(colour >> 16 & 0xf, colour >> 8 & 0xf, colour & 0xf)
+    return '#{:06x}'.format(colour)
+
+
+def _render_rows(rows: Iterable[Tuple[Sequence[int], Sequence[Any]]], palette: Optional[Dict[data.RGB, str]], no_css: bool, 
+        pixel_size: int, rowspans: Optional[Iterable[List[int]]]=None, minify: bool=False) -> Iterator[str]:
+    """
+    Render rows (as given by _iter_columns or _row_columns) into html, yielding one <tr> at a time. palette is only used (and 
+    may be None) when no_css is False. rowspans is the output of _rowspans for the rows, if cells should be merged vertically.
+
+    Every cell is made of three strings: one depending on its count, one on its colour and one on its count again. These are 
+    worked out once each and cached, so a whole row is joined from lookups in one go.
+
+    If minify is set, the cells have no width (it comes from the <col> after _table_start), attributes are unquoted, colours 
+    are shortened, and there are no newlines or end tags (which are optional for both <tr> and <td>).
+    """
+    if rowspans is None:
+        rowspans = itertools.repeat(None)
+    if minify:
+        end, row_end, rowspan = '>', '', ' rowspan={!s}'
+        colspan = lambda count: ' colspan={!s}'.format(count) if count > 1 else ''
+    else:
+        end, row_end, rowspan = '/>\n', '</tr>\n', ' rowspan="{!s}"'
+        # We need colspan if the cell covers more than one pixel.
+        colspan = lambda count: ' colspan="{!s}"'.format(count) if count > 1 else ''
+    if no_css:
+        hex_colours = _Strings(functools.partial(_html_colour, shorten=minify), 1 << 20)
+        colour_strings = lambda row_colours: map(hex_colours.__getitem__, row_colours)
+        if minify:
+            tr = '<tr style=height:{!s}px>'.format(pixel_size)
+            heads = _Strings(lambda count: '<td style=background:')
+            tails = _Strings(lambda count: colspan(count) + end)
+        else:
+            tr = '<tr style="height:{!s}px;">\n'.format(pixel_size)
+            heads = _Strings(lambda count: '<td style="background:')
+            tails = _Strings(lambda count: ';width:{!s}px;"{}{}'.format(count*pixel_size, colspan(count), end))
+    else:
+        # Time to use that mapping we made... Photos can have as many colours as runs, so the class names are not cached, 
+        # which would only make a copy of the palette.
+        def colour_strings(row_colours: Sequence[Any]) -> Iterator[str]:
+            if isinstance(row_colours, array.array):  # Packed
+                return map(palette.__getitem__, map(data.unpack_rgb, row_colours))
+            return map(palette.__getitem__, row_colours)
+        if minify:
+            tr = '<tr>'
+            heads = _Strings(lambda count: '<td class=')
+            tails = _Strings(lambda count: colspan(count) + end)
+        else:
+            # We can just make tr's with no style property - height can be managed later in CSS.
+            tr = '<tr>\n'
+            heads = _Strings(lambda count: '<td style="width:{!s}px;" class="'.format(count*pixel_size))
+            tails = _Strings(lambda count: '"{}{}'.format(colspan(count), end))
+
+    for (counts, row_colours), row_spans in zip(rows, rowspans):
+        if row_spans is None or row_spans.count(1) == len(row_spans):
+            cells = zip(map(heads.__getitem__, counts), colour_strings(row_colours), map(tails.__getitem__, counts))
+            yield "".join([tr, *itertools.chain.from_iterable(cells), row_end])
+            continue
+        html = [tr]
+        for count, colour_string, span in zip(counts, colour_strings(row_colours), row_spans):
+            if span == 0:  # Covered by a cell above.
+                continue
+            html.append(heads[count])
+            html.append(colour_string)
+            if span == 1:
+                html.append(tails[count])
+            else:
+                # The rowspan goes after the colspan, at the end of the tail.
+                html.append(tails[count][:-len(end)] + rowspan.format(span) + end)
+        html.append(row_end)
+        yield "".join(html)
+
+
+def _render_css(palette: Dict[data.RGB, str], table_id: str, pixel_size: int, minify: bool=False, 
+        scope: Optional[str]=None) -> Iterator[str]:
+    """
+    Render the css for a table with the given palette, one rule at a time. If minify is set, the rules have the shortest 
+    selectors and colours, and no whitespace, and the width of the <col> after _table_start is set too.
+
+    scope is the selector the rules apply inside of, which is the table with table_id by default. Setting it lets several 
+    tables share the rules.
+    """
+    if minify:
+        scope = scope if scope is not None else '#' + table_id
+        yield '{0} tr{{height:{1!s}px}}{0} col{{width:{1!s}px}}'.format(scope, pixel_size)
         for colour, cssclass in palette.items():
-            css += 'table#{} td.{} {{background:{}; }}\n'.format(table_unique_id, cssclass, rgb_to_html(colour))
+            yield '{} .{}{{background:{}}}'.format(scope, cssclass, _html_colour(colour, True))
+        return
+
+    scope = scope if scope is not None else 'table#' + table_id
+    # First, apply the height to all tr children of the table
+    yield '{} tr{{height:{!s}px;}}\n'.format(scope, pixel_size)
+
+    # Now we generate CSS for the mappings. The hex colour is formatted along with the rest of the rule.
+    rule = scope + ' td.{} {{background:#{:02x}{:02x}{:02x}; }}\n'
+    for colour, cssclass in palette.items():
+        r, g, b = colour
+        if 0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255:
+            yield rule.format(cssclass, r, g, b)
+        else:
+            yield '{} td.{} {{background:{}; }}\n'.format(scope, cssclass, rgb_to_html(colour))
+
+
+def _counting_writer(write: Callable[[str], Any], collector: stats.Stats, counter: str) -> Callable[[str], Any]:
+    """
+    Wrap a writer from _sink_writer so the amount written is added to a counter of collector. The output is ASCII, so 
+    characters are bytes.
+    """
+    def counting_write(text: str):
+        collector.add(counter, len(text))
+        return write(text)
+    return counting_write
+
+
+def _record_palette(collector: stats.Stats, rowlist: data.RowList, palette: Optional[Dict[data.RGB, str]]):
+    """
+    Record the number of colours and the histogram of the code (css class name) lengths of a palette.
+    """
+    if palette is None:
+        if isinstance(rowlist, data.RunTable):
+            collector.record("colours", len(set(rowlist.colours)))
+        else:
+            collector.record("colours", len(_count_colours(rowlist)))
+        return
+    collector.record("colours", len(palette))
+    histogram = {}
+    for code in palette.values():
+        histogram[len(code)] = histogram.get(len(code), 0) + 1
+    collector.record("code_lengths", dict(sorted(histogram.items())))
+
+
+def write_html_css(rowlist: data.RowList, html_sink: Any, css_sink: Any, no_css: bool=False, pixel_size: int=3, 
+        table_id: Optional[str]=None, merge_rows: bool=False, palette: Optional[Dict[data.RGB, str]]=None, 
+        minify: bool=False, table_class: Optional[str]=None) -> int:
+    """
+    Streaming version of rowlist_to_html_css. Instead of returning the html and css as strings, they are written to html_sink 
+    and css_sink (anything with a write method, taking either text or bytes), one table row at a time.
 
-    return html, css
+    The palette is built before any html is written, so rowlist must still hold the whole image, but the html itself is never 
+    kept in memory all at once. If the palette (a mapping of colours to css class names, as made by _to_palette) is already 
+    known, it can be passed in to skip building it.
+
+    If table_class is given, the table gets that class and no css is written, as the palette (which must then be given, and have
+    every colour in the image) comes from a stylesheet shared by many tables, see palette.SharedPalette.
+
+    Returns the number of <td> cells written.
+    """
+    write_html = _sink_writer(html_sink)
+    write_css = _sink_writer(css_sink)
+    collector = stats.active()
+    if collector is not None:
+        write_html = _counting_writer(write_html, collector, "html_bytes")
+        write_css = _counting_writer(write_css, collector, "css_bytes")
+
+    if no_css:
+        palette = None
+    else:  # Generate CSS and HTML. Should be fun!
+        # Get a mapping/stringpalette:
+        if palette is None:
+            with stats.stage("palette"):
+                palette = _to_palette(rowlist)
+        table_id = table_id if table_id is not None else random_table_id()
+    if collector is not None:
+        _record_palette(collector, rowlist, palette)
+
+    rowspans = None
+    if merge_rows:
+        rowspans = _rowspans(_iter_rows(rowlist))
+        cells = _cell_count(rowspans)
+    else:
+        cells = rowlist.run_count() if isinstance(rowlist, data.RunTable) else sum(len(row) for row in _iter_rows(rowlist))
+
+    _write_table(
+        _iter_columns(rowlist), write_html, write_css, palette, no_css, pixel_size, table_id, rowspans, minify, table_class
+    )
+    stats.record("cells", cells)
+    return cells
+
+
+def _write_table(rows: Iterable[Tuple[Sequence[int], Sequence[Any]]], write_html: Callable[[str], Any], write_css: Callable[[str], Any], 
+        palette: Optional[Dict[data.RGB, str]], no_css: bool, pixel_size: int, table_id: Optional[str], 
+        rowspans: Optional[Iterable[List[int]]], minify: bool=False, table_class: Optional[str]=None):
+    """
+    Render the rows (as given by _iter_columns or _row_columns) into a whole table, and its css unless no_css is set or the
+    table uses the shared stylesheet table_class.
+    """
+    with stats.stage("render"):
+        width = 0
+        if minify:  # The width of the table goes in its <col>, so take a look at the first row.
+            rows = iter(rows)
+            first = next(rows, None)
+            if first is not None:
+                width = sum(first[0])
+                rows = itertools.chain((first,), rows)
+        write_html(_table_start(no_css, table_id, minify, width, pixel_size, table_class))
+        for tr in _render_rows(rows, palette, no_css, pixel_size, rowspans, minify):
+            write_html(tr)
+        write_html('</table>' if minify else '</table>\n')
+
+        if not no_css and table_class is None:
+            # Now to generate CSS. It is one rule per colour, so small enough to write in one go.
+            write_css("".join(_render_css(palette, table_id, pixel_size, minify)))
+
+
+def _counted_rows(rows: Iterable[List[Tuple[int, data.RGB]]], count: Dict[data.RGB, int]) -> Iterator[List[Tuple[int, data.RGB]]]:
+    """
+    Pass rows through, adding up how many pixels of each colour they have in count along the way.
+    """
+    for row in rows:
+        for pixels, colour in row:
+            count[colour] = count.get(colour, 0) + pixels
+        yield row
+
+
+def write_html_css_two_pass(rows: Callable[[], Iterable[List[Tuple[int, data.RGB]]]], html_sink: Any, css_sink: Any, 
+        no_css: bool=False, pixel_size: int=3, table_id: Optional[str]=None, merge_rows: bool=False, 
+        palette: Optional[Dict[data.RGB, str]]=None, minify: bool=False, table_class: Optional[str]=None) -> int:
+    """
+    Version of write_html_css for images which are too big to hold in memory, even as runs. Instead of a rowlist, rows is a 
+    function returning a fresh iterable of rows (lists of (count, colour) tuples), such as a data.PixelAccess's 
+    itercontiguousrows:
+
+        pixels = data.PixelAccessPillowStrips(Image.open("huge.ppm"))
+        write_html_css_two_pass(pixels.itercontiguousrows, html_file, css_file)
+
+    The first pass over the rows only counts the colours, to build the same palette as write_html_css, and the second pass 
+    renders them, one row at a time. If the palette is already known (from an earlier image, or a fixed set of colours), it can 
+    be passed in to skip the first pass. It must have every colour in the image. With no_css there is no palette, so there is 
+    only one pass. table_class is as for write_html_css.
+
+    merge_rows always needs a first pass, which also works out the rowspans. These take memory proportional to the number of 
+    runs, so it is best left off for the very largest images.
+
+    Returns the number of <td> cells written.
+    """
+    write_html = _sink_writer(html_sink)
+    write_css = _sink_writer(css_sink)
+    collector = stats.active()
+    if collector is not None:
+        write_html = _counting_writer(write_html, collector, "html_bytes")
+        write_css = _counting_writer(write_css, collector, "css_bytes")
+
+    rowspans = None
+    if no_css:
+        palette = None
+    elif table_id is None:
+        table_id = random_table_id()
+    if merge_rows or (palette is None and not no_css):
+        count = {}
+        with stats.stage("palette"):
+            first_pass = _counted_rows(rows(), count)
+            if merge_rows:
+                rowspans = _rowspans(first_pass)
+            else:
+                for _ in first_pass:
+                    pass
+            if palette is None and not no_css:
+                palette = _counts_to_palette(count)
+        if collector is not None:
+            collector.record("colours", len(count))
+    if collector is not None and palette is not None:
+        _record_palette(collector, None, palette)
+
+    cells = 0
+
+    def counted_cells(rows: Iterable[List[Tuple[int, data.RGB]]]) -> Iterator[List[Tuple[int, data.RGB]]]:
+        nonlocal cells
+        for row in rows:
+            cells += len(row)
+            yield row
+    _write_table(
+        _row_columns(counted_cells(rows())), write_html, write_css, palette, no_css, pixel_size, table_id, rowspans, minify,
+        table_class
+    )
+    if rowspans is not None:
+        cells = _cell_count(rowspans)
+    stats.record("cells", cells)
+    return cells
+
+
+def rowlist_to_html_css(rowlist: data.RowList, no_css: bool=False, pixel_size: int=3, 
+        table_id: Optional[str]=None, merge_rows: bool=False, minify: bool=False) -> Tuple[str, str]:
+    """
+    Turn a list of colour rows as specified by data.PixelAccess.getcontiguousrows (or a data.RunTable as returned by 
+    data.PixelAccess.getruntable) into a pair of strings which contain html and css code, respectively.
+
+    pixel_size is how many html pixels each image pixel takes up in the x and y axis.
+
+    If no_css is set to True, NO css will be used (probably inflating the size massively), and the border/styling/colour/etc will be 
+    directly injected into the HTML with style="...". This will most likely produce a MUCH bigger file. Also, CSS is 
+    more compatible when using HTML5.
+
+    table_id is the id given to the table for its CSS to target. If it is None, a random one is generated.
+
+    If merge_rows is set to True, runs with the same start, length and colour on consecutive rows are merged into a single cell
+    with a rowspan, which can massively cut the number of cells for images with large areas of flat colour.
+
+    If minify is set to True, the output is made as small as possible without changing how it looks: widths are set once for all
+    the columns rather than on every cell, colours are shortened to #rgb where possible, attributes are unquoted, and optional end 
+    tags and whitespace are left out.
+
+    See write_html_css for a version which streams the output into files rather than building strings.
+    """
+    html = io.StringIO()
+    css = io.StringIO()
+    write_html_css(rowlist, html, css, no_css, pixel_size, table_id, merge_rows, minify=minify)
+    return html.getvalue(), css.getvalue()
 
 
 if __name__ == "__main__":
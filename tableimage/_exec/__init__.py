@@ -1,11 +1,21 @@
 """
 Used for running the module as an independent program rather than using it as a library.
 """
-from .. import imagemanipulation, rowlist_to_html_css, data
+from .. import imagemanipulation, write_html_css_two_pass, random_table_id, data, parallel, colour, cache, stats, \
+    compress, renderers, animation, palette, _to_palette, _counted_rows
 import argparse
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import io
+import itertools
+import json
+import os
 import sys
 _sys = sys
-from . import info
+from . import info, batch
 from PIL import Image
 from .._typing import *
 
@@ -63,8 +73,30 @@ def make_parser() -> argparse.ArgumentParser:
 
     # First images for input.
 
+    # Opened as they are converted rather than all at once, so any number of images can be given. - is stdin.
     parser.add_argument(
-       "images", metavar="<image>", help=info.images_info, nargs="+", type=argparse.FileType(mode='rb')
+       "images", metavar="<image>", help=info.images_info, nargs="*"
+    )
+
+    # Batch conversion
+    parser.add_argument(
+        "--input-dir", default=None, metavar="DIR", help=info.input_dir_info
+    )
+
+    parser.add_argument(
+        "--glob", default=None, metavar="PATTERN", help=info.glob_info
+    )
+
+    parser.add_argument(
+        "--output-dir", default=None, metavar="DIR", help=info.output_dir_info
+    )
+
+    parser.add_argument(
+        "--rebuild", action='store_true', default=False, help=info.rebuild_info
+    )
+
+    parser.add_argument(
+        "--summary", default=None, type=argparse.FileType(mode='w'), metavar="FILE", help=info.summary_info
     )
     
     # css control
@@ -92,10 +124,130 @@ def make_parser() -> argparse.ArgumentParser:
         "--append", action='store_true', default=False, help=info.append_info
     )
 
+    # Compression
+    parser.add_argument(
+        "--compress", default=None, choices=compress.methods.keys(), help=info.compress_info
+    )
+
+    parser.add_argument(
+        "--compress-level", type=int, default=None, metavar="LEVEL", help=info.compress_level_info
+    )
+
     parser.add_argument(
         "--pixel-size", type=int, default=3, help=info.pixel_size_info
     )
 
+    # Scaling
+    parser.add_argument(
+        "--width", type=int, default=None, metavar="PIXELS", help=info.width_info
+    )
+
+    parser.add_argument(
+        "--height", type=int, default=None, metavar="PIXELS", help=info.height_info
+    )
+
+    parser.add_argument(
+        "--max-cells", type=int, default=None, metavar="N", help=info.max_cells_info
+    )
+
+    parser.add_argument(
+        "--resample", default="box", choices=imagemanipulation.resample_filters.keys(), help=info.resample_info
+    )
+
+    # Colour reduction
+    parser.add_argument(
+        "--colours", type=int, default=None, choices=range(2, 257), metavar="N", help=info.colours_info
+    )
+
+    parser.add_argument(
+        "--quantize-method", default="median-cut", choices=imagemanipulation.quantize_methods.keys(), 
+        help=info.quantize_method_info
+    )
+
+    parser.add_argument(
+        "--dither", action='store_true', default=False, help=info.dither_info
+    )
+
+    parser.add_argument(
+        "--merge-rows", action='store_true', default=False, help=info.merge_rows_info
+    )
+
+    parser.add_argument(
+        "--minify", action='store_true', default=False, help=info.minify_info
+    )
+
+    # Animations
+    parser.add_argument(
+        "--frames", action='store_true', default=False, help=info.frames_info
+    )
+
+    parser.add_argument(
+        "--frame-delta", action='store_true', default=False, help=info.frame_delta_info
+    )
+
+    parser.add_argument(
+        "--format", default="table", choices=renderers.renderers.keys(), help=info.format_info
+    )
+
+    # Shared palettes
+    parser.add_argument(
+        "--shared-palette", action='store_true', default=False, help=info.shared_palette_info
+    )
+
+    parser.add_argument(
+        "--palette-class", default=None, metavar="CLASS", help=info.palette_class_info
+    )
+
+    parser.add_argument(
+        "--palette-in", default=None, type=argparse.FileType(mode='r'), metavar="FILE", help=info.palette_in_info
+    )
+
+    parser.add_argument(
+        "--palette-out", default=None, metavar="FILE", help=info.palette_out_info
+    )
+
+    parser.add_argument(
+        "--palette-css", default=None, metavar="FILE", help=info.palette_css_info
+    )
+
+    # Lossy run merging
+    parser.add_argument(
+        "--tolerance", type=float, default=0, help=info.tolerance_info
+    )
+
+    parser.add_argument(
+        "--tolerance-metric", default="channel", choices=colour.metrics, help=info.tolerance_metric_info
+    )
+
+    parser.add_argument(
+        "--jobs", type=int, default=1, help=info.jobs_info
+    )
+
+    parser.add_argument(
+        "--bands", type=int, default=1, help=info.bands_info
+    )
+
+    parser.add_argument(
+        "--low-memory", action='store_true', default=False, help=info.low_memory_info
+    )
+
+    parser.add_argument(
+        "--stats", nargs="?", const="text", default=None, choices=("text", "json"), help=info.stats_info
+    )
+
+    # Caching
+    parser.add_argument(
+        "--cache-dir", default=None, help=info.cache_dir_info
+    )
+
+    parser.add_argument(
+        "--cache-size", type=int, default=512, metavar="MB", help=info.cache_size_info
+    )
+
+    parser.add_argument(
+        "--no-cache", action='store_true', default=False, help=info.no_cache_info
+    )
+
     # Background colour
     parser.add_argument(
             "--background-colour", 
@@ -118,19 +270,16 @@ def combine_html_css(html_template_chunk: str, css_template_chunk: str) -> str:
     return html_out
 
 
+_full_document_start = "<!DOCTYPE html>\n<html>\n<body>\n"
+_full_document_end = "\n</body>\n</html>\n"
+
+
 def to_full_html_document(html_template_chunk: str) -> str:
     """
     Convert a HTML chunk into a full, valid html document.
     """
-    result = ""
-    result += "<!DOCTYPE html>\n"
-    result += "<html>\n"
-    result += "<body>\n"
-    result += html_template_chunk + '\n'
-    result += "</body>\n"
-    result += "</html>\n"
+    return _full_document_start + html_template_chunk + _full_document_end
 
-    return result
 
 def to_write_mode(file_in_read_plus_mode):
     """
@@ -142,22 +291,693 @@ def to_write_mode(file_in_read_plus_mode):
         file_in_read_plus_mode.truncate(0)
 
 
-def main():
-    parsed_args: argparse.Namespace = make_parser().parse_args()
-    
-    # Read all the images.
-    images_and_fnames = []
-    for image_file in parsed_args.images:
-        images_and_fnames.append((Image.open(image_file), image_file.name))
-    
-    # Now we can perform processes on them.
-    html_and_css = {
-        filename: rowlist_to_html_css(
-            data.PixelAccessPillow(image, background=parsed_args.background_colour).getcontiguousrows(),
-            parsed_args.no_css, parsed_args.pixel_size
-            ) for (image, filename) in images_and_fnames
+def conversion_options(parsed_args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Pick out the command-line args which affect how a single image is converted. Unlike the parsed args themselves (which 
+    hold open files), these can be sent to worker processes.
+    """
+    return {
+        "background": tuple(parsed_args.background_colour),
+        "no_css": parsed_args.no_css,
+        "pixel_size": parsed_args.pixel_size,
+        "colours": parsed_args.colours,
+        "quantize_method": parsed_args.quantize_method,
+        "dither": parsed_args.dither,
+        "tolerance": parsed_args.tolerance,
+        "metric": parsed_args.tolerance_metric,
+        "merge_rows": parsed_args.merge_rows,
+        "minify": parsed_args.minify,
+        "format": parsed_args.format,
+        "frames": parsed_args.frames,
+        "frame_delta": parsed_args.frame_delta,
+        "low_memory": parsed_args.low_memory,
+        "width": parsed_args.width,
+        "height": parsed_args.height,
+        "max_cells": parsed_args.max_cells,
+        "resample": parsed_args.resample,
+        # A palette.SharedPalette, filled in by converted_images with --shared-palette.
+        "shared_palette": None,
     }
 
+
+# Which conversion_options affect the runs of an image, and which only affect how they are rendered.
+_run_options = (
+    "background", "colours", "quantize_method", "dither", "tolerance", "metric", "frames", "width", "height", "max_cells", 
+    "resample"
+)
+_render_options = ("no_css", "pixel_size", "merge_rows", "minify", "format", "frame_delta")
+
+
+def write_converted_image(image: Image.Image, options: Dict[str, Any], html_sink, css_sink, table_id: Optional[str]=None, 
+        bands: int=1, executor: Optional[concurrent.futures.Executor]=None, name: str="", 
+        conversion_cache: Optional[cache.ConversionCache]=None, stats_format: Optional[str]=None, index: int=0):
+    """
+    Convert an image with the given conversion_options, streaming the html into html_sink and the css into css_sink.
+
+    If bands is more than 1, the image is split into that many bands which are converted in parallel using executor.
+
+    name is the name of the image, used when reporting the cell count reduction of merge_rows and stats.
+
+    If conversion_cache is given, the runs and output are looked up in and stored into it, and the table id is derived from the 
+    image and options so the output is reproducible. index is where the image is in the document, which goes into the id too, so 
+    the same image twice in one document still gets two different ids.
+
+    If stats_format is "text" or "json", stats about the conversion are written to stderr in that format.
+    """
+    if stats_format is None:
+        _write_cached_image(image, options, html_sink, css_sink, table_id, bands, executor, name, conversion_cache, index)
+        return
+    with stats.collecting(name, functools.partial(_report_stats, stats_format)):
+        _write_cached_image(image, options, html_sink, css_sink, table_id, bands, executor, name, conversion_cache, index)
+
+
+def _report_stats(stats_format: str, collected: stats.Stats):
+    """
+    Write collected stats to stderr, as text or JSON lines.
+    """
+    print(collected.tojson() if stats_format == "json" else collected.format(), file=sys.stderr, flush=True)
+
+
+def _write_cached_image(image: Image.Image, options: Dict[str, Any], html_sink, css_sink, table_id: Optional[str], bands: int, 
+        executor: Optional[concurrent.futures.Executor], name: str, conversion_cache: Optional[cache.ConversionCache], index: int):
+    """
+    Look the image up in the cache, if there is one, before converting it. Low memory conversions skip the cache, as hashing 
+    the image means loading all of it, and so do animations, as only the first frame would be hashed.
+    """
+    _draft(image, options)
+    if conversion_cache is None or options["low_memory"] or _is_animation(image, options):
+        _write_converted_image(image, options, html_sink, css_sink, table_id, bands, executor, name)
+        return
+
+    with stats.stage("decode"):
+        image.load()
+    with stats.stage("hash"):
+        runs_key = cache.image_key(image, {option: options[option] for option in _run_options})
+    render_options = {option: options[option] for option in _render_options}
+    render_options["index"] = index
+    rendered_key = cache.render_key(runs_key, render_options)
+    table_id = cache.table_id(rendered_key)
+    if options["shared_palette"] is not None:
+        # The output depends on the whole shared palette, so only the runs are cached.
+        _write_converted_image(image, options, html_sink, css_sink, table_id, bands, executor, name, conversion_cache, runs_key)
+        return
+    # Hits skip straight to writing the output.
+    with stats.stage("cache"):
+        hit = conversion_cache.write_rendered(rendered_key, html_sink, css_sink)
+    if hit:
+        stats.record("cache", "hit")
+        return
+    with conversion_cache.rendering(rendered_key, html_sink, css_sink) as (html_sink, css_sink):
+        _write_converted_image(image, options, html_sink, css_sink, table_id, bands, executor, name, conversion_cache, runs_key)
+
+
+def _write_converted_image(image: Image.Image, options: Dict[str, Any], html_sink, css_sink, table_id: Optional[str], 
+        bands: int, executor: Optional[concurrent.futures.Executor], name: str, 
+        conversion_cache: Optional[cache.ConversionCache]=None, runs_key: Optional[str]=None):
+    """
+    Does the actual work of write_converted_image, once the cache has missed. If there is a cache, runs_key is the key the runs 
+    and palette of the image are looked up in and stored under.
+    """
+    shared = options["shared_palette"]
+    if _is_animation(image, options):
+        frames = data.PixelAccessPillowFrames(
+            image, background=options["background"], colours=options["colours"], 
+            quantize_method=options["quantize_method"], dither=options["dither"], width=options["width"], 
+            height=options["height"], resample=options["resample"]
+        )
+        tables, durations = frames.getruntables(options["tolerance"], options["metric"])
+        cells = animation.write_html_css_frames(
+            tables, durations, html_sink, css_sink, options["no_css"], options["pixel_size"], table_id, options["merge_rows"],
+            minify=options["minify"], delta=options["frame_delta"], loop=frames.getloop()
+        )
+        _report_cells(options, name, cells, sum(table.run_count() for table in tables))
+        return
+
+    if options["low_memory"]:
+        pixels = data.PixelAccessPillowStrips(image, background=options["background"])
+        cells = write_html_css_two_pass(
+            functools.partial(pixels.itercontiguousrows, options["tolerance"], options["metric"]), html_sink, css_sink, 
+            options["no_css"], options["pixel_size"], table_id, options["merge_rows"], minify=options["minify"],
+            palette=shared.colours if shared is not None else None, table_class=shared.class_name if shared is not None else None
+        )
+        _report_cells(options, name, cells, None)
+        return
+
+    cached = None
+    if conversion_cache is not None and bands <= 1:
+        with stats.stage("cache"):
+            cached = conversion_cache.get_runs(runs_key)
+        stats.record("cache", "runs hit" if cached is not None else "miss")
+
+    if cached is not None:
+        table, palette = cached
+    else:
+        pixels = _pixel_access(image, options)
+        # Bands are split off before the runs are counted, so they cannot be scaled to fit --max-cells.
+        if bands > 1 and options["format"] == "table" and shared is None and options["max_cells"] is None:
+            cells = parallel.write_html_css_banded(
+                pixels, html_sink, css_sink, options["no_css"], options["pixel_size"], table_id, bands, executor,
+                options["tolerance"], options["metric"], options["merge_rows"], options["minify"]
+            )
+            _report_cells(options, name, cells, None)
+            return
+        table = pixels.getruntable(options["tolerance"], options["metric"])
+        del pixels
+        palette = None
+        if conversion_cache is not None:
+            with stats.stage("palette"):
+                palette = _to_palette(table)
+            with stats.stage("cache"):
+                conversion_cache.put_runs(runs_key, table, palette)
+
+    if shared is not None:  # Only tables can use a shared palette.
+        renderer = renderers.TableRenderer(
+            options["no_css"], options["pixel_size"], options["merge_rows"], options["minify"], shared.class_name
+        )
+        palette = shared.colours
+    else:
+        renderer = renderers.renderers[options["format"]](
+            options["no_css"], options["pixel_size"], options["merge_rows"], options["minify"]
+        )
+    cells = renderer.write(table, html_sink, css_sink, table_id, palette)
+    if renderer.merges_rows:
+        _report_cells(options, name, cells, table.run_count())
+
+
+def _draft(image: Image.Image, options: Dict[str, Any]):
+    """
+    Let JPEGs be decoded at a smaller scale if --width or --height scale them down (see imagemanipulation.draft). This has to 
+    happen before the image is loaded, so before it is hashed for the cache.
+    """
+    if options["width"] is not None or options["height"] is not None:
+        imagemanipulation.draft(image, imagemanipulation.fit_size(image.size, options["width"], options["height"]))
+
+
+def _pixel_access(image: Image.Image, options: Dict[str, Any]) -> data.PixelAccessPillow:
+    return data.PixelAccessPillow(
+        image, background=options["background"], colours=options["colours"], quantize_method=options["quantize_method"], 
+        dither=options["dither"], width=options["width"], height=options["height"], max_cells=options["max_cells"], 
+        resample=options["resample"]
+    )
+
+
+def _is_animation(image: Image.Image, options: Dict[str, Any]) -> bool:
+    """
+    Check whether an image should be converted as an animation, which is when it has more than one frame and --frames was given.
+    """
+    return options["frames"] and getattr(image, "n_frames", 1) > 1
+
+
+# Where _report_cells puts its reports instead of stderr in --jobs workers, so the parent can write them in order.
+_cell_reports = contextvars.ContextVar("tableimage_cell_reports", default=None)
+
+
+def _report_cells(options: Dict[str, Any], name: str, cells: int, runs: Optional[int]):
+    """
+    Report how many cells merge_rows saved on stderr. Output which comes straight from the cache is not reported, as it was not
+    counted.
+    """
+    if options["merge_rows"]:
+        report = "{}: {!s} cells".format(name, cells)
+        if runs is not None and runs > 0:
+            report += " instead of {!s} ({:.1%} fewer)".format(runs, 1 - cells / runs)
+        reports = _cell_reports.get()
+        if reports is not None:
+            reports.append(report)
+        else:
+            print(report, file=sys.stderr)
+
+
+def _open_image_file(path: str) -> ContextManager[Any]:
+    """
+    Open an image file given on the command line for reading, where - is stdin (which is left open afterwards).
+    """
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin.buffer)
+    return open(path, "rb")
+
+
+def _image_name(path: str) -> str:
+    return "<stdin>" if path == "-" else path
+
+
+def _write_image_file(path: str, options: Dict[str, Any], html_sink, css_sink, **kwargs):
+    """
+    Open the image file at path and convert it with write_converted_image, so files are only opened when they are converted.
+    """
+    with _open_image_file(path) as image_file:
+        write_converted_image(Image.open(image_file), options, html_sink, css_sink, name=_image_name(path), **kwargs)
+
+
+def _convert_image_job(job: Tuple[Union[str, bytes], Dict[str, Any], str, Optional[cache.ConversionCache], Optional[str], int]
+        ) -> Tuple[str, str, Optional[stats.Stats], List[str]]:
+    """
+    Worker process side of --jobs: read, decode, convert and render an image, returning the html and css. The image is a path, or
+    the bytes of the image if it came from stdin.
+
+    The reports of how many cells --merge-rows saved, and the stats if stats_format is given, are returned too rather than 
+    written to stderr, so the parent can write them whole and in the same order as the images.
+    """
+    image, options, table_id, conversion_cache, stats_format, index = job
+    html = io.StringIO()
+    css = io.StringIO()
+    reports = []
+    token = _cell_reports.set(reports)
+    name = _image_name("-" if isinstance(image, bytes) else image)
+    try:
+        with stats.collecting(name) if stats_format is not None else contextlib.nullcontext() as collected:
+            if isinstance(image, bytes):
+                write_converted_image(
+                    Image.open(io.BytesIO(image)), options, html, css, table_id, name=name, 
+                    conversion_cache=conversion_cache, index=index
+                )
+            else:
+                _write_image_file(image, options, html, css, table_id=table_id, conversion_cache=conversion_cache, index=index)
+    finally:
+        _cell_reports.reset(token)
+    return html.getvalue(), css.getvalue(), collected, reports
+
+
+def _ordered_imap(executor: concurrent.futures.Executor, function: Callable, jobs: Iterable, window: int
+        ) -> Iterator[concurrent.futures.Future]:
+    """
+    Like executor.map, but only keeps up to window jobs in flight (so jobs are only created as they are needed) and yields 
+    the future of each job, in order, once it and every job before it are done. Calling result() on a future raises the 
+    exception of a job which failed, without stopping the others.
+    """
+    pending = collections.deque()
+    for job in jobs:
+        pending.append(executor.submit(function, job))
+        if len(pending) >= window:
+            concurrent.futures.wait([pending[0]])
+            yield pending.popleft()
+    while len(pending) > 0:
+        concurrent.futures.wait([pending[0]])
+        yield pending.popleft()
+
+
+def _write_result(future: concurrent.futures.Future) -> Callable[[Any, Any], None]:
+    """
+    Wrap the future of an (html, css, stats, reports) result rendered by a worker into a writer, as used by write_document.
+    """
+    def write(html_sink, css_sink):
+        html, css, _, _ = future.result()
+        html_sink.write(html)
+        css_sink.write(css)
+    return write
+
+
+def make_cache(parsed_args: argparse.Namespace) -> Optional[cache.ConversionCache]:
+    """
+    Create the conversion cache asked for by the command-line args, or return None if caching is turned off.
+    """
+    if parsed_args.no_cache:
+        return None
+    directory = parsed_args.cache_dir if parsed_args.cache_dir is not None else cache.default_directory()
+    return cache.ConversionCache(directory, parsed_args.cache_size*1024*1024)
+
+
+def converted_images(image_paths: List[str], parsed_args: argparse.Namespace, shared: Optional[palette.SharedPalette]=None
+        ) -> Iterator[Callable[[Any, Any], None]]:
+    """
+    Convert the images at image_paths (where - is stdin), yielding a writer for each one, in order. A writer is a function taking 
+    an html sink and a css sink and writing the image's html and css to them. If an image cannot be converted, its writer raises 
+    the error, and the writers of the other images still work.
+
+    With --jobs 1 each image is converted by its writer, streaming straight into the sinks. With --bands, each image is converted
+    by its writer too, but split into bands converted by the worker processes. Otherwise the images are converted in worker 
+    processes, and each writer is yielded as soon as its image (and every image before it) is done. Either way, each file is only
+    opened when it is converted.
+
+    If shared is given, every image uses that palette (see make_shared_palette) and has no css of its own.
+    """
+    options = conversion_options(parsed_args)
+    options["shared_palette"] = shared
+    conversion_cache = make_cache(parsed_args)
+    jobs = parsed_args.jobs if parsed_args.jobs > 0 else (os.cpu_count() or 1)
+    # Where each image is in the document, for its table id. Images which get files of their own are each alone in theirs.
+    one_document = parsed_args.combined is not None or parsed_args.seperate is not None
+    indexes = range(len(image_paths)) if one_document else itertools.repeat(0)
+    if parsed_args.bands > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            for path, index in zip(image_paths, indexes):
+                yield functools.partial(
+                    _write_image_file, path, options, bands=parsed_args.bands, executor=executor, 
+                    conversion_cache=conversion_cache, stats_format=parsed_args.stats, index=index
+                )
+        return
+    if jobs == 1:
+        for path, index in zip(image_paths, indexes):
+            yield functools.partial(
+                _write_image_file, path, options, conversion_cache=conversion_cache, stats_format=parsed_args.stats, 
+                index=index
+            )
+        return
+
+    # Table ids are picked here rather than in the workers, which may share the same random state after a fork.
+    work = (
+        (sys.stdin.buffer.read() if path == "-" else path, options, random_table_id(), conversion_cache, parsed_args.stats,
+         index)
+        for path, index in zip(image_paths, indexes)
+    )
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        for future in _ordered_imap(executor, _convert_image_job, work, 2*jobs):
+            if future.exception() is None:
+                _, _, collected, reports = future.result()
+                for report in reports:
+                    print(report, file=sys.stderr)
+                if collected is not None:
+                    _report_stats(parsed_args.stats, collected)
+            yield _write_result(future)
+
+
+def _count_image_colours(job: Tuple[str, Dict[str, Any], Optional[cache.ConversionCache]]) -> Dict[data.RGB, int]:
+    """
+    Count the pixels of each colour in the image at path, after converting it to runs with the options. The runs are put in 
+    the cache, if there is one, so converting the image afterwards does not have to work them out again.
+    """
+    path, options, conversion_cache = job
+    with _open_image_file(path) as image_file:
+        image = Image.open(image_file)
+        if options["low_memory"]:
+            pixels = data.PixelAccessPillowStrips(image, background=options["background"])
+            count = {}
+            for _ in _counted_rows(pixels.itercontiguousrows(options["tolerance"], options["metric"]), count):
+                pass
+            return count
+
+        _draft(image, options)
+        runs_key = None
+        if conversion_cache is not None:
+            runs_key = cache.image_key(image, {option: options[option] for option in _run_options})
+            cached = conversion_cache.get_runs(runs_key)
+            if cached is not None:
+                return cached[0].colour_counts()
+        pixels = _pixel_access(image, options)
+        table = pixels.getruntable(options["tolerance"], options["metric"])
+        if conversion_cache is not None:
+            conversion_cache.put_runs(runs_key, table, _to_palette(table))
+        return table.colour_counts()
+
+
+def make_shared_palette(image_paths: List[str], parsed_args: argparse.Namespace, loaded: Optional[palette.SharedPalette]=None, 
+        failed: Optional[Dict[str, str]]=None) -> Tuple[palette.SharedPalette, Dict[str, Dict[data.RGB, int]]]:
+    """
+    Build the palette for --shared-palette, over the colours of all the images. If loaded (from --palette-in) is given, it is 
+    extended with any colours it does not have instead, so the names it already has stay the same. Returns the palette and the
+    colour counts of each image.
+
+    If failed is given, images which cannot be read are added to it (with why) and left out, rather than raising the error.
+    """
+    options = conversion_options(parsed_args)
+    conversion_cache = make_cache(parsed_args)
+    jobs = parsed_args.jobs if parsed_args.jobs > 0 else (os.cpu_count() or 1)
+    work = [(path, options, conversion_cache) for path in image_paths]
+    counts = {}
+
+    def add(path: str, count: Callable[[], Dict[data.RGB, int]]):
+        try:
+            counts[path] = count()
+        except Exception as e:
+            if failed is None:
+                raise
+            failed[path] = batch.describe_error(e)
+
+    if jobs == 1:
+        for job in work:
+            add(job[0], functools.partial(_count_image_colours, job))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            for job, future in zip(work, _ordered_imap(executor, _count_image_colours, work, 2*jobs)):
+                add(job[0], future.result)
+
+    class_name = parsed_args.palette_class
+    if loaded is not None:
+        if class_name is not None:
+            loaded.class_name = class_name
+        loaded.extend(counts.values())
+        return loaded, counts
+    return palette.SharedPalette.build(counts.values(), class_name if class_name is not None else palette.default_class), counts
+
+
+def write_shared_palette(shared: palette.SharedPalette, parsed_args: argparse.Namespace):
+    """
+    Write the shared palette to --palette-out as JSON, and its stylesheet to --palette-css, if they were given.
+    """
+    for path in (parsed_args.palette_out, parsed_args.palette_css):
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or os.curdir, exist_ok=True)
+    if parsed_args.palette_out is not None:
+        with open(parsed_args.palette_out, "w") as f:
+            shared.save(f)
+    if parsed_args.palette_css is not None:
+        with open(parsed_args.palette_css, "w") as f:
+            f.write(shared.css(parsed_args.pixel_size, parsed_args.minify))
+
+
+@contextlib.contextmanager
+def output_sink(f, parsed_args: argparse.Namespace) -> Iterator[Any]:
+    """
+    Context manager wrapping an output file in a compress.CompressedSink if --compress was given. The compressed stream is 
+    finished at the end (but the file is not closed), and its stats are reported if --stats was given.
+    """
+    if parsed_args.compress is None:
+        yield f
+        return
+    f.flush()
+    # Text files (including stdout) are written to through their binary buffer.
+    with compress.CompressedSink(getattr(f, "buffer", f), parsed_args.compress, parsed_args.compress_level) as sink:
+        yield sink
+    if parsed_args.stats is not None:
+        sink.stats.name = "{}: {}".format(getattr(f, "name", "<output>"), sink.stats.name)
+        _report_stats(parsed_args.stats, sink.stats)
+
+
+def write_document(converted: Iterable[Callable[[Any, Any], None]], parsed_args: argparse.Namespace, html_sink, css_sink=None,
+        shared_css: str=""):
+    """
+    Write converted images (writers, as yielded by converted_images), glued together vertically, into html_sink as they are 
+    converted. 
+
+    If css_sink is None (or the output is a full document), the css is put in <style> tags after the html. Otherwise it goes to 
+    css_sink. The css is small compared to the html (one rule per colour), so it is collected until the html is done.
+    shared_css (the stylesheet of a shared palette) goes before the css of the images.
+    """
+    css = io.StringIO()
+    css.write(shared_css)
+    if parsed_args.full_document:
+        html_sink.write(_full_document_start)
+    for index, write_image in enumerate(converted):
+        if index > 0:
+            html_sink.write('\n')
+            css.write('\n')
+        write_image(html_sink, css)
+
+    css_component = css.getvalue()
+    if css_sink is None or parsed_args.full_document:
+        html_sink.write(combine_html_css("", css_component))
+    elif len(css_component.strip()) > 0:
+        css_sink.write(css_component)
+    if parsed_args.full_document:
+        html_sink.write(_full_document_end)
+
+
+def write_image_files(base: str, write_image: Callable[[Any, Any], None], parsed_args: argparse.Namespace) -> List[str]:
+    """
+    Write a converted image (a writer, as yielded by converted_images) to its own files, base + .html, and base + .css if there 
+    is any css and it is not a full document. Returns the paths of the files written.
+    """
+    # Compressed files get the extension of the compression too, e.g. image.png.html.gz
+    suffix, mode = (compress.extension(parsed_args.compress), 'ab') if parsed_args.compress is not None else ("", 'a')
+    outputs = [base + ".html" + suffix]
+    css = io.StringIO()
+    with open(outputs[0], mode) as htmlfile:
+        if not parsed_args.append:
+            to_write_mode(htmlfile)
+        with output_sink(htmlfile, parsed_args) as html_sink:
+            write_document([write_image], parsed_args, html_sink, css)
+
+    css_component = css.getvalue()
+    if len(css_component.strip()) > 0:
+        outputs.append(base + ".css" + suffix)
+        with open(outputs[1], mode) as cssfile:
+            if not parsed_args.append:
+                to_write_mode(cssfile)
+            with output_sink(cssfile, parsed_args) as css_sink:
+                css_sink.write(css_component)
+    return outputs
+
+
+def batch_options(parsed_args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    The conversion_options, plus the command-line args which change the files written for an image, as recorded in the batch 
+    manifest.
+    """
+    options = conversion_options(parsed_args)
+    options["full_document"] = parsed_args.full_document
+    options["compress"] = parsed_args.compress
+    options["compress_level"] = parsed_args.compress_level
+    return options
+
+
+def convert_batch(image_paths: List[str], parsed_args: argparse.Namespace, shared_mode: bool=False, 
+        loaded: Optional[palette.SharedPalette]=None):
+    """
+    Convert each image into its own files under --output-dir (or next to it), skipping images which are already up to date 
+    according to the batch manifest unless --rebuild was given. Images which fail are reported rather than stopping the batch. 
+    The summary is written to stderr (and --summary), and the exit status is 1 if anything failed.
+
+    If shared_mode is set, the shared palette is built (or loaded is extended) over every image first, even those which turn out
+    to be up to date, and an image is only up to date if the names of its colours in the palette have not changed either. So 
+    adding images with new colours to a --palette-in palette does not convert the others again.
+    """
+    manifest = batch.Manifest(next(
+        directory for directory in (parsed_args.output_dir, parsed_args.input_dir, os.curdir) if directory is not None
+    ))
+    options = batch_options(parsed_args)
+    summary = batch.Summary()
+    shared = None
+    image_options = {path: options for path in image_paths}
+    if shared_mode:
+        shared, counts = make_shared_palette(image_paths, parsed_args, loaded, summary.failed)
+        write_shared_palette(shared, parsed_args)
+        for path, count in counts.items():
+            image_options[path] = dict(options, shared_palette=shared.key(count))
+    to_convert = []
+    for path in image_paths:
+        if path in summary.failed:
+            manifest.forget(path)
+        elif not parsed_args.rebuild and manifest.up_to_date(path, image_options[path]):
+            summary.skipped.append(path)
+        else:
+            to_convert.append(path)
+
+    suffix = compress.extension(parsed_args.compress) if parsed_args.compress is not None else ""
+    try:
+        for path, write_image in zip(to_convert, converted_images(to_convert, parsed_args, shared)):
+            base = batch.output_base(path, parsed_args.input_dir, parsed_args.output_dir)
+            try:
+                os.makedirs(os.path.dirname(base) or os.curdir, exist_ok=True)
+                outputs = write_image_files(base, write_image, parsed_args)
+            except Exception as e:
+                # Don't leave half written files around looking like they are done.
+                for extension in (".html", ".css"):
+                    with contextlib.suppress(OSError):
+                        os.remove(base + extension + suffix)
+                manifest.forget(path)
+                summary.failed[path] = batch.describe_error(e)
+                continue
+            manifest.record(path, image_options[path], outputs)
+            summary.converted.append(path)
+    finally:
+        manifest.save()
+
+    print(summary.format(), file=sys.stderr)
+    if parsed_args.summary is not None:
+        json.dump(summary.todict(), parsed_args.summary, indent=2)
+        parsed_args.summary.write("\n")
+        parsed_args.summary.close()
+    if len(summary.failed) > 0:
+        sys.exit(1)
+
+
+def main():
+    # python -m tableimage serve runs the conversion server instead.
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from . import serve
+        serve.main(sys.argv[2:])
+        return
+    parser = make_parser()
+    parsed_args: argparse.Namespace = parser.parse_args()
+    if parsed_args.colours is not None:
+        try:
+            imagemanipulation.check_quantize_method(parsed_args.quantize_method)
+        except RuntimeError as e:
+            parser.error(str(e))
+    if parsed_args.low_memory and parsed_args.colours is not None:
+        parser.error("--colours needs the whole image in memory, so it cannot be used with --low-memory")
+    if parsed_args.low_memory and parsed_args.format != "table":
+        parser.error("--low-memory only works with --format table")
+    if parsed_args.frames and (parsed_args.low_memory or parsed_args.format != "table"):
+        parser.error("--frames only works with --format table, and not with --low-memory")
+    if parsed_args.frame_delta and not parsed_args.frames:
+        parser.error("--frame-delta needs --frames")
+    for option in ("width", "height", "max_cells"):
+        if getattr(parsed_args, option) is not None and getattr(parsed_args, option) < 1:
+            parser.error("--{} must be at least 1".format(option.replace("_", "-")))
+    if parsed_args.low_memory and (parsed_args.width, parsed_args.height, parsed_args.max_cells) != (None, None, None):
+        parser.error("--width, --height and --max-cells need the whole image in memory, so they cannot be used with --low-memory")
+    if parsed_args.frames and parsed_args.max_cells is not None:
+        parser.error("--max-cells cannot be used with --frames, as every frame has to be the same size")
+    if parsed_args.compress is not None:
+        try:
+            compress.check_available(parsed_args.compress)
+        except RuntimeError as e:
+            parser.error(str(e))
+        if parsed_args.compress == "brotli" and parsed_args.append:
+            parser.error("brotli streams cannot be joined together, so --compress brotli cannot be used with --append")
+    batch_mode = parsed_args.input_dir is not None or parsed_args.glob is not None or parsed_args.output_dir is not None
+    if batch_mode:
+        if parsed_args.combined is not None or parsed_args.seperate is not None:
+            parser.error(
+                "--input-dir, --glob and --output-dir write files for each image, so cannot be used with --combined or --seperate"
+            )
+        if parsed_args.append:
+            parser.error("--input-dir, --glob and --output-dir cannot be used with --append")
+        if "-" in parsed_args.images:
+            parser.error("stdin (-) cannot be converted with --input-dir, --glob or --output-dir")
+        if parsed_args.input_dir is not None and not os.path.isdir(parsed_args.input_dir):
+            parser.error("--input-dir {} is not a directory".format(parsed_args.input_dir))
+    elif len(parsed_args.images) == 0:
+        parser.error("no images given, give some images or use --input-dir or --glob")
+    elif parsed_args.rebuild or parsed_args.summary is not None:
+        parser.error("--rebuild and --summary only work with --input-dir, --glob or --output-dir")
+    else:
+        # Images are opened as they are converted, so check them all now, before any output is truncated. Batches carry on 
+        # past images which cannot be read instead.
+        for path in parsed_args.images:
+            if path == "-":
+                continue
+            try:
+                open(path, "rb").close()
+            except OSError as e:
+                parser.error("can't open '{}': {}".format(path, e))
+
+    shared_mode = parsed_args.shared_palette or parsed_args.palette_in is not None
+    if shared_mode:
+        if parsed_args.no_css or parsed_args.format != "table" or parsed_args.frames:
+            parser.error("--shared-palette only works with --format table, and not with --no-css or --frames")
+        if "-" in parsed_args.images:
+            parser.error("stdin (-) cannot be used with --shared-palette, as every image is read twice")
+        if parsed_args.palette_class is not None and not palette.is_class_name(parsed_args.palette_class):
+            parser.error("--palette-class {} is not a valid css class name".format(parsed_args.palette_class))
+        if parsed_args.palette_css is None and parsed_args.combined is None and parsed_args.seperate is None:
+            parser.error(
+                "--shared-palette needs --palette-css to write the stylesheet to, unless --combined or --seperate is used"
+            )
+    elif parsed_args.palette_class is not None or parsed_args.palette_out is not None or parsed_args.palette_css is not None:
+        parser.error("--palette-class, --palette-out and --palette-css only work with --shared-palette or --palette-in")
+    loaded = None
+    if parsed_args.palette_in is not None:
+        try:
+            loaded = palette.SharedPalette.load(parsed_args.palette_in)
+        except ValueError as e:
+            parser.error("--palette-in {}: {}".format(parsed_args.palette_in.name, e))
+        parsed_args.palette_in.close()
+
+    image_paths = list(parsed_args.images)
+    if parsed_args.input_dir is not None or parsed_args.glob is not None:
+        image_paths.extend(batch.find_images(parsed_args.input_dir, parsed_args.glob))
+
+    # With a shared palette, every image is read once to count its colours before any are written.
+    shared = None
+    shared_css = ""
+    if shared_mode and not batch_mode:
+        shared, _ = make_shared_palette(image_paths, parsed_args, loaded)
+        write_shared_palette(shared, parsed_args)
+        if parsed_args.palette_css is None:
+            shared_css = shared.css(parsed_args.pixel_size, parsed_args.minify)
+    
     # Combine all the html if we want a coherent document output.
     if parsed_args.combined is not None or parsed_args.seperate is not None:
         # If append-mode not specified, truncate the file(s) and jump to beginning.
@@ -167,40 +987,25 @@ def main():
             elif parsed_args.seperate is not None:
                 for f in parsed_args.seperate:
                     to_write_mode(f)
-        html_only_component = '\n'.join(x[1][0] for x in html_and_css.items())
-        css_only_component = '\n'.join(x[1][1] for x in html_and_css.items())
-        # If combined, glue them together, write, then close. Else, leave them separate, write to each file, then close.
+        converted = converted_images(image_paths, parsed_args, shared)
+        # If combined, glue them together while writing, then close. Else, leave them separate, write to each file, then close.
         # If full document, combine regardless.
-        if parsed_args.full_document:
-            html_only_component = to_full_html_document(combine_html_css(html_only_component, css_only_component))
-            css_only_component = ""
+        # Compressed output is a stream (or with --append, another gzip member or zstd frame) of its own.
         if parsed_args.combined is not None:
-            parsed_args.combined.write(combine_html_css(html_only_component, css_only_component))
+            with output_sink(parsed_args.combined, parsed_args) as html_sink:
+                write_document(converted, parsed_args, html_sink, shared_css=shared_css)
             parsed_args.combined.close()
         elif parsed_args.seperate is not None:
-            parsed_args.seperate[0].write(html_only_component)
-            if len(css_only_component.strip()) > 0: 
-                parsed_args.seperate[1].write(css_only_component)
+            with output_sink(parsed_args.seperate[0], parsed_args) as html_sink, \
+                    output_sink(parsed_args.seperate[1], parsed_args) as css_sink:
+                write_document(converted, parsed_args, html_sink, css_sink, shared_css)
             for f in parsed_args.seperate:
                 f.close()
 
-    else:  # Now we can generate documents for each picture.
-        for basename, html_css_pair in html_and_css.items():
-            html_component = html_css_pair[0]
-            css_component = html_css_pair[1]
-            if parsed_args.full_document:
-                html_component = to_full_html_document(combine_html_css(html_component, css_component))
-                css_component = ""
-
-            with open(basename + ".html", 'a') as htmlfile:
-                if not parsed_args.append:
-                    to_write_mode(htmlfile)
-                htmlfile.write(html_component)
-
-            if len(css_component.strip()) > 0:
-                with open(basename + ".css", 'a') as cssfile:
-                    if not parsed_args.append:
-                        to_write_mode(cssfile)
-                    cssfile.write(css_component)
-            
+    elif batch_mode:
+        convert_batch(image_paths, parsed_args, shared_mode, loaded)
 
+    else:  # Now we can generate documents for each picture.
+        converted = converted_images(image_paths, parsed_args, shared)
+        for path, write_image in zip(image_paths, converted):
+            write_image_files(_image_name(path), write_image, parsed_args)
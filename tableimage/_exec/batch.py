@@ -0,0 +1,160 @@
+"""
+Batch conversion of whole directories (--input-dir/--glob), with incremental rebuilds.
+
+A manifest in the output directory remembers, for every image converted, its modification time, size and hash, the options it was
+converted with and the files written. Images whose outputs are still there and newer than them, and whose options have not
+changed, are skipped on the next run. If only the modification time of an image changed, its hash decides.
+"""
+from .._typing import *
+import glob
+import hashlib
+import json
+import os
+from PIL import Image
+
+manifest_name = ".tableimage-manifest.json"
+_manifest_version = 1
+
+
+def find_images(input_dir: Optional[str], pattern: Optional[str]) -> List[str]:
+    """
+    Find the images to convert, sorted by path. pattern is a glob (where ** matches any number of directories), relative to
+    input_dir if given. Without a pattern, every file under input_dir with an extension Pillow knows is an image.
+    """
+    base = input_dir if input_dir is not None else ""
+    if pattern is not None:
+        paths = glob.glob(os.path.join(base, pattern), recursive=True)
+    else:
+        extensions = Image.registered_extensions()
+        paths = glob.glob(os.path.join(base, "**", "*"), recursive=True)
+        paths = [path for path in paths if os.path.splitext(path)[1].lower() in extensions]
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def output_base(path: str, input_dir: Optional[str], output_dir: Optional[str]) -> str:
+    """
+    Get the path the outputs of the image at path are named after (by adding .html or .css). With an output directory, images
+    are put in the same place relative to it as they are relative to input_dir (or the current directory).
+    """
+    if output_dir is None:
+        return path
+    relative = os.path.relpath(path, input_dir if input_dir is not None else os.curdir)
+    if relative.startswith(os.pardir):  # Outside of the input directory, so it goes at the top.
+        relative = os.path.basename(path)
+    return os.path.join(output_dir, relative)
+
+
+def file_hash(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024*1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Manifest(object):
+    """
+    The record of what has been converted, kept as JSON in directory. Images are keyed by their path relative to directory, and 
+    their outputs are stored relative to it too, so the directory can be moved.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, manifest_name)
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        if stored.get("version") == _manifest_version:
+            self.entries = stored.get("files", {})
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.directory))
+
+    @staticmethod
+    def _normalise(options: Dict[str, Any]) -> Dict[str, Any]:
+        # Tuples come back from JSON as lists, so options are compared the way they are stored.
+        return json.loads(json.dumps(options, sort_keys=True))
+
+    def up_to_date(self, path: str, options: Dict[str, Any]) -> bool:
+        """
+        Check whether the image at path was converted with options, and the outputs are still there and newer than it.
+        """
+        entry = self.entries.get(self._key(path))
+        if entry is None or entry["options"] != self._normalise(options):
+            return False
+        try:
+            stat = os.stat(path)
+            outputs = (os.path.join(self.directory, output) for output in entry["outputs"])
+            if any(os.stat(output).st_mtime < stat.st_mtime for output in outputs):
+                return False
+        except OSError:
+            return False
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime != entry["mtime"]:
+            # Touched (or copied) but maybe not changed.
+            if file_hash(path) != entry["sha256"]:
+                return False
+            entry["mtime"] = stat.st_mtime
+        return True
+
+    def record(self, path: str, options: Dict[str, Any], outputs: List[str]):
+        """
+        Record that the image at path was converted with options into outputs.
+        """
+        stat = os.stat(path)
+        self.entries[self._key(path)] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": file_hash(path),
+            "options": self._normalise(options),
+            "outputs": [self._key(output) for output in outputs],
+        }
+
+    def forget(self, path: str):
+        self.entries.pop(self._key(path), None)
+
+    def save(self):
+        """
+        Write the manifest out, replacing the old one in one go so it is never left half written.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = "{}.{!s}.tmp".format(self.path, os.getpid())
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"version": _manifest_version, "files": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(temporary_path, self.path)
+
+
+def describe_error(error: Exception) -> str:
+    """
+    Describe why an image failed as the class of the exception and its message. The path of the image is given along with it, so
+    the file Pillow puts in the message of images it cannot identify is left out, as is the path OSErrors add to their message.
+    """
+    if isinstance(error, Image.UnidentifiedImageError):
+        message = "cannot identify image file"
+    elif isinstance(error, OSError) and error.strerror:
+        message = error.strerror
+    else:
+        message = str(error)
+    return "{}: {}".format(type(error).__name__, message) if message else type(error).__name__
+
+
+class Summary(object):
+    """
+    Which images of a batch were converted, skipped (already up to date) and failed, with why.
+    """
+    def __init__(self):
+        self.converted = []
+        self.skipped = []
+        self.failed = {}
+
+    def format(self) -> str:
+        lines = ["{!s} converted, {!s} skipped, {!s} failed".format(len(self.converted), len(self.skipped), len(self.failed))]
+        for path, error in self.failed.items():
+            lines.append("  failed: {}: {}".format(path, error))
+        return "\n".join(lines)
+
+    def todict(self) -> Dict[str, Any]:
+        return {"converted": self.converted, "skipped": self.skipped, "failed": self.failed}
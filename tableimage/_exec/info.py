@@ -43,17 +43,241 @@ Using this switch causes the output of the command, if it is going to files, to
 than overwriting it.
 """
 
+compress_info="""
+This argument compresses the output as it is written, with gzip, zstd (needs the zstandard package) or brotli (needs the brotli 
+package), so it can be served directly with a Content-Encoding header. Files written for each image get .gz, .zst or .br added to 
+their names. Compression runs in the background while the images are converted.
+"""
+
+compress_level_info="""
+This argument sets the compression level (default: 9 for gzip and brotli, 12 for zstd).
+"""
+
 pixel_size_info="""
 This argument controls how many html pixels each image pixel is (default: %(default)s).
 """
 
+width_info="""
+This argument scales each image down (never up) to at most this many pixels wide before it is converted, keeping its aspect ratio. 
+Every image pixel is a cell or part of one, so this is the surest way to make the output of a large image smaller. JPEGs are decoded 
+straight at 1/2, 1/4 or 1/8 scale where that is still big enough, which is much faster than decoding them whole.
+"""
+
+height_info="""
+This argument scales each image down (never up) to at most this many pixels high, like --width. With both, the image fits within 
+both.
+"""
+
+max_cells_info="""
+This argument scales each image down until it has no more than N runs of colour, which is how many cells the table has (before 
+--merge-rows) and so roughly how big the output is and how long browsers take to lay it out. The scale is picked from how many 
+runs there are, so it usually takes one or two goes. It works after --width and --height, and cannot be used with --frames.
+"""
+
+resample_info="""
+This argument picks the filter used to scale images down with --width, --height and --max-cells (default: %(default)s). box 
+averages the pixels which go into each one, lanczos is sharper but slower, and nearest just picks one, which is fastest and keeps 
+runs of exactly the same colour (such as in pixel art) intact.
+"""
+
+colours_info="""
+This argument reduces each image to at most N colours (2 to 256) before it is converted. Photos have very few runs of exactly the 
+same colour, so this makes the output MUCH smaller, at the cost of some colour accuracy.
+"""
+
+quantize_method_info="""
+This argument picks how --colours chooses the colours to keep (default: %(default)s). libimagequant only works if Pillow was 
+built with it.
+"""
+
+dither_info="""
+Using this switch causes --colours to dither the image, which looks closer to the original but breaks up runs of colour, so the 
+output is bigger.
+"""
+
+merge_rows_info="""
+Using this switch causes runs of colour which line up exactly on consecutive rows to be merged into a single cell spanning several 
+rows. This cuts the number of cells (and so how long browsers take to lay out the table) for images with large flat areas. How many 
+cells were saved is reported on stderr, except for images whose output was reused from the cache (which --stats shows as a cache 
+hit).
+"""
+
+minify_info="""
+Using this switch makes the output as small as possible without changing how it looks. Column widths are set once rather than on 
+every cell, colours are shortened to #rgb where possible, attribute quotes, optional end tags and newlines are left out, and the css 
+selectors are shortened.
+"""
+
+frames_info="""
+Using this switch converts every frame of animated images (GIF, APNG, WebP, ...), rather than only the first. The frames are tables 
+stacked on top of each other, sharing one palette, and a css animation shows each in turn for as long as the image says. The 
+animation is always in the css, even with --no-css. Animations are not cached.
+"""
+
+frame_delta_info="""
+Using this switch (with --frames) only puts the runs which changed since the frame before into each frame after the first, leaving 
+the rest see-through so the frames underneath show. Most of an animation usually stays the same between frames, so this makes the 
+output much smaller.
+"""
+
+format_info="""
+This argument picks what the image is drawn with (default: %(default)s). "table" is a html table. "canvas" is a <canvas> painted by
+a small script from a compact run-length payload, which is much smaller and faster to show, but needs javascript. "grid" is a css
+grid with an element per run, and "svg" is an inline svg with a <rect> per run; both are laid out faster than a table. --minify
+only affects tables, and --low-memory only works with tables.
+"""
+
+shared_palette_info="""
+Using this switch gives every image the same palette, built from the colours of all of them, so a page of many images has one 
+stylesheet for their colours rather than one per image. The tables get a class (see --palette-class) instead of css of their own. 
+Every image is read twice, once to count its colours and once to convert it. Only works with --format table, and not with --no-css 
+or --frames.
+"""
+
+palette_class_info="""
+This argument sets the class the tables of a shared palette get, which the shared stylesheet is scoped by (default: tableimage, 
+or the class of --palette-in).
+"""
+
+palette_in_info="""
+This argument reuses a shared palette saved with --palette-out (and turns on --shared-palette), so new images can use a stylesheet 
+browsers already have cached. Colours the palette does not have yet are added to it with new names, and the colours it has keep 
+theirs. Save it again with --palette-out and replace the old stylesheet with the new one.
+"""
+
+palette_out_info="""
+This argument saves the shared palette to FILE as JSON, for --palette-in. It can be the same file as --palette-in.
+"""
+
+palette_css_info="""
+This argument writes the stylesheet of the shared palette to FILE, to be linked from every page, rather than putting it in the 
+output. It is needed when each image gets its own files.
+"""
+
+tolerance_info="""
+This argument lets runs of colour carry on through pixels which are not exactly the same colour, as long as they are within this 
+distance of the first pixel of the run (default: %(default)s, exact matches only). This is lossy, but makes the output of noisy 
+images such as JPEGs MUCH smaller.
+"""
+
+tolerance_metric_info="""
+This argument picks how the distance for --tolerance is measured (default: %(default)s). channel is the largest difference between 
+the red, green and blue values (0-255). cie76 is the perceptual distance in the CIE L*a*b* colour space, where about 2.3 is just 
+noticeable.
+"""
+
+jobs_info="""
+This argument controls how many images are converted at the same time, each in its own process (default: %(default)s). A value of 0 
+uses one process per CPU. The output is the same, and in the same order, whatever the number of jobs.
+"""
+
+bands_info="""
+This argument splits each image into this many horizontal bands, which are converted at the same time using the --jobs processes 
+(default: %(default)s, no splitting). This speeds up converting a few very large images. The output is the same either way.
+"""
+
+low_memory_info="""
+Using this switch converts each image a strip of rows at a time, in two passes (one to count the colours for the css, one to write 
+the html), so memory use depends on the width of the image rather than its size. Uncompressed images (PPM, BMP, TIFF) are read 
+straight from the file, other formats still have to be decoded all at once. The output is the same, but the cache and --bands are 
+not used, and --colours, --width, --height and --max-cells cannot be used.
+"""
+
+stats_info="""
+Using this switch causes stats about each image to be written to stderr: how long each stage of the conversion took (wall and CPU 
+time), the number of pixels, runs, cells and colours, the lengths of the css class names, and the size of the output. Giving json 
+writes one line of JSON per image instead of text.
+"""
+
+cache_dir_info="""
+This argument sets the directory conversions are cached in (default: $XDG_CACHE_HOME/tableimage, or ~/.cache/tableimage). Converting 
+the same image with the same options again reuses the cached output. Tables get an id derived from the image and options rather 
+than a random one, so the output is always the same. Reused output shows up as a cache hit in --stats, and is not counted by 
+--merge-rows.
+"""
+
+cache_size_info="""
+This argument sets the size in megabytes the cache is kept under, by deleting the least recently used entries 
+(default: %(default)s).
+"""
+
+no_cache_info="""
+Using this switch turns off the conversion cache. Tables get random ids, like in older versions.
+"""
+
 background_colour_info="""
 This argument allows specification of a background colour to blend with images which contain transparency. Arguments outside the 
 0-255 range are clamped to that range. The default colour is white (255, 255, 255)
 """
 
+serve_info="""
+This runs a conversion server, which keeps worker processes around so each conversion does not pay for starting Python. Images are 
+POSTed to /convert, with options in the query string named like the command-line args with underscores (pixel_size, no_css, 
+background=R,G,B, full_document, ...), and the html is streamed back as it is rendered. GET /health says how busy it is.
+"""
+
+serve_host_info="""
+This argument sets the address to listen on (default: %(default)s).
+"""
+
+serve_port_info="""
+This argument sets the port to listen on (default: %(default)s).
+"""
+
+serve_unix_info="""
+This argument makes the server listen on a Unix socket at PATH instead of a TCP port.
+"""
+
+serve_workers_info="""
+This argument sets how many worker processes convert images (default: one per CPU).
+"""
+
+serve_max_concurrency_info="""
+This argument sets how many conversions can run at once (default: the number of workers).
+"""
+
+serve_max_queue_info="""
+This argument sets how many requests can wait for a conversion to finish before new ones are turned away with a 503 (default: 4 
+times --max-concurrency).
+"""
+
+serve_max_body_info="""
+This argument sets the largest image accepted in megabytes (default: %(default)s).
+"""
+
+serve_cache_dir_info="""
+This argument turns on the conversion cache, kept in this directory. The server does not cache anything by default.
+"""
+
+input_dir_info="""
+This argument converts every image in DIR (and the directories inside it), as well as any images given. Each image gets its own 
+files, as without --combined or --seperate. Images which have not changed since they were last converted with the same options 
+are skipped, see --output-dir. A summary of what was converted, skipped and failed is written to stderr, and an image which fails 
+does not stop the others.
+"""
+
+glob_info="""
+This argument converts the images matching PATTERN (relative to --input-dir if given), where ** matches any number of 
+directories, e.g. "photos/**/*.jpg". Without it, --input-dir converts every file with an extension Pillow can read.
+"""
+
+output_dir_info="""
+This argument puts the files for each image in DIR, in the same place relative to it as the image is relative to --input-dir (or 
+the current directory), rather than next to the image. A manifest of the size, modification time and hash of each image and the 
+options it was converted with is kept in this directory (or --input-dir, or the current directory), so images are only converted 
+again when they or the options change, or their files are missing or older than them.
+"""
+
+rebuild_info="""
+Using this switch converts every image in a batch, even if the manifest says it is up to date.
+"""
+
+summary_info="""
+This argument writes the lists of images converted, skipped and failed (with why) in a batch to FILE as JSON.
+"""
+
 images_info="""
-Images to convert into HTML/CSS tables.
+Images to convert into HTML/CSS tables. - reads an image from stdin.
 """
 
 program_info="""
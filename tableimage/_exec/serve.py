@@ -0,0 +1,466 @@
+"""
+A long-running conversion server, run with python -m tableimage serve. Starting Python and importing Pillow for every image costs
+more than converting small ones, so this keeps a pool of warm worker processes around instead.
+
+Images are POSTed to /convert as the request body, with the options in the query string, named like conversion_options:
+
+    curl --data-binary @image.png "http://127.0.0.1:8000/convert?pixel_size=2&no_css=1&background=0,0,0&full_document=1"
+
+The html is streamed back as the worker renders it, followed by the css in <style> tags, just like --combined. A worker only
+renders as fast as the client reads, and at most --max-concurrency conversions run at once, with up to --max-queue more waiting
+for a worker. Requests beyond that get a 503.
+"""
+from . import conversion_options, make_parser, write_converted_image, combine_html_css, make_cache, info, \
+    _full_document_start, _full_document_end
+from .. import imagemanipulation, colour, renderers
+from .._typing import *
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import time
+import urllib.parse
+from PIL import Image
+
+_reasons = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 408: "Request Timeout", 411: "Length Required",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """
+    An error to answer a request with, instead of converting it.
+    """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _flag(value: str) -> bool:
+    if value.lower() in ("", "1", "true", "yes", "on"):
+        return True
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError("expected 1 or 0")
+
+
+def _background(value: str) -> Tuple[int, int, int]:
+    components = tuple(min(255, max(0, int(component))) for component in value.split(","))
+    if len(components) != 3:
+        raise ValueError("expected R,G,B")
+    return components
+
+
+def _ranged(low: int, high: int) -> Callable[[str], int]:
+    def convert(value: str) -> int:
+        number = int(value)
+        if not low <= number <= high:
+            raise ValueError("expected {!s} to {!s}".format(low, high))
+        return number
+    return convert
+
+
+def _choice(choices: Iterable[str]) -> Callable[[str], str]:
+    choices = list(choices)
+
+    def convert(value: str) -> str:
+        if value not in choices:
+            raise ValueError("expected one of {}".format(", ".join(choices)))
+        return value
+    return convert
+
+
+# The conversion_options which can be given in the query string, and how to parse them.
+_option_types = {
+    "background": _background,
+    "no_css": _flag,
+    "pixel_size": _ranged(1, 1000),
+    "colours": _ranged(2, 256),
+    "quantize_method": _choice(imagemanipulation.quantize_methods.keys()),
+    "dither": _flag,
+    "tolerance": float,
+    "metric": _choice(colour.metrics),
+    "merge_rows": _flag,
+    "minify": _flag,
+    "format": _choice(renderers.renderers.keys()),
+    "frames": _flag,
+    "frame_delta": _flag,
+    "width": _ranged(1, 1 << 16),
+    "height": _ranged(1, 1 << 16),
+    "max_cells": _ranged(1, 1 << 32),
+    "resample": _choice(imagemanipulation.resample_filters.keys()),
+}
+
+
+def default_options() -> Dict[str, Any]:
+    """
+    Get the conversion_options used when a request does not give them, which are the defaults of the command-line args.
+    """
+    return conversion_options(make_parser().parse_args([]))
+
+
+def request_options(query: str, defaults: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Parse the query string of a request into conversion_options, starting from defaults, and whether the output should be a full
+    document. Raises HTTPError for anything invalid.
+    """
+    options = dict(defaults)
+    full_document = False
+    for name, value in urllib.parse.parse_qsl(query, keep_blank_values=True):
+        try:
+            if name == "full_document":
+                full_document = _flag(value)
+            elif name in _option_types:
+                options[name] = _option_types[name](value)
+            else:
+                raise HTTPError(400, "unknown option {}".format(name))
+        except ValueError as e:
+            raise HTTPError(400, "bad value for {}: {}".format(name, e))
+    if options["frames"] and options["format"] != "table":
+        raise HTTPError(400, "frames only works with format=table")
+    if options["colours"] is not None:
+        try:
+            imagemanipulation.check_quantize_method(options["quantize_method"])
+        except RuntimeError as e:
+            raise HTTPError(400, str(e))
+    if options["frames"] and options["max_cells"] is not None:
+        raise HTTPError(400, "max_cells cannot be used with frames")
+    return options, full_document
+
+
+class _PipeSink(object):
+    """
+    Text sink in a worker, sending what is written to it back to the server in chunks of about chunk_size characters. Sending
+    blocks while the pipe is full, so a worker only renders as fast as the server can pass the html on.
+    """
+    def __init__(self, connection, chunk_size: int=64*1024):
+        self._connection = connection
+        self._chunk_size = chunk_size
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, text: str):
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._connection.send(("html", "".join(self._pending)))
+            self._pending = []
+            self._pending_size = 0
+
+
+def _work(connection, cache_dir: Optional[str]):
+    """
+    Worker process: convert the (image bytes, options) jobs sent down connection, sending back ("html", text) messages as the
+    image is rendered, then ("css", text), or ("error", message) if it went wrong. None stops the worker.
+    """
+    conversion_cache = make_cache(argparse.Namespace(no_cache=cache_dir is None, cache_dir=cache_dir, cache_size=512))
+    connection.send(("ready", None))
+    while True:
+        job = connection.recv()
+        if job is None:
+            return
+        image_bytes, options, name = job
+        sink = _PipeSink(connection)
+        css = io.StringIO()
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            write_converted_image(image, options, sink, css, name=name, conversion_cache=conversion_cache)
+            sink.flush()
+        except Exception as e:
+            connection.send(("error", "{}: {}".format(type(e).__name__, e)))
+            continue
+        connection.send(("css", css.getvalue()))
+
+
+class _Worker(object):
+    """
+    The server side of a worker process.
+    """
+    def __init__(self, context, cache_dir: Optional[str]):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_work, args=(child, cache_dir), daemon=True, name="tableimage-worker")
+        self.process.start()
+        child.close()
+
+
+class WorkerPool(object):
+    """
+    A fixed number of warm worker processes, lent out to one request at a time. Workers which die are replaced.
+    """
+    def __init__(self, workers: int, cache_dir: Optional[str]=None):
+        self._size = workers
+        self._cache_dir = cache_dir
+        # Workers are started fresh rather than forked, so they never inherit the event loop or its threads.
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = None
+        self._workers = []
+        # Receiving blocks, so it happens in threads, one per worker.
+        self._threads = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tableimage-recv")
+
+    async def recv(self, worker: _Worker) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._threads, worker.connection.recv)
+
+    async def _start_worker(self) -> _Worker:
+        worker = _Worker(self._context, self._cache_dir)
+        message, _ = await self.recv(worker)
+        if message != "ready":
+            raise RuntimeError("worker sent {!r} instead of saying it was ready".format(message))
+        self._workers.append(worker)
+        return worker
+
+    async def start(self):
+        """
+        Start all the workers, waiting until each has imported everything and is ready to convert.
+        """
+        self._idle = asyncio.Queue()
+        for worker in await asyncio.gather(*(self._start_worker() for _ in range(self._size))):
+            self._idle.put_nowait(worker)
+
+    @contextlib.asynccontextmanager
+    async def worker(self) -> AsyncIterator[_Worker]:
+        """
+        Context manager borrowing an idle worker, waiting for one if they are all busy. Whoever borrows it must take every message
+        for its job before giving it back. If the worker died, or the job was cancelled partway, it is replaced.
+        """
+        worker = await self._idle.get()
+        try:
+            yield worker
+        except (EOFError, OSError, asyncio.CancelledError):
+            self._retire(worker)
+            self._idle.put_nowait(await self._start_worker())
+            raise
+        except BaseException:
+            self._idle.put_nowait(worker)
+            raise
+        self._idle.put_nowait(worker)
+
+    def _retire(self, worker: _Worker):
+        self._workers.remove(worker)
+        worker.process.kill()
+        worker.connection.close()
+
+    def close(self):
+        for worker in list(self._workers):
+            self._retire(worker)
+        self._threads.shutdown(wait=False)
+
+
+class ConversionServer(object):
+    """
+    Answers HTTP requests on the streams of asyncio.start_server (or start_unix_server), converting images with a WorkerPool.
+    """
+    def __init__(self, pool: WorkerPool, max_concurrency: int, max_queue: int, max_body: int, timeout: float=30):
+        self._pool = pool
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._max_body = max_body
+        self._timeout = timeout
+        self._defaults = default_options()
+        self._waiting = 0
+        self._active = 0
+
+    async def _read_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+            ) -> Tuple[str, str, Dict[str, str], bytes]:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self._timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(408, "timed out reading the request")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(400, "request headers too long")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "bad request line")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        if method != "POST":
+            return method, target, headers, b""
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "the request needs a Content-Length")
+        try:
+            length = int(headers.get("content-length", ""))
+        except ValueError:
+            raise HTTPError(411, "the request needs a Content-Length")
+        if length > self._max_body:
+            raise HTTPError(413, "images can be at most {!s} bytes".format(self._max_body))
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        try:
+            body = await asyncio.wait_for(reader.readexactly(length), self._timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(408, "timed out reading the image")
+        return method, target, headers, body
+
+    @staticmethod
+    def _start_response(writer: asyncio.StreamWriter, status: int, content_type: str="text/html; charset=utf-8",
+            extra: str=""):
+        writer.write("HTTP/1.1 {!s} {}\r\nContent-Type: {}\r\nTransfer-Encoding: chunked\r\nConnection: close\r\n{}\r\n".format(
+            status, _reasons[status], content_type, extra
+        ).encode("latin-1"))
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, text: str):
+        data = text.encode("utf-8")
+        if data:
+            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _respond(self, writer: asyncio.StreamWriter, status: int, text: str, extra: str=""):
+        self._start_response(writer, status, "text/plain; charset=utf-8", extra)
+        self._write_chunk(writer, text + "\n")
+        writer.write(b"0\r\n\r\n")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answer one request, then close the connection.
+        """
+        start = time.perf_counter()
+        status = 500
+        target = "-"
+        try:
+            try:
+                method, target, headers, body = await self._read_request(reader, writer)
+                path, _, query = target.partition("?")
+                if path == "/health":
+                    status = 200
+                    self._respond(writer, status, "ok {!s} active {!s} waiting".format(self._active, self._waiting))
+                elif path != "/convert":
+                    raise HTTPError(404, "images are converted by POSTing them to /convert")
+                elif method != "POST":
+                    raise HTTPError(405, "images are converted by POSTing them to /convert")
+                else:
+                    options, full_document = request_options(query, self._defaults)
+                    status = await self._convert(writer, body, options, full_document)
+            except HTTPError as e:
+                status = e.status
+                extra = "Retry-After: 1\r\n" if status == 503 else ""
+                self._respond(writer, status, e.message, extra)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            status = 499  # The client went away (or the conversion failed partway).
+        finally:
+            writer.close()
+            print("{} {!s} {:.3f}s".format(target, status, time.perf_counter() - start), file=sys.stderr, flush=True)
+
+    async def _convert(self, writer: asyncio.StreamWriter, image_bytes: bytes, options: Dict[str, Any],
+            full_document: bool) -> int:
+        """
+        Convert an image in a worker, streaming the html to writer as it arrives. Returns the status of the response.
+        """
+        if self._slots.locked() and self._waiting >= self._max_queue:
+            raise HTTPError(503, "too many conversions already waiting")
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._active += 1
+        try:
+            async with self._pool.worker() as worker:
+                worker.connection.send((image_bytes, options, "<upload>"))
+                return await self._stream(worker, writer, full_document)
+        except EOFError:
+            raise HTTPError(500, "the worker converting the image died")
+        finally:
+            self._active -= 1
+            self._slots.release()
+
+    async def _stream(self, worker: _Worker, writer: asyncio.StreamWriter, full_document: bool) -> int:
+        """
+        Pass the messages of a worker's job on to writer. If the client goes away, the rest of the job is still taken from the
+        worker, so it can be given another.
+        """
+        started = False
+        finished = False
+        try:
+            while True:
+                kind, text = await self._pool.recv(worker)
+                finished = kind != "html"
+                if kind == "error":
+                    if started:  # Too late for an error status, so end the response without finishing it.
+                        raise ConnectionError(text)
+                    raise HTTPError(400 if text.startswith("UnidentifiedImageError") else 500, text)
+                if not started:
+                    self._start_response(writer, 200)
+                    if full_document:
+                        self._write_chunk(writer, _full_document_start)
+                    started = True
+                if kind == "html":
+                    self._write_chunk(writer, text)
+                else:  # The css comes last.
+                    self._write_chunk(writer, combine_html_css("", text))
+                    if full_document:
+                        self._write_chunk(writer, _full_document_end)
+                    writer.write(b"0\r\n\r\n")
+                    return 200
+                # Wait for the client to take the html before taking more from the worker.
+                await writer.drain()
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            while not finished:
+                kind, _ = await self._pool.recv(worker)
+                finished = kind != "html"
+            raise
+
+
+def make_serve_parser() -> argparse.ArgumentParser:
+    """
+    Create a parser for the command-line args of the server.
+    """
+    parser = argparse.ArgumentParser(prog="python -m tableimage serve", description=info.serve_info)
+    parser.add_argument("--host", default="127.0.0.1", help=info.serve_host_info)
+    parser.add_argument("--port", type=int, default=8000, help=info.serve_port_info)
+    parser.add_argument("--unix", default=None, metavar="PATH", help=info.serve_unix_info)
+    parser.add_argument("--workers", type=int, default=0, help=info.serve_workers_info)
+    parser.add_argument("--max-concurrency", type=int, default=0, help=info.serve_max_concurrency_info)
+    parser.add_argument("--max-queue", type=int, default=None, help=info.serve_max_queue_info)
+    parser.add_argument("--max-body", type=int, default=64, metavar="MB", help=info.serve_max_body_info)
+    parser.add_argument("--cache-dir", default=None, help=info.serve_cache_dir_info)
+    return parser
+
+
+async def serve(parsed_args: argparse.Namespace):
+    """
+    Run the server until it is cancelled.
+    """
+    workers = parsed_args.workers if parsed_args.workers > 0 else (os.cpu_count() or 1)
+    max_concurrency = parsed_args.max_concurrency if parsed_args.max_concurrency > 0 else workers
+    max_queue = parsed_args.max_queue if parsed_args.max_queue is not None else 4*max_concurrency
+    pool = WorkerPool(workers, parsed_args.cache_dir)
+    await pool.start()
+    try:
+        server = ConversionServer(pool, max_concurrency, max_queue, parsed_args.max_body*1024*1024)
+        if parsed_args.unix is not None:
+            listener = await asyncio.start_unix_server(server.handle, parsed_args.unix)
+            where = parsed_args.unix
+        else:
+            listener = await asyncio.start_server(server.handle, parsed_args.host, parsed_args.port)
+            where = "http://{}:{!s}".format(parsed_args.host, parsed_args.port)
+        print("Serving on {} with {!s} workers".format(where, workers), file=sys.stderr, flush=True)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        pool.close()
+
+
+def main(args: Optional[List[str]]=None):
+    parsed_args = make_serve_parser().parse_args(args)
+    try:
+        asyncio.run(serve(parsed_args))
+    except KeyboardInterrupt:
+        pass
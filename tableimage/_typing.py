@@ -1,4 +1,4 @@
 """
 Typing.
 """
-from typing import Dict, Callable, Tuple, Any, Optional, Set, Generic, TypeVar, Union, List, T
+from typing import Dict, Callable, Tuple, Any, Optional, Set, Generic, TypeVar, Union, List, Iterable, Iterator, Sequence, AsyncIterator, Awaitable, ContextManager, T
@@ -0,0 +1,188 @@
+"""
+Converting animated images (GIF, APNG, WebP, ...) into a table per frame, stacked on top of each other and shown in turn by a css
+animation.
+
+All the frames share one palette, built from the colours of every frame, so the css for the colours is only written once. In delta
+mode only the first frame is a whole table. Every frame after it only has the runs which changed since the frame before, with the
+rest left as see-through gaps, and stays visible on top of the frames before it until the animation starts over. Most rows of most
+animations are the same from one frame to the next, so this is usually much smaller and quicker.
+
+    pixels = data.PixelAccessPillowFrames(Image.open("animation.gif"))
+    tables, durations = pixels.getruntables()
+    write_html_css_frames(tables, durations, html_file, css_file, delta=True, loop=pixels.getloop())
+"""
+from . import data, stats, random_table_id, _sink_writer, _counting_writer, _counts_to_palette, _record_palette, _table_start, \
+    _render_rows, _render_css, _iter_columns, _row_columns, _rowspans, _cell_count
+from ._typing import *
+
+# Class of the see-through gaps in delta frames. It has no css rule, and palette classes are only letters so it never clashes.
+_gap_class = "_"
+
+
+def _delta_rows(previous: data.RunTable, table: data.RunTable) -> Optional[List[List[Tuple[int, Optional[data.RGB]]]]]:
+    """
+    Get the rows of table for a delta frame on top of previous, which must be the same size. Runs which are the same as in
+    previous (starting in the same column, with the same length and colour) become gaps, which have None as their colour, and
+    gaps next to each other are joined up. Rows which have not changed at all are a single gap, and the unchanged rows at the
+    bottom are left out.
+
+    Returns None if nothing changed.
+    """
+    rows = []
+    changed = 0
+    width = table.getwidth()
+    for y in range(table.getheight()):
+        start, end = table.row_offsets[y], table.row_offsets[y + 1]
+        previous_start, previous_end = previous.row_offsets[y], previous.row_offsets[y + 1]
+        lengths, colours = table.lengths[start:end], table.colours[start:end]
+        previous_lengths = previous.lengths[previous_start:previous_end]
+        previous_colours = previous.colours[previous_start:previous_end]
+        if lengths == previous_lengths and colours == previous_colours:
+            rows.append([(width, None)])
+            continue
+
+        unchanged = set()
+        column = 0
+        for length, colour in zip(previous_lengths, previous_colours):
+            unchanged.add((column, length, colour))
+            column += length
+        row = []
+        column = 0
+        for length, colour in zip(lengths, colours):
+            if (column, length, colour) not in unchanged:
+                row.append((length, data.unpack_rgb(colour)))
+            elif len(row) > 0 and row[-1][1] is None:
+                row[-1] = (row[-1][0] + length, None)
+            else:
+                row.append((length, None))
+            column += length
+        rows.append(row)
+        changed = len(rows)
+
+    if changed == 0:
+        return None
+    del rows[changed:]
+    return rows
+
+
+def _keyframes(name: str, start: int, end: int, total: int, minify: bool) -> Optional[str]:
+    """
+    Get the @keyframes rule showing a frame from start until end milliseconds into an animation lasting total milliseconds, or
+    None if it is always shown.
+    """
+    if start == 0 and end >= total:
+        return None
+    hidden, visible = ('{visibility:hidden}', '{visibility:visible}') if minify else \
+            ('{visibility:hidden;}', '{visibility:visible;}')
+    steps = ['0%' + visible] if start == 0 else ['0%' + hidden, '{:.6g}%'.format(100 * start / total) + visible]
+    if end < total:
+        steps.append('{:.6g}%'.format(100 * end / total) + hidden)
+    return '@keyframes {}{{{}}}'.format(name, "".join(steps)) + ('' if minify else '\n')
+
+
+def write_html_css_frames(tables: List[data.RunTable], durations: List[int], html_sink: Any, css_sink: Any, no_css: bool=False,
+        pixel_size: int=3, table_id: Optional[str]=None, merge_rows: bool=False, palette: Optional[Dict[data.RGB, str]]=None,
+        minify: bool=False, delta: bool=False, loop: Optional[int]=0) -> int:
+    """
+    Version of write_html_css for animations. tables holds the runs of each frame and durations how long each is shown for in
+    milliseconds, as returned by data.PixelAccessPillowFrames.getruntables. The tables are wrapped in a <div> with table_id as
+    its id (random if None), and the frames get ids made from it.
+
+    If delta is set, frames after the first only have the runs which changed since the frame before, see the module docs. Frames
+    which are exactly the same as the one before are never repeated, whether delta is set or not.
+
+    loop is how many times the animation is played, where 0 is forever and None is once. Once it is over, the last frame is
+    left showing. The animation is always in the css, even with no_css, which only moves the colours into the html.
+
+    Returns the number of <td> cells written.
+    """
+    write_html = _sink_writer(html_sink)
+    write_css = _sink_writer(css_sink)
+    collector = stats.active()
+    if collector is not None:
+        write_html = _counting_writer(write_html, collector, "html_bytes")
+        write_css = _counting_writer(write_css, collector, "css_bytes")
+    table_id = table_id if table_id is not None else random_table_id()
+
+    render_palette = None
+    if no_css:
+        palette = None
+    else:
+        if palette is None:
+            # Counted frame by frame, so colours are in the order they first appear in the animation.
+            with stats.stage("palette"):
+                count = {}
+                for table in tables:
+                    for colour, pixels in table.colour_counts().items():
+                        count[colour] = count.get(colour, 0) + pixels
+                palette = _counts_to_palette(count)
+        if collector is not None:
+            _record_palette(collector, None, palette)
+        render_palette = dict(palette)
+        render_palette[None] = _gap_class
+
+    total = sum(durations)
+    # (start, end) in milliseconds of each table written.
+    shown = []
+    cells = 0
+    with stats.stage("render"):
+        write_html('<div id={} style=position:relative>'.format(table_id) if minify else
+                '<div id="{}" style="position:relative;">\n'.format(table_id))
+        start = 0
+        for index, (table, duration) in enumerate(zip(tables, durations)):
+            previous = tables[index - 1] if index > 0 else None
+            same_size = previous is not None and (previous.getwidth(), previous.getheight()) == \
+                    (table.getwidth(), table.getheight())
+            rows = None
+            if delta and same_size:
+                rows = _delta_rows(previous, table)
+                unchanged = rows is None
+            else:
+                unchanged = same_size and table == previous
+            if unchanged:  # Keep showing the frame before for longer.
+                if not delta:
+                    shown[-1] = (shown[-1][0], start + duration)
+                start += duration
+                continue
+
+            if rows is not None:
+                columns = _row_columns(rows)
+                rowspans = _rowspans(rows) if merge_rows else None
+                cells += _cell_count(rowspans) if merge_rows else sum(len(row) for row in rows)
+            else:
+                columns = _iter_columns(table)
+                rowspans = _rowspans(table.iterrows()) if merge_rows else None
+                cells += _cell_count(rowspans) if merge_rows else table.run_count()
+            width = table.getwidth() if table.getheight() > 0 else 0
+            write_html(_table_start(no_css, "{}-{!s}".format(table_id, len(shown)), minify, width, pixel_size))
+            for tr in _render_rows(columns, render_palette, no_css, pixel_size, rowspans, minify):
+                write_html(tr)
+            write_html('</table>' if minify else '</table>\n')
+            # Delta frames stay on top of the ones before them until the end.
+            shown.append((start, total if delta else start + duration))
+            start += duration
+        write_html('</div>' if minify else '</div>\n')
+
+        css = []
+        if not no_css:
+            css.extend(_render_css(palette, table_id, pixel_size, minify, ('#' if minify else 'div#') + table_id))
+        if len(shown) > 1:
+            frame = ('#' if minify else 'div#') + table_id + '>table'
+            if minify:
+                css.append('{0}{{position:absolute;top:0;left:0}}{0}:first-child{{position:relative}}'.format(frame))
+            else:
+                css.append('{0}{{position:absolute;top:0;left:0;}}\n{0}:first-child{{position:relative;}}\n'.format(frame))
+            iterations = 'infinite' if loop == 0 else str(loop if loop is not None else 1)
+            for index, (start, end) in enumerate(shown):
+                name = "{}-{!s}".format(table_id, index)
+                keyframes = _keyframes(name, start, end, total, minify)
+                if keyframes is None:
+                    continue
+                css.append('{}:nth-child({!s}){{animation:{} {!s}ms step-end {}{}}}'.format(
+                    frame, index + 1, name, total, iterations, '' if minify else ';'
+                ) + ('' if minify else '\n'))
+                css.append(keyframes)
+        write_css("".join(css))
+    stats.record("frames", len(shown))
+    stats.record("cells", cells)
+    return cells
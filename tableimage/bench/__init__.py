@@ -0,0 +1,313 @@
+"""
+Benchmarks for every stage of the conversion pipeline, run with python -m tableimage.bench.
+
+A corpus of synthetic images is generated deterministically (so results can be compared between runs and machines), each image is
+put through the pipeline stage by stage, and the wall time and peak memory of each stage are reported as JSON, along with the size of
+the output. Results can be saved and later compared against as a baseline.
+"""
+from .. import data, imagemanipulation, renderers, write_html_css, _to_palette, _render_rows, _iter_columns
+from .._typing import *
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from PIL import Image, ImageChops, ImageFilter
+
+_report_version = 1
+
+default_sizes = (64, 256, 1024)
+
+
+def _noise(size: Tuple[int, int], mode: str, rng: random.Random) -> Image.Image:
+    """
+    Generate an image of uniformly random pixels.
+    """
+    length = size[0] * size[1] * len(mode)
+    return Image.frombytes(mode, size, rng.getrandbits(length * 8).to_bytes(length, "little"))
+
+
+def _gradient(size: Tuple[int, int]) -> Image.Image:
+    """
+    Generate a smooth RGB gradient, red going left to right, green top to bottom and blue along the diagonal.
+    """
+    horizontal = Image.linear_gradient("L").rotate(90).resize(size)
+    vertical = Image.linear_gradient("L").resize(size)
+    return Image.merge("RGB", (horizontal, vertical, ImageChops.add(horizontal, vertical, scale=2)))
+
+
+def _photo(size: Tuple[int, int], rng: random.Random) -> Image.Image:
+    """
+    Generate something with the statistics of a photo: smooth areas with soft edges, some hard edges and a little sensor noise.
+    """
+    # Blurred blocks of colour give smooth areas and soft edges.
+    blocks = _noise((max(1, size[0] // 16), max(1, size[1] // 16)), "RGB", rng).resize(size, Image.BICUBIC)
+    image = blocks.filter(ImageFilter.GaussianBlur(max(1, min(size) // 64)))
+    # A few flat shapes give hard edges.
+    for _ in range(8):
+        left, top = rng.randrange(size[0]), rng.randrange(size[1])
+        box = (left, top, left + rng.randrange(1, size[0] // 2 + 2), top + rng.randrange(1, size[1] // 2 + 2))
+        image.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), box)
+    # Low amplitude noise, like a camera sensor or JPEG artifacts.
+    noise = _noise(size, "RGB", rng).point(lambda value: value // 64)
+    return ImageChops.subtract(ImageChops.add(image, noise), Image.new("RGB", size, (4, 4, 4)))
+
+
+def _with_alpha(image: Image.Image) -> Image.Image:
+    """
+    Add an alpha channel fading from opaque in the middle to transparent at the corners.
+    """
+    alpha = Image.radial_gradient("L").resize(image.size).point(lambda value: 255 - value)
+    image = image.convert("RGBA")
+    image.putalpha(alpha)
+    return image
+
+
+# Generators for each kind of image, taking a size and a random number generator.
+corpus_kinds = {
+    "flat": lambda size, rng: Image.new("RGB", size, (rng.randrange(256), rng.randrange(256), rng.randrange(256))),
+    "gradient": lambda size, rng: _gradient(size),
+    "noise": lambda size, rng: _noise(size, "RGB", rng),
+    "photo": _photo,
+}
+
+
+def generate_corpus(kinds: Iterable[str]=corpus_kinds.keys(), sizes: Iterable[int]=default_sizes, alpha: bool=True,
+        seed: int=0) -> Iterator[Tuple[str, Image.Image]]:
+    """
+    Generate (name, image) pairs for every kind of image at every size (as square images), with and without alpha if alpha is set.
+    The same arguments always give the same images.
+    """
+    for kind in kinds:
+        for size in sizes:
+            # Seed each image separately, so adding kinds or sizes does not change the other images.
+            rng = random.Random("{}-{}-{!s}".format(seed, kind, size))
+            image = corpus_kinds[kind]((size, size), rng)
+            yield "{}-{!s}".format(kind, size), image
+            if alpha:
+                yield "{}-{!s}-alpha".format(kind, size), _with_alpha(image)
+
+
+class _CountingSink(object):
+    """
+    Sink which throws away what is written to it, only counting it. The output is ASCII, so characters are bytes.
+    """
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text: str):
+        self.size += len(text)
+
+
+def _measure(function: Callable[[], Any], repeat: int, memory: bool) -> Tuple[Any, Dict[str, float]]:
+    """
+    Run function repeat times, returning its result and the best wall time. If memory is set, it is run once more with tracemalloc
+    to get the peak memory allocated (by Python and NumPy, not by Pillow's C code).
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    measurement = {"seconds": best}
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            measurement["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, measurement
+
+
+def benchmark_image(image: Image.Image, no_css: bool=False, pixel_size: int=3, merge_rows: bool=False, repeat: int=3,
+        memory: bool=True, formats: Iterable[str]=renderers.renderers.keys()) -> Dict[str, Any]:
+    """
+    Put an image through each stage of the pipeline, returning the measurements of each stage and the size of the output.
+
+    The image is also rendered with each of formats (names from renderers.renderers), measuring the time as stage 
+    "render_<format>" and the bytes and elements written.
+    """
+    stages = {}
+    pixels, stages["flatten"] = _measure(lambda: data.PixelAccessPillow(image), repeat, memory)
+    flatten_matches = None
+    if imagemanipulation.has_transparency(image):
+        # The old way of flattening, to compare the speed and check the output is the same.
+        reference, stages["flatten_reference"] = _measure(
+            lambda: imagemanipulation.pure_pil_alpha_to_background_colour_img(image.convert("RGBA")), repeat, memory
+        )
+        flatten_matches = reference.tobytes() == pixels.getrgbimage().tobytes()
+    table, stages["runs"] = _measure(pixels.getruntable, repeat, memory)
+    palette, stages["palette"] = _measure(lambda: _to_palette(table), repeat, memory)
+
+    def render():
+        html, css = _CountingSink(), _CountingSink()
+        cells = write_html_css(table, html, css, no_css, pixel_size, "benchmark", merge_rows, palette)
+        return cells, html.size, css.size
+    (cells, html_bytes, css_bytes), stages["render"] = _measure(render, repeat, memory)
+
+    def render_minified():
+        html, css = _CountingSink(), _CountingSink()
+        write_html_css(table, html, css, no_css, pixel_size, "benchmark", merge_rows, palette, minify=True)
+        return html.size, css.size
+    (minified_html_bytes, minified_css_bytes), stages["render_minify"] = _measure(render_minified, repeat, memory)
+
+    output_formats = {}
+    for name in formats:
+        renderer = renderers.renderers[name](no_css, pixel_size, merge_rows)
+
+        def render_format():
+            html, css = _CountingSink(), _CountingSink()
+            elements = renderer.write(table, html, css, "benchmark", palette)
+            return elements, html.size, css.size
+        (elements, format_html_bytes, format_css_bytes), stages["render_" + name] = _measure(render_format, repeat, memory)
+        output_formats[name] = {"html_bytes": format_html_bytes, "css_bytes": format_css_bytes, "elements": elements}
+
+    # Micro-benchmark of just turning runs into <tr>s, without the sinks or anything else around it.
+    def serialize():
+        return sum(map(len, _render_rows(_iter_columns(table), palette, no_css, pixel_size)))
+    _, stages["serialize"] = _measure(serialize, repeat, False)
+    stages["serialize"]["ns_per_cell"] = stages["serialize"]["seconds"] * 1e9 / max(1, table.run_count())
+
+    return {
+        "width": image.size[0],
+        "height": image.size[1],
+        "pixels": image.size[0] * image.size[1],
+        "runs": table.run_count(),
+        "cells": cells,
+        "colours": len(palette),
+        "html_bytes": html_bytes,
+        "css_bytes": css_bytes,
+        "minified_html_bytes": minified_html_bytes,
+        "minified_css_bytes": minified_css_bytes,
+        "flatten_matches_reference": flatten_matches,
+        "formats": output_formats,
+        "stages": stages,
+    }
+
+
+def run_benchmarks(corpus: Iterable[Tuple[str, Image.Image]], **options) -> Dict[str, Any]:
+    """
+    Benchmark every image of a corpus, passing options on to benchmark_image.
+    """
+    results = {}
+    for name, image in corpus:
+        results[name] = benchmark_image(image, **options)
+    return {"version": _report_version, "options": options, "results": results}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float=0.1) -> Tuple[List[str], bool]:
+    """
+    Compare a report against a baseline report. Returns a line of text for each stage of each image in both, and whether anything
+    regressed, i.e. got more than threshold (a fraction) slower, bigger or more memory hungry.
+    """
+    lines = []
+    regressed = False
+
+    def ratio_line(label: str, current: float, previous: float) -> str:
+        nonlocal regressed
+        if previous == 0:
+            return "{}: {!s} (baseline 0)".format(label, current)
+        ratio = current / previous
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        return "{}: {:.3g} -> {:.3g} ({:+.1%}){}".format(label, previous, current, ratio - 1, flag)
+
+    for name, result in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        for stage, measurement in result["stages"].items():
+            previous_measurement = previous["stages"].get(stage)
+            if previous_measurement is None:
+                continue
+            for metric, value in measurement.items():
+                if metric in previous_measurement:
+                    lines.append(ratio_line("{} {} {}".format(name, stage, metric), value, previous_measurement[metric]))
+        for metric in ("html_bytes", "css_bytes", "minified_html_bytes", "minified_css_bytes", "cells"):
+            if metric in previous:
+                lines.append(ratio_line("{} {}".format(name, metric), result[metric], previous[metric]))
+        for output_format, measurement in result.get("formats", {}).items():
+            previous_measurement = previous.get("formats", {}).get(output_format)
+            if previous_measurement is None:
+                continue
+            for metric, value in measurement.items():
+                lines.append(ratio_line("{} {} {}".format(name, output_format, metric), value, previous_measurement[metric]))
+    return lines, regressed
+
+
+def size_report(report: Dict[str, Any]) -> List[str]:
+    """
+    Get lines of text for each image of a report, comparing the size of the normal output with the minified output, and with 
+    each output format.
+    """
+    lines = []
+    for name, result in report["results"].items():
+        size = result["html_bytes"] + result["css_bytes"]
+        minified = result["minified_html_bytes"] + result["minified_css_bytes"]
+        lines.append("{}: {!s} -> {!s} bytes minified ({:.1%} smaller)".format(
+            name, size, minified, 1 - minified / size if size > 0 else 0
+        ))
+        for output_format, measurement in result.get("formats", {}).items():
+            lines.append("{}: {}: {!s} bytes, {!s} elements, {:.4f}s".format(
+                name, output_format, measurement["html_bytes"] + measurement["css_bytes"], measurement["elements"],
+                result["stages"]["render_" + output_format]["seconds"]
+            ))
+    return lines
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """
+    Create a parser for the command-line args of the benchmarks.
+    """
+    parser = argparse.ArgumentParser(prog="python -m tableimage.bench", description=__doc__)
+    parser.add_argument("--kinds", nargs="+", choices=corpus_kinds.keys(), default=list(corpus_kinds.keys()),
+            help="Kinds of synthetic image to benchmark (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(default_sizes),
+            help="Widths/heights of the square images to benchmark (default: %(default)s)")
+    parser.add_argument("--no-alpha", action="store_true", default=False, help="Skip the versions of the images with alpha")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generating the corpus (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Times to run each stage, keeping the best (default: %(default)s)")
+    parser.add_argument("--no-memory", action="store_true", default=False, help="Skip measuring peak memory")
+    parser.add_argument("--no-css", action="store_true", default=False, help="Render without css")
+    parser.add_argument("--pixel-size", type=int, default=3, help="Pixel size to render with (default: %(default)s)")
+    parser.add_argument("--merge-rows", action="store_true", default=False, help="Render with rows merged")
+    parser.add_argument("--formats", nargs="*", choices=renderers.renderers.keys(), default=list(renderers.renderers.keys()),
+            help="Output formats to render each image with, measuring the size and element count (default: all)")
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout, help="Where to write the JSON report")
+    parser.add_argument("--size-report", action="store_true", default=False,
+            help="Print the size of the normal and minified output of each image to stderr")
+    parser.add_argument("--baseline", type=argparse.FileType("r"), default=None,
+            help="JSON report to compare against, printing the differences to stderr")
+    parser.add_argument("--threshold", type=float, default=0.1,
+            help="Fraction something has to get worse by to count as a regression (default: %(default)s)")
+    return parser
+
+
+def main():
+    parsed_args = make_parser().parse_args()
+    corpus = generate_corpus(parsed_args.kinds, parsed_args.sizes, not parsed_args.no_alpha, parsed_args.seed)
+    report = run_benchmarks(
+        corpus, no_css=parsed_args.no_css, pixel_size=parsed_args.pixel_size, merge_rows=parsed_args.merge_rows,
+        repeat=parsed_args.repeat, memory=not parsed_args.no_memory, formats=parsed_args.formats
+    )
+    report["corpus"] = {"kinds": parsed_args.kinds, "sizes": parsed_args.sizes, "alpha": not parsed_args.no_alpha,
+            "seed": parsed_args.seed}
+    json.dump(report, parsed_args.output, indent=2)
+    parsed_args.output.write("\n")
+
+    if parsed_args.size_report:
+        for line in size_report(report):
+            print(line, file=sys.stderr)
+
+    if parsed_args.baseline is not None:
+        lines, regressed = compare(report, json.load(parsed_args.baseline), parsed_args.threshold)
+        for line in lines:
+            print(line, file=sys.stderr)
+        if regressed:
+            sys.exit(1)
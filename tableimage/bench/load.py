@@ -0,0 +1,152 @@
+"""
+Load test for the conversion server (python -m tableimage serve), run with python -m tableimage.bench.load.
+
+A synthetic image from the benchmark corpus is POSTed to the server over and over by a number of concurrent clients, and the
+throughput and latency percentiles are reported as JSON. With --cli, the same image is converted by running python -m tableimage
+for each request instead, which is what the server saves.
+"""
+from . import corpus_kinds, generate_corpus
+from .._typing import *
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.parse
+
+
+async def _post(url: urllib.parse.SplitResult, unix: Optional[str], body: bytes) -> Tuple[int, int]:
+    """
+    POST body to the server, reading the whole response. Returns the status and the size of the response.
+    """
+    if unix is not None:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    try:
+        target = url.path + ("?" + url.query if url.query else "")
+        writer.write("POST {} HTTP/1.1\r\nHost: {}\r\nContent-Length: {!s}\r\nConnection: close\r\n\r\n".format(
+            target or "/", url.netloc or "localhost", len(body)
+        ).encode("latin-1") + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        response = await reader.read()
+        return int(status_line.split()[1]), len(status_line) + len(response)
+    finally:
+        writer.close()
+
+
+async def _run_cli(path: str, args: List[str]) -> Tuple[int, int]:
+    """
+    Convert the image at path with a new python -m tableimage process, like a web tier shelling out for every upload.
+    """
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "tableimage", path, "--combined", "-", "--no-cache", *args,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    output, _ = await process.communicate()
+    return (200 if process.returncode == 0 else 500), len(output)
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def load_test(request: Callable[[], Awaitable], requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Make requests requests (each a call of request, returning a (status, size) pair), with concurrency of them in flight at
+    once. Returns the throughput, latency percentiles in seconds and count of each status.
+    """
+    latencies = []
+    statuses = {}
+    response_bytes = 0
+    remaining = requests
+
+    async def client():
+        nonlocal remaining, response_bytes
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                status, size = await request()
+            except OSError:
+                status, size = "connection error", 0
+            latencies.append(time.perf_counter() - start)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            response_bytes += size
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "requests_per_second": requests / elapsed if elapsed > 0 else 0,
+        "response_bytes": response_bytes,
+        "statuses": statuses,
+        "latency": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0,
+            "p50": _percentile(latencies, 0.5),
+            "p90": _percentile(latencies, 0.9),
+            "p99": _percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0,
+        },
+    }
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """
+    Create a parser for the command-line args of the load test.
+    """
+    parser = argparse.ArgumentParser(prog="python -m tableimage.bench.load", description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/convert",
+            help="URL to POST images to, options can go in its query string (default: %(default)s)")
+    parser.add_argument("--unix", default=None, metavar="PATH", help="Connect to a server on this Unix socket instead")
+    parser.add_argument("--requests", type=int, default=200, help="Number of requests to make (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once (default: %(default)s)")
+    parser.add_argument("--kind", choices=corpus_kinds.keys(), default="photo",
+            help="Kind of synthetic image to send (default: %(default)s)")
+    parser.add_argument("--size", type=int, default=64, help="Width/height of the image to send (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generating the image (default: %(default)s)")
+    parser.add_argument("--cli", action="store_true", default=False,
+            help="Run python -m tableimage for every request instead of using the server, to compare against")
+    parser.add_argument("--output", type=argparse.FileType("w"), default=sys.stdout, help="Where to write the JSON report")
+    return parser
+
+
+def main():
+    parsed_args = make_parser().parse_args()
+    name, image = next(generate_corpus([parsed_args.kind], [parsed_args.size], False, parsed_args.seed))
+    encoded = io.BytesIO()
+    image.save(encoded, "PNG")
+    body = encoded.getvalue()
+    url = urllib.parse.urlsplit(parsed_args.url)
+
+    if parsed_args.cli:
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+            f.write(body)
+        try:
+            report = asyncio.run(load_test(
+                lambda: _run_cli(f.name, []), parsed_args.requests, parsed_args.concurrency
+            ))
+        finally:
+            os.remove(f.name)
+    else:
+        report = asyncio.run(load_test(
+            lambda: _post(url, parsed_args.unix, body), parsed_args.requests, parsed_args.concurrency
+        ))
+    report["image"] = {"name": name, "bytes": len(body)}
+    report["mode"] = "cli" if parsed_args.cli else "server"
+    json.dump(report, parsed_args.output, indent=2)
+    parsed_args.output.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+On-disk cache for conversions, so converting the same image with the same options again can skip most of the work.
+
+Entries are keyed by a hash of the decoded pixels plus the options used. Two kinds of entries are stored:
+the run table and palette of an image (which only depend on the options used to get the runs), and the rendered html and css
+(which also depend on the rendering options). The cache is kept under a maximum size by deleting the least recently used files.
+"""
+from . import data, _sink_writer
+from ._typing import *
+import array
+import hashlib
+import json
+import os
+import string
+import struct
+import sys
+
+# Bump this whenever the format of entries or the output of the conversion changes, so old entries are never used.
+_cache_version = 2
+
+# Roughly how many pixels of an image are copied at once to hash it.
+_hash_strip_pixels = 1 << 18
+
+_runs_magic = b"TIRT"
+_runs_header = struct.Struct("<4sBQQ")
+
+
+def default_directory() -> str:
+    """
+    Get the default directory for the cache, following the XDG base directory spec.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "tableimage")
+
+
+def _hash_options(hasher, options: Dict[str, Any]):
+    hasher.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+
+
+def image_key(image, options: Dict[str, Any]) -> str:
+    """
+    Get the key for a decoded PIL image converted into runs with options (which must be JSON serialisable).
+    """
+    hasher = hashlib.sha256()
+    _hash_options(hasher, {"version": _cache_version, "mode": image.mode, "size": list(image.size), "options": options})
+    if image.mode == "P":
+        hasher.update(bytes(image.getpalette() or []))
+    hasher.update(repr(image.info.get("transparency")).encode("utf-8"))
+    # A strip of rows at a time, so hashing does not need a second copy of the whole image. The strips add up to the same bytes
+    # as image.tobytes(), so the keys are the same as hashing it in one go.
+    width, height = image.size
+    strip_rows = max(1, _hash_strip_pixels // max(1, width))
+    for top in range(0, height, strip_rows):
+        hasher.update(image.crop((0, top, width, min(height, top + strip_rows))).tobytes())
+    return hasher.hexdigest()
+
+
+def render_key(key: str, options: Dict[str, Any]) -> str:
+    """
+    Get the key for the html and css rendered with options from the runs stored under key.
+    """
+    hasher = hashlib.sha256(key.encode("utf-8"))
+    _hash_options(hasher, options)
+    return hasher.hexdigest()
+
+
+def table_id(key: str) -> str:
+    """
+    Get a table id derived from a key, so the output for the same input is always the same.
+    """
+    return "".join(string.ascii_letters[byte % len(string.ascii_letters)] for byte in bytes.fromhex(key)[:16])
+
+
+class ConversionCache(object):
+    """
+    A size-bounded cache of run tables, palettes and rendered html/css in a directory.
+    """
+    def __init__(self, directory: str, max_size: int=512*1024*1024):
+        """
+        max_size is the size in bytes the cache is kept under.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        # About how big the cache is, so it only has to be walked when it gets too big. None until it is first walked.
+        self._size: Optional[int] = None
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def _open_hit(self, path: str, mode: str, **kwargs):
+        """
+        Open a cached file, marking it as recently used. Returns None on a miss.
+        """
+        try:
+            f = open(path, mode, **kwargs)
+        except OSError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return f
+
+    def _commit(self, temporary_path: str, path: str):
+        os.replace(temporary_path, path)
+
+    def _temporary_path(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return "{}.{!s}.tmp".format(path, os.getpid())
+
+    def get_runs(self, key: str) -> Optional[Tuple[data.RunTable, Dict[data.RGB, str]]]:
+        """
+        Get the run table and palette stored under key, or None if they are not in the cache.
+        """
+        path = self._path(key, ".runs")
+        f = self._open_hit(path, "rb")
+        if f is None:
+            return None
+        try:
+            with f:
+                magic, byteorder, runs, rows = _runs_header.unpack(f.read(_runs_header.size))
+                if magic != _runs_magic or byteorder != (sys.byteorder == "little"):
+                    return None
+                table = data.RunTable()
+                table.lengths.fromfile(f, runs)
+                table.colours.fromfile(f, runs)
+                table.row_offsets = array.array("Q")
+                table.row_offsets.fromfile(f, rows + 1)
+                palette = {data.unpack_rgb(colour): code for colour, code in json.loads(f.read().decode("utf-8"))}
+        except (struct.error, EOFError, ValueError, TypeError, MemoryError, OverflowError):
+            # Cut short (say the process writing it was killed) or otherwise broken, so it is a miss, and is thrown away.
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return table, palette
+
+    def put_runs(self, key: str, table: data.RunTable, palette: Dict[data.RGB, str]):
+        """
+        Store a run table and its palette under key.
+        """
+        path = self._path(key, ".runs")
+        temporary_path = self._temporary_path(path)
+        with open(temporary_path, "wb") as f:
+            f.write(_runs_header.pack(_runs_magic, sys.byteorder == "little", table.run_count(), table.getheight()))
+            table.lengths.tofile(f)
+            table.colours.tofile(f)
+            table.row_offsets.tofile(f)
+            f.write(json.dumps([[data.pack_rgb(colour), code] for colour, code in palette.items()]).encode("utf-8"))
+        self._commit(temporary_path, path)
+        self._added([path])
+
+    def write_rendered(self, key: str, html_sink: Any, css_sink: Any) -> bool:
+        """
+        Copy the html and css stored under key into html_sink and css_sink. Returns False (writing nothing) if they are not in
+        the cache.
+        """
+        css_file = self._open_hit(self._path(key, ".css"), "r", encoding="utf-8", newline="")
+        if css_file is None:
+            return False
+        with css_file:
+            html_file = self._open_hit(self._path(key, ".html"), "r", encoding="utf-8", newline="")
+            if html_file is None:
+                return False
+            with html_file:
+                write_html = _sink_writer(html_sink)
+                for chunk in iter(lambda: html_file.read(1024*1024), ""):
+                    write_html(chunk)
+            _sink_writer(css_sink)(css_file.read())
+        return True
+
+    def rendering(self, key: str, html_sink: Any, css_sink: Any) -> "_RenderingEntry":
+        """
+        Get a context manager which wraps html_sink and css_sink, so whatever is written to them is also stored under key.
+        The entry is only stored if the with block finishes without an exception.
+
+            with cache.rendering(key, html_sink, css_sink) as (html_sink, css_sink):
+                write_html_css(..., html_sink, css_sink, ...)
+        """
+        return _RenderingEntry(self, key, html_sink, css_sink)
+
+    def _added(self, paths: List[str]):
+        """
+        Count files which were just stored, evicting once the cache looks too big. Files stored by other processes are only 
+        counted when the cache is walked again, by evict.
+        """
+        if self._size is None:
+            self.evict()
+            return
+        for path in paths:
+            try:
+                self._size += os.stat(path).st_size
+            except OSError:
+                pass
+        if self._size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used files until the cache is within its maximum size. This walks the whole cache, so it is 
+        only done when storing something takes it over (see _added).
+        """
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._size = total
+
+
+class _Tee(object):
+    """
+    Text sink which writes to another sink and a file at the same time.
+    """
+    def __init__(self, sink: Any, f):
+        self._write_sink = _sink_writer(sink)
+        self._file = f
+
+    def write(self, text: str):
+        self._write_sink(text)
+        self._file.write(text)
+
+
+class _RenderingEntry(object):
+    """
+    Context manager returned by ConversionCache.rendering.
+    """
+    def __init__(self, cache: ConversionCache, key: str, html_sink: Any, css_sink: Any):
+        self._cache = cache
+        self._paths = [cache._path(key, ".html"), cache._path(key, ".css")]
+        self._sinks = [html_sink, css_sink]
+        self._files = []
+
+    def __enter__(self) -> Tuple[_Tee, _Tee]:
+        for path in self._paths:
+            self._files.append(open(self._cache._temporary_path(path), "w", encoding="utf-8", newline=""))
+        return _Tee(self._sinks[0], self._files[0]), _Tee(self._sinks[1], self._files[1])
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for f in self._files:
+            f.close()
+        for path, f in zip(self._paths, self._files):
+            if exc_type is None:
+                self._cache._commit(f.name, path)
+            else:
+                os.remove(f.name)
+        if exc_type is None:
+            self._cache._added(self._paths)
@@ -0,0 +1,75 @@
+"""
+Colour distances, used to merge runs of similar (rather than exactly equal) colours.
+"""
+from ._typing import *
+try:
+    import numpy as np
+    _has_numpy=True
+except ImportError as e:
+    _has_numpy=False
+
+
+# Names of the supported distance metrics.
+# "channel" is the largest difference between any of the R, G and B components.
+# "cie76" is the euclidean distance in the CIE L*a*b* colour space, which roughly matches how different colours look.
+# A CIE76 distance of about 2.3 is just noticeable.
+metrics = ("channel", "cie76")
+
+# sRGB (D65) to CIE XYZ, scaled so the D65 white point is (1, 1, 1).
+_rgb_to_xyz = (
+    (0.4124564 / 0.95047, 0.3575761 / 0.95047, 0.1804375 / 0.95047),
+    (0.2126729, 0.7151522, 0.0721750),
+    (0.0193339 / 1.08883, 0.1191920 / 1.08883, 0.9503041 / 1.08883),
+)
+
+
+def _linear(component: float) -> float:
+    """
+    Undo the sRGB gamma curve of a component in the 0-1 range.
+    """
+    if component <= 0.04045:
+        return component / 12.92
+    return ((component + 0.055) / 1.055) ** 2.4
+
+
+def _lab_f(t: float) -> float:
+    if t > (6 / 29) ** 3:
+        return t ** (1 / 3)
+    return t / (3 * (6 / 29) ** 2) + 4 / 29
+
+
+def rgb_to_lab(colour: Tuple[int, int, int]) -> Tuple[float, float, float]:
+    """
+    Convert an (R, G, B) triplet into CIE L*a*b* (D65 white point).
+    """
+    linear = [_linear(component / 255) for component in colour]
+    x, y, z = (_lab_f(sum(m * c for m, c in zip(row, linear))) for row in _rgb_to_xyz)
+    return (116 * y - 16, 500 * (x - y), 200 * (y - z))
+
+
+def distance(a: Tuple[int, int, int], b: Tuple[int, int, int], metric: str="channel") -> float:
+    """
+    Get the distance between two (R, G, B) colours using one of the metrics.
+    """
+    if metric == "channel":
+        return max(abs(x - y) for x, y in zip(a, b))
+    elif metric == "cie76":
+        return sum((x - y) ** 2 for x, y in zip(rgb_to_lab(a), rgb_to_lab(b))) ** 0.5
+    raise ValueError("unknown colour metric {!r}".format(metric))
+
+
+def rgb_array_to_lab(pixels: "np.ndarray") -> "np.ndarray":
+    """
+    Vectorised version of rgb_to_lab, converting an array of RGB values (of any shape, ending in 3) into a float32 array of 
+    L*a*b* values with the same shape.
+    """
+    linear = pixels.astype(np.float32) / 255
+    linear = np.where(linear <= 0.04045, linear / 12.92, ((linear + 0.055) / 1.055) ** 2.4).astype(np.float32)
+    xyz = linear @ np.array(_rgb_to_xyz, dtype=np.float32).T
+    del linear
+    xyz = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29).astype(np.float32)
+    lab = np.empty_like(xyz)
+    lab[..., 0] = 116 * xyz[..., 1] - 16
+    lab[..., 1] = 500 * (xyz[..., 0] - xyz[..., 1])
+    lab[..., 2] = 200 * (xyz[..., 1] - xyz[..., 2])
+    return lab
@@ -0,0 +1,181 @@
+"""
+Compressing the output while it is written, so it can be served straight from disk with a Content-Encoding header.
+
+The html is very repetitive, so it compresses extremely well. CompressedSink wraps a binary file and can be passed to write_html_css
+(or anything else taking a sink) in place of it. Compression happens in a background thread, overlapping with the rendering.
+
+    with open("image.html.gz", "wb") as f, compress.CompressedSink(f, "gzip") as html:
+        write_html_css(table, html, css)
+"""
+from . import stats
+from ._typing import *
+import queue
+import threading
+import time
+import zlib
+try:
+    import zstandard
+    _has_zstd=True
+except ImportError as e:
+    _has_zstd=False
+try:
+    import brotli
+    _has_brotli=True
+except ImportError as e:
+    _has_brotli=False
+
+
+class _BrotliCompressor(object):
+    """
+    Give brotli's streaming compressor the same compress/flush interface as zlib's.
+    """
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+# Name: (file extension, default level, whether it is available, function creating a compressor from a level).
+# The default levels are high, since the output is meant to be compressed once and served many times.
+methods = {
+    "gzip": (".gz", 9, True, lambda level: zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)),
+    "zstd": (".zst", 12, _has_zstd, lambda level: zstandard.ZstdCompressor(level=level).compressobj()),
+    "brotli": (".br", 9, _has_brotli, _BrotliCompressor),
+}
+
+_requirements = {"zstd": "the zstandard package", "brotli": "the brotli package"}
+
+
+def extension(method: str) -> str:
+    """
+    Get the file extension for output compressed with method, such as ".gz".
+    """
+    return methods[method][0]
+
+
+def check_available(method: str):
+    """
+    Raise a RuntimeError if the package method needs is not installed.
+    """
+    if not methods[method][2]:
+        raise RuntimeError("compressing with {} needs {}".format(method, _requirements[method]))
+
+
+class CompressedSink(object):
+    """
+    Text sink which compresses what is written to it into a binary file (anything with a write method taking bytes).
+
+    Writes are collected into chunks of about chunk_size bytes, which are compressed and written by a background thread (unless
+    threaded is False). At most max_chunks chunks wait for the thread at once, so a slow compressor holds the rendering up rather
+    than using more and more memory. close() (or the end of a with block) must be called to finish the compressed stream, it does
+    not close file.
+
+    After closing, stats holds the time spent compressing and the size before and after.
+    """
+    def __init__(self, file: Any, method: str="gzip", level: Optional[int]=None, threaded: bool=True,
+            chunk_size: int=64*1024, max_chunks: int=16):
+        check_available(method)
+        self.method = method
+        self._file = file
+        self._compressor = methods[method][3](level if level is not None else methods[method][1])
+        self._chunk_size = chunk_size
+        self._pending = []
+        self._pending_size = 0
+        self._input_bytes = 0
+        self._output_bytes = 0
+        self._wall = 0.0
+        self._cpu = 0.0
+        self._error = None
+        self._closed = False
+        self.stats = None
+        self._queue = None
+        if threaded:
+            self._queue = queue.Queue(max_chunks)
+            self._thread = threading.Thread(target=self._work, name="tableimage-compress", daemon=True)
+            self._thread.start()
+
+    def _compress(self, data: Optional[bytes]):
+        """
+        Compress a chunk and write it out. None finishes the stream.
+        """
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        if data is None:
+            compressed = self._compressor.flush()
+        else:
+            self._input_bytes += len(data)
+            compressed = self._compressor.compress(data)
+        self._wall += time.perf_counter() - wall
+        self._cpu += time.thread_time() - cpu
+        if compressed:
+            self._output_bytes += len(compressed)
+            self._file.write(compressed)
+
+    def _work(self):
+        """
+        Background thread, compressing chunks from the queue until it gets None.
+        """
+        while True:
+            data = self._queue.get()
+            try:
+                if self._error is None:
+                    self._compress(data)
+            except BaseException as e:
+                self._error = e
+            if data is None:
+                return
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _send(self, data: Optional[bytes]):
+        if self._queue is None:
+            self._compress(data)
+        else:
+            self._check_error()
+            self._queue.put(data)
+
+    def write(self, text: str):
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Send what has been written so far to be compressed. This does not flush the compressor, which would make the output
+        bigger.
+        """
+        if self._pending:
+            self._send("".join(self._pending).encode("utf-8"))
+            self._pending = []
+            self._pending_size = 0
+
+    def close(self):
+        """
+        Finish the compressed stream, waiting for the background thread to write all of it.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._send(None)
+        if self._queue is not None:
+            self._thread.join()
+            self._check_error()
+        self.stats = stats.Stats("{} compression".format(self.method))
+        self.stats.stages["compress"] = {"wall": self._wall, "cpu": self._cpu}
+        self.stats.record("input_bytes", self._input_bytes)
+        self.stats.record("output_bytes", self._output_bytes)
+        self.stats.record("ratio", round(self._input_bytes / self._output_bytes, 2) if self._output_bytes else 0)
+
+    def __enter__(self) -> "CompressedSink":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,15 +1,31 @@
 """
 Contains a universal API for providing access to two-dimensional data, even without PIL (though it is officially added as a library)
+
+Pixels which are already in memory, as a raw buffer (bytes, bytearray, mmap, memoryview, ...) or a NumPy array, can be read 
+directly with PixelAccessBuffer and PixelAccessArray, and PPM/PGM/PAM files with PixelAccessNetpbm, none of which need PIL.
 """
 import abc
+import array
+import contextlib
+import gc
+import itertools
+import math
+import sys
 from ._typing import *
 from . import imagemanipulation
+from . import colour as _colour
+from . import stats
 try:
     from PIL import Image
     _has_pil=True
 except ImportError as e:
-    from _dummy_pil import Image
+    from ._dummy_pil import Image
     _has_pil=False
+try:
+    import numpy as np
+    _has_numpy=True
+except ImportError as e:
+    _has_numpy=False
 
 
 class RowDivider(object):
@@ -25,6 +41,255 @@ class RowDivider(object):
 RGB=Tuple[int, int, int]
 
 
+@contextlib.contextmanager
+def _gc_paused():
+    """
+    Pause the cyclic garbage collector while building large lists of tuples. The tuples can never form cycles, but allocating 
+    millions of them triggers repeated full collections which otherwise dominate the running time.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def pack_rgb(colour: RGB) -> int:
+    """
+    Pack an (R, G, B) triplet into a single 24-bit integer of the form 0xRRGGBB.
+    """
+    return (colour[0] << 16) | (colour[1] << 8) | colour[2]
+
+
+def unpack_rgb(packed: int) -> RGB:
+    """
+    Unpack a 24-bit 0xRRGGBB integer back into an (R, G, B) triplet.
+    """
+    return (packed >> 16, (packed >> 8) & 0xff, packed & 0xff)
+
+
+class RunTable(object):
+    """
+    Compact, array-backed version of the rowlist format produced by PixelAccess.getcontiguousrows.
+
+    Instead of one tuple per run and one RowDivider per row, the runs are kept in three parallel buffers:
+    lengths holds the length of every run, colours holds the colour of every run packed as 0xRRGGBB, and row_offsets holds the 
+    index of the first run of every row, plus a final entry with the total number of runs. Row y therefore consists of the runs 
+    in the range row_offsets[y]:row_offsets[y + 1].
+
+    Iterating over a RunTable lazily yields the old rowlist format, so it can be used anywhere a rowlist is expected.
+    """
+    def __init__(self):
+        self.lengths = array.array('I')
+        self.colours = array.array('I')
+        self.row_offsets = array.array('Q', [0])
+
+    @classmethod
+    def from_arrays(cls, lengths, colours, row_offsets) -> "RunTable":
+        """
+        Create a RunTable from three buffers (arrays, NumPy arrays or sequences of ints) laid out as described in the class 
+        documentation. NumPy arrays are copied in bulk.
+        """
+        table = cls()
+        if _has_numpy and isinstance(lengths, np.ndarray):
+            table.lengths.frombytes(lengths.astype(np.uint32).tobytes())
+            table.colours.frombytes(np.asarray(colours).astype(np.uint32).tobytes())
+            table.row_offsets = array.array('Q', np.asarray(row_offsets).astype(np.uint64).tobytes())
+        else:
+            table.lengths.extend(lengths)
+            table.colours.extend(colours)
+            table.row_offsets = array.array('Q', row_offsets)
+        return table
+
+    @classmethod
+    def from_rowlist(cls, rowlist: Iterable[Union[Tuple[int, RGB], RowDivider]]) -> "RunTable":
+        """
+        Convert a list in rowlist format into a RunTable.
+        """
+        table = cls()
+        for item in rowlist:
+            if isinstance(item, RowDivider):
+                table.row_offsets.append(len(table.lengths))
+            else:
+                table.lengths.append(item[0])
+                table.colours.append(pack_rgb(item[1]))
+        return table
+
+    def append_row(self, runs: Iterable[Tuple[int, RGB]]):
+        """
+        Add a row made of (count, colour) runs to the end of the table.
+        """
+        for count, colour in runs:
+            self.lengths.append(count)
+            self.colours.append(pack_rgb(colour))
+        self.row_offsets.append(len(self.lengths))
+
+    def extend(self, other: "RunTable"):
+        """
+        Add all the rows of another table to the end of this one.
+        """
+        base = len(self.lengths)
+        self.lengths.extend(other.lengths)
+        self.colours.extend(other.colours)
+        self.row_offsets.extend(base + offset for offset in other.row_offsets[1:])
+
+    def getheight(self) -> int:
+        """
+        Get the number of rows in the table.
+        """
+        return len(self.row_offsets) - 1
+
+    def getwidth(self) -> int:
+        """
+        Get the width of the table in pixels, measured on the first row.
+        """
+        if self.getheight() == 0:
+            return 0
+        return sum(self.lengths[self.row_offsets[0]:self.row_offsets[1]])
+
+    def run_count(self) -> int:
+        """
+        Get the total number of runs over all the rows.
+        """
+        return len(self.lengths)
+
+    def row(self, y: int) -> List[Tuple[int, RGB]]:
+        """
+        Get row y as a list of (count, colour) tuples.
+        """
+        start, end = self.row_offsets[y], self.row_offsets[y + 1]
+        return list(zip(self.lengths[start:end], map(unpack_rgb, self.colours[start:end])))
+
+    def iterrows(self) -> Iterator[List[Tuple[int, RGB]]]:
+        """
+        Iterate over the rows of the table, each as a list of (count, colour) tuples.
+        """
+        for y in range(self.getheight()):
+            yield self.row(y)
+
+    def colour_counts(self) -> Dict[RGB, int]:
+        """
+        Count how many pixels of each colour there are. Colours appear in the order they are first seen in the image, which 
+        keeps the palette built from the counts deterministic.
+        """
+        if _has_numpy and len(self.lengths) > 0:
+            colours = np.frombuffer(self.colours, dtype=np.uint32)
+            unique, first_seen, inverse = np.unique(colours, return_index=True, return_inverse=True)
+            totals = np.bincount(inverse.ravel(), weights=np.frombuffer(self.lengths, dtype=np.uint32), minlength=len(unique))
+            order = np.argsort(first_seen, kind="stable")
+            return dict(zip(map(unpack_rgb, unique[order].tolist()), totals[order].astype(np.int64).tolist()))
+
+        count = {}
+        for length, colour in zip(self.lengths, self.colours):
+            count[colour] = count.get(colour, 0) + length
+        return {unpack_rgb(colour): total for colour, total in count.items()}
+
+    def tolist(self) -> List[Union[Tuple[int, RGB], RowDivider]]:
+        """
+        Materialise the whole table in the old rowlist format.
+        """
+        result = []
+        # Share one tuple between all the runs of the same colour.
+        colour_tuples = {colour: unpack_rgb(colour) for colour in set(self.colours)}
+        with _gc_paused():
+            for y in range(self.getheight()):
+                start, end = self.row_offsets[y], self.row_offsets[y + 1]
+                result.extend(zip(self.lengths[start:end], map(colour_tuples.__getitem__, self.colours[start:end])))
+                result.append(RowDivider())
+        return result
+
+    def __iter__(self) -> Iterator[Union[Tuple[int, RGB], RowDivider]]:
+        for row in self.iterrows():
+            yield from row
+            yield RowDivider()
+
+    def __len__(self) -> int:
+        """
+        The length of the equivalent rowlist, i.e. the number of runs plus one RowDivider per row.
+        """
+        return len(self.lengths) + self.getheight()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RunTable):
+            return (self.lengths == other.lengths and self.colours == other.colours 
+                    and self.row_offsets == other.row_offsets)
+        return NotImplemented
+
+
+RowList=Union[List[Union[Tuple[int, RGB], RowDivider]], RunTable]
+
+
+def _tolerant_run_starts(pixels: "np.ndarray", tolerance: float, metric: str) -> "np.ndarray":
+    """
+    Find where runs start in a (height, width, 3) array of RGB pixels, when a run carries on while pixels are within tolerance 
+    of the first pixel of the run. Returns a (height, width) boolean array.
+
+    Whether a pixel starts a run depends on where the current run started, so each row has to be walked from left to right, but 
+    all the rows are walked at once, one column at a time.
+    """
+    height, width = pixels.shape[:2]
+    if metric == "channel":
+        # Column-major copy, so each column is contiguous. int16 so differences do not wrap around.
+        values = np.ascontiguousarray(pixels.transpose(1, 0, 2), dtype=np.int16)
+        limit = tolerance
+    elif metric == "cie76":
+        values = np.ascontiguousarray(_colour.rgb_array_to_lab(pixels).transpose(1, 0, 2))
+        limit = tolerance * tolerance  # Compare squared distances
+    else:
+        raise ValueError("unknown colour metric {!r}".format(metric))
+
+    starts = np.empty((width, height), dtype=bool)
+    starts[0] = True
+    representative = values[0].copy()
+    for x in range(1, width):
+        difference = values[x] - representative
+        if metric == "channel":
+            np.abs(difference, out=difference)
+            far = difference.max(axis=1) > limit
+        else:
+            np.square(difference, out=difference)
+            far = difference.sum(axis=1) > limit
+        starts[x] = far
+        representative[far] = values[x][far]
+    return starts.T
+
+
+def _encode_rgb_array(pixels: "np.ndarray", tolerance: float=0, metric: str="channel") -> RunTable:
+    """
+    Run-length encode a (height, width, 3) array of RGB pixels into a RunTable. See PixelAccess.getcontiguousrows for tolerance 
+    and metric.
+
+    Each pixel is packed into a single 24-bit integer and the run boundaries of every row are found at once by comparing 
+    neighbouring pixels.
+    """
+    height, width = pixels.shape[:2]
+    if tolerance > 0:
+        starts = _tolerant_run_starts(pixels, tolerance, metric)
+    else:
+        starts = None
+
+    pixels = pixels.astype(np.uint32)
+    packed = (pixels[:, :, 0] << 16) | (pixels[:, :, 1] << 8) | pixels[:, :, 2]
+    del pixels
+
+    if starts is None:
+        # A run starts at the beginning of every row and wherever a pixel differs from the one on its left.
+        starts = np.empty((height, width), dtype=bool)
+        starts[:, 0] = True
+        np.not_equal(packed[:, 1:], packed[:, :-1], out=starts[:, 1:])
+    start_indices = np.flatnonzero(starts)
+    del starts
+
+    # Every row begins with a run, so the length of a run is the distance to the next run start in the flattened image.
+    lengths = np.diff(start_indices, append=width*height)
+    colours = packed.ravel()[start_indices]
+    row_offsets = np.zeros(height + 1, dtype=np.uint64)
+    np.cumsum(np.bincount(start_indices // width, minlength=height), out=row_offsets[1:])
+    return RunTable.from_arrays(lengths, colours, row_offsets)
+
+
 class PixelAccess(abc.ABC):
     """
     Provide API for accessing and analysing pixels.
@@ -45,53 +310,854 @@ class PixelAccess(abc.ABC):
         Can throw an index-error if out of range, though implementations can allow out-of-range access. 
         """
 
-    def getcontiguousrows(self) -> List[Union[Tuple[int, RGB], RowDivider]]:
+    def _row_runs(self, y: int, tolerance: float=0, metric: str="channel") -> List[Tuple[int, RGB]]:
+        """
+        Get the runs of contiguous colour on row y, as a list of (count, colour) tuples. See getcontiguousrows for tolerance and 
+        metric.
+        """
+        if tolerance > 0:
+            return self._row_runs_tolerant(y, tolerance, metric)
+        runs = []
+        curr_colour=None
+        pixel_count=0
+        for x in range(self.getsize()[0]):  # Go over all the pixels on the row.
+            pixel_colour = self.getpixel(x, y)
+            if curr_colour != pixel_colour:
+                if curr_colour is not None: # Otherwise we get mysterious NoneTypes down the road.
+                    runs.append((pixel_count, curr_colour))
+                curr_colour=pixel_colour
+                pixel_count=1
+            else:
+                pixel_count += 1  # This row got 1 pixel longer.
+        # Add the last one
+        if curr_colour is not None:
+            runs.append((pixel_count, curr_colour))
+        return runs
+
+    def _row_runs_tolerant(self, y: int, tolerance: float, metric: str) -> List[Tuple[int, RGB]]:
+        """
+        Version of _row_runs where a run carries on as long as pixels are within tolerance of the first pixel of the run.
+        """
+        runs = []
+        curr_colour=None
+        pixel_count=0
+        for x in range(self.getsize()[0]):
+            pixel_colour = self.getpixel(x, y)
+            if curr_colour is None or _colour.distance(curr_colour, pixel_colour, metric) > tolerance:
+                if curr_colour is not None:
+                    runs.append((pixel_count, curr_colour))
+                curr_colour=pixel_colour
+                pixel_count=1
+            else:
+                pixel_count += 1
+        if curr_colour is not None:
+            runs.append((pixel_count, curr_colour))
+        return runs
+
+    def getcontiguousrows(self, tolerance: float=0, metric: str="channel") -> List[Union[Tuple[int, RGB], RowDivider]]:
         """
         Convert the image into a list of rows of contiguous colour. This returns a list of tuples containing a length and colour. 
         This list also contains RowDivider instances where one row of pixels jumps to the next. Any output of this function can 
         be guaranteed to have one RowDivider at the end of each row, including at the end of the final row.
 
+        By default only pixels of exactly the same colour are merged into a run. If tolerance is more than 0, a run carries on 
+        for as long as the pixels are within tolerance of the first pixel of the run (which gives the run its colour), measured 
+        with metric, one of colour.metrics. This is lossy, but makes the output much smaller for noisy images like JPEGs.
+
         A default implementation is provided, but if a more efficient one is available, override this function.
         """
         result = []
-        for y in range(self.getsize()[1]):
-            curr_colour=None
-            pixel_count=0
-            for x in range(self.getsize()[0]):  # Go over all the pixels on the row.
-                pixel_colour = self.getpixel(x, y)
-                if curr_colour != pixel_colour:
-                    if curr_colour is not None: # Otherwise we get mysterious NoneTypes down the road.
-                        result.append((pixel_count, curr_colour))
-                    curr_colour=pixel_colour
-                    pixel_count=1
-                else:
-                    pixel_count += 1  # This row got 1 pixel longer.
-            # Add the last one and a RowDivider
-            result.append((pixel_count, curr_colour))
+        for row in self.itercontiguousrows(tolerance, metric):
+            result.extend(row)
             result.append(RowDivider())
         return result
 
+    def itercontiguousrows(self, tolerance: float=0, metric: str="channel") -> Iterator[List[Tuple[int, RGB]]]:
+        """
+        Generator version of getcontiguousrows, yielding one row at a time as a list of (count, colour) tuples (so there are no 
+        RowDividers). Only the current row has to be kept in memory.
+
+        A default implementation is provided, but if a more efficient one is available, override this function.
+        """
+        for y in range(self.getsize()[1]):
+            yield self._row_runs(y, tolerance, metric)
+
+    def getruntable(self, tolerance: float=0, metric: str="channel") -> RunTable:
+        """
+        Same as getcontiguousrows, but returns the much more compact RunTable rather than a list of tuples and RowDividers.
+
+        A default implementation is provided, but if a more efficient one is available, override this function.
+        """
+        table = RunTable()
+        for row in self.itercontiguousrows(tolerance, metric):
+            table.append_row(row)
+        return table
+
 
 class PixelAccessPillow(PixelAccess):
     """
     Pixel access for a Pillow/PIL image. If the image contains transparency, it must be blended with a background 
     colour (default is white).
     """
-    def __init__(self, image: Image.Image, background: RGB=(255, 255, 255)):
+    def __init__(self, image: Image.Image, background: RGB=(255, 255, 255), colours: Optional[int]=None, 
+            quantize_method: str="median-cut", dither: bool=False, width: Optional[int]=None, height: Optional[int]=None,
+            max_cells: Optional[int]=None, resample: str="box"):
         """
-        Create an RGB pixel accessor to a PIL image. Note that if the image has alpha-transparency, it must be blended with a background
+        Create an RGB pixel accessor to a PIL image. Note that if the image has transparency (alpha, or a transparent colour), it must be blended with a background
         colour - default is white.
+
+        If colours is given, the image is reduced to that many colours (2 to 256) using quantize_method, which is one of the 
+        names in imagemanipulation.quantize_methods. This makes runs longer and the palette smaller. dither turns on 
+        dithering, which looks closer to the original but breaks up runs.
+
+        If width and/or height are given, the image is scaled down to fit within them (keeping its aspect ratio) before 
+        anything else, with resample (one of the names in imagemanipulation.resample_filters). If the image is not loaded yet, 
+        JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale where they can be, which is much faster. If max_cells is given, 
+        getruntable scales the image down further until it has no more than that many runs.
         """
         super().__init__()
         if not _has_pil:
             raise NotImplementedError()
-        if 'A' in image.getbands():
-            self._image: Image.Image = imagemanipulation.pure_pil_alpha_to_background_colour_img(image.convert(mode="RGBA"), background)
-        else:
-            self._image: Image.Image = image.convert(mode="RGB")
+        target = None
+        if width is not None or height is not None:
+            imagemanipulation.draft(image, imagemanipulation.fit_size(image.size, width, height))
+        with stats.stage("decode"):
+            image.load()
+        if width is not None or height is not None:
+            # Fit what was decoded, so it comes out the same whether it was drafted here or before it got here.
+            target = imagemanipulation.fit_size(image.size, width, height)
+        with stats.stage("flatten"):
+            if imagemanipulation.has_transparency(image):
+                self._image: Image.Image = imagemanipulation.flatten_alpha(image, background)
+            else:
+                self._image: Image.Image = image.convert(mode="RGB")
+        if target is not None and target != self._image.size:
+            with stats.stage("scale"):
+                self._image = imagemanipulation.downscale(self._image, target, resample)
+        self._colours = colours
+        self._quantize_method = quantize_method
+        self._dither = dither
+        self._max_cells = max_cells
+        self._resample = resample
+        # The scaled but not quantized image, which getruntable scales down again if there are too many runs.
+        self._source: Optional[Image.Image] = self._image if max_cells is not None else None
+        self._image = self._quantize(self._image)
+        stats.record("pixels", self._image.size[0] * self._image.size[1])
+
+    def _quantize(self, image: Image.Image) -> Image.Image:
+        if self._colours is None:
+            return image
+        with stats.stage("quantize"):
+            return imagemanipulation.quantize(image, self._colours, self._quantize_method, self._dither)
 
     def getsize(self) -> Tuple[int, int]:
         return self._image.size
 
+    def getrgbimage(self) -> Image.Image:
+        """
+        Get the (flattened, if it had transparency, and scaled) RGB image being accessed.
+        """
+        return self._image
+
     def getpixel(self, x, y) -> RGB:
         return self._image.getpixel((x, y))
+
+    def _encode(self, tolerance: float, metric: str) -> RunTable:
+        with stats.stage("runs"):
+            width, height = self.getsize()
+            if not _has_numpy or width == 0 or height == 0:
+                # Not super().getruntable, which would come back round through our itercontiguousrows.
+                table = RunTable()
+                for row in PixelAccess.itercontiguousrows(self, tolerance, metric):
+                    table.append_row(row)
+                return table
+            return _encode_rgb_array(np.asarray(self._image), tolerance, metric)
+
+    def getruntable(self, tolerance: float=0, metric: str="channel") -> RunTable:
+        """
+        Vectorised version of PixelAccess.getruntable using NumPy, see _encode_rgb_array.
+
+        If max_cells was given and there are more runs than that, the image is scaled down by about the square root of how many 
+        times too many there are, again and again until there are few enough (or it is 1x1). getsize, getpixel and 
+        getrgbimage give the scaled image afterwards. The runs are counted before any rows are merged (see RunTable.merge_rows).
+
+        Falls back to the per-pixel implementation if NumPy is not available.
+        """
+        table = self._encode(tolerance, metric)
+        while self._max_cells is not None and table.run_count() > self._max_cells:
+            width, height = self.getsize()
+            if width * height <= 1:
+                break
+            # A little under the square root, so it does not take many goes to get under the budget. Always at least a pixel
+            # smaller, so it gets there in the end.
+            scale = math.sqrt(self._max_cells / table.run_count()) * 0.95
+            size = (max(1, min(width - 1, int(width * scale))), max(1, min(height - 1, int(height * scale))))
+            with stats.stage("scale"):
+                self._image = imagemanipulation.downscale(self._source, size, self._resample)
+            self._image = self._quantize(self._image)
+            table = self._encode(tolerance, metric)
+            stats.record("pixels", size[0] * size[1])
+        stats.record("runs", table.run_count())
+        return table
+
+    def getcontiguousrows(self, tolerance: float=0, metric: str="channel") -> List[Union[Tuple[int, RGB], RowDivider]]:
+        """
+        Vectorised version of PixelAccess.getcontiguousrows, going through getruntable.
+
+        Falls back to the per-pixel implementation if NumPy is not available, which does not scale the image down to fit 
+        max_cells (getruntable still does).
+        """
+        if not _has_numpy:
+            return super().getcontiguousrows(tolerance, metric)
+        return self.getruntable(tolerance, metric).tolist()
+
+    def itercontiguousrows(self, tolerance: float=0, metric: str="channel") -> Iterator[List[Tuple[int, RGB]]]:
+        """
+        Vectorised version of PixelAccess.itercontiguousrows, going through getruntable. The whole image is already in memory, 
+        so this does not save much, see PixelAccessPillowStrips for that.
+
+        Falls back to the per-pixel implementation if NumPy is not available, which does not scale the image down to fit 
+        max_cells (getruntable still does).
+        """
+        if not _has_numpy:
+            return super().itercontiguousrows(tolerance, metric)
+        return self.getruntable(tolerance, metric).iterrows()
+
+
+# Browsers show GIF frames without a duration for 100ms, so we do too.
+_default_frame_duration = 100
+
+
+class PixelAccessPillowFrames(object):
+    """
+    Pixel access for every frame of a multi-frame Pillow/PIL image, such as an animated GIF, APNG or WebP. Pillow gives each
+    frame as the whole image with the frames before it already drawn underneath, so every frame is a complete picture of its
+    own, accessed with a PixelAccessPillow.
+    """
+    def __init__(self, image: Image.Image, background: RGB=(255, 255, 255), colours: Optional[int]=None,
+            quantize_method: str="median-cut", dither: bool=False, width: Optional[int]=None, height: Optional[int]=None,
+            resample: str="box"):
+        """
+        The arguments are passed on to the PixelAccessPillow of each frame. There is no max_cells, as every frame has to be 
+        scaled the same.
+        """
+        if not _has_pil:
+            raise NotImplementedError()
+        self._image = image
+        self._background = background
+        self._colours = colours
+        self._quantize_method = quantize_method
+        self._dither = dither
+        self._width = width
+        self._height = height
+        self._resample = resample
+
+    def getframecount(self) -> int:
+        return getattr(self._image, "n_frames", 1)
+
+    def getloop(self) -> Optional[int]:
+        """
+        Get how many times the animation should be played, where 0 is forever and None means it was not set.
+        """
+        return self._image.info.get("loop")
+
+    def iterframes(self) -> Iterator[Tuple[PixelAccessPillow, int]]:
+        """
+        Iterate over the frames, as pairs of a PixelAccessPillow and how long the frame is shown for in milliseconds. Each
+        frame is read as it is needed, and moves the image on to that frame.
+        """
+        for index in range(self.getframecount()):
+            self._image.seek(index)
+            duration = int(self._image.info.get("duration") or _default_frame_duration)
+            yield PixelAccessPillow(
+                self._image, self._background, self._colours, self._quantize_method, self._dither, self._width, self._height,
+                resample=self._resample
+            ), duration
+
+    def getruntables(self, tolerance: float=0, metric: str="channel") -> Tuple[List[RunTable], List[int]]:
+        """
+        Get the run table of every frame, and how long each is shown for in milliseconds. Only the runs are kept, so this takes
+        about as much memory as the run tables of that many still images.
+        """
+        tables = []
+        durations = []
+        for pixels, duration in self.iterframes():
+            tables.append(pixels.getruntable(tolerance, metric))
+            durations.append(duration)
+        stats.record("frames", len(tables))
+        stats.record("runs", sum(table.run_count() for table in tables))
+        return tables, durations
+
+
+def _raw_strips(image: Image.Image) -> Optional[List[Tuple[int, int, int, str, int, int]]]:
+    """
+    Get where the rows of an opened (but not loaded) image are in its file, if it is stored uncompressed (PPM, BMP, 
+    uncompressed TIFF, ...), as a list of (top, bottom, offset, rawmode, stride, orientation) for each strip of full rows. 
+    Returns None if the rows cannot be read directly.
+    """
+    width, height = image.size
+    if getattr(image, "fp", None) is None or not getattr(image, "tile", None):  # Not from a file, or already loaded
+        return None
+    strips = []
+    for tile in sorted(image.tile, key=lambda tile: tile[1][1]):
+        codec, extents, offset, args = tile[:4]
+        if codec != "raw" or extents[0] != 0 or extents[2] != width:
+            return None
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        if stride == 0:
+            # Rows are packed, which we can only work out for the simple byte-per-band modes.
+            if rawmode != image.mode or image.mode not in ("L", "P", "LA", "RGB", "RGBA", "CMYK"):
+                return None
+            stride = width * len(image.mode)
+        strips.append((extents[1], extents[3], offset, rawmode, stride, orientation))
+    if strips[0][0] != 0 or strips[-1][1] != height or any(a[1] != b[0] for a, b in zip(strips, strips[1:])):
+        return None
+    return strips
+
+
+class PixelAccessPillowStrips(PixelAccess):
+    """
+    Pixel access for a Pillow/PIL image which is read and converted a strip of rows at a time, for images too big to have in 
+    memory all at once. See PixelAccessPillow for how transparency is handled.
+    """
+    def __init__(self, image: Image.Image, background: RGB=(255, 255, 255), strip_pixels: int=1 << 20):
+        """
+        Create an RGB pixel accessor to a PIL image opened with Image.open, without loading it. Strips of rows about 
+        strip_pixels pixels big (but always at least one row) are read and converted one at a time, so the memory used by 
+        itercontiguousrows is proportional to the width of the image rather than its area.
+
+        Uncompressed images (PPM, BMP, uncompressed TIFF, ...) are read straight from the file, a strip at a time. Anything 
+        else has to be decoded all at once by Pillow, but the RGB copy is still only made one strip at a time.
+        """
+        super().__init__()
+        if not _has_pil:
+            raise NotImplementedError()
+        self._source = image
+        self._background = background
+        width, height = image.size
+        self._strip_rows = max(1, strip_pixels // max(1, width))
+        self._raw_strips = _raw_strips(image)
+        if self._raw_strips is None:
+            with stats.stage("decode"):
+                image.load()
+        self._cached_strip = (0, 0, None)
+        stats.record("pixels", width * height)
+
+    def getsize(self) -> Tuple[int, int]:
+        return self._source.size
+
+    def _read_raw(self, top: int, bottom: int) -> Image.Image:
+        """
+        Read rows top to bottom of the image straight from its file. They must be inside one of the raw strips.
+        """
+        width = self._source.size[0]
+        for strip_top, strip_bottom, offset, rawmode, stride, orientation in self._raw_strips:
+            if strip_top <= top and bottom <= strip_bottom:
+                break
+        # Bottom-up images have their last row first.
+        first = top - strip_top if orientation >= 0 else strip_bottom - bottom
+        fp = self._source.fp
+        fp.seek(offset + first * stride)
+        strip = Image.frombytes(self._source.mode, (width, bottom - top), fp.read((bottom - top) * stride), "raw", 
+                rawmode, stride, orientation)
+        if self._source.mode == "P":
+            strip.putpalette(self._source.palette)
+        strip.info.update(self._source.info)
+        return strip
+
+    def _strips(self) -> Iterator[Tuple[int, int]]:
+        """
+        Split the image into strips of rows, (top, bottom), never crossing from one raw strip of the file into the next.
+        """
+        boundaries = self._raw_strips or [(0, self._source.size[1])]
+        for strip_top, strip_bottom in (strip[:2] for strip in boundaries):
+            for top in range(strip_top, strip_bottom, self._strip_rows):
+                yield top, min(strip_bottom, top + self._strip_rows)
+
+    def getstrip(self, top: int, bottom: int) -> Image.Image:
+        """
+        Get rows top to bottom of the image as an RGB image, flattened if it has transparency.
+        """
+        with stats.stage("decode"):
+            if self._raw_strips is not None:
+                strip = self._read_raw(top, bottom)
+            else:
+                strip = self._source.crop((0, top, self._source.size[0], bottom))
+        with stats.stage("flatten"):
+            if imagemanipulation.has_transparency(strip):
+                return imagemanipulation.flatten_alpha(strip, self._background)
+            return strip.convert(mode="RGB")
+
+    def getpixel(self, x, y) -> RGB:
+        top, bottom, strip = self._cached_strip
+        if not top <= y < bottom:
+            for top, bottom in self._strips():
+                if top <= y < bottom:
+                    break
+            else:
+                raise IndexError("row {!s} is out of range".format(y))
+            strip = self.getstrip(top, bottom)
+            self._cached_strip = (top, bottom, strip)
+        return strip.getpixel((x, y - top))
+
+    def _strip_tables(self, tolerance: float, metric: str) -> Iterator[RunTable]:
+        """
+        Run-length encode the image one strip at a time with NumPy, yielding a RunTable for each strip.
+        """
+        for top, bottom in self._strips():
+            strip = self.getstrip(top, bottom)
+            with stats.stage("runs"):
+                table = _encode_rgb_array(np.asarray(strip), tolerance, metric)
+            yield table
+
+    def itercontiguousrows(self, tolerance: float=0, metric: str="channel") -> Iterator[List[Tuple[int, RGB]]]:
+        """
+        Vectorised version of PixelAccess.itercontiguousrows using NumPy, one strip at a time.
+
+        Falls back to the per-pixel implementation if NumPy is not available.
+        """
+        if not _has_numpy:
+            yield from super().itercontiguousrows(tolerance, metric)
+            return
+        for table in self._strip_tables(tolerance, metric):
+            yield from table.iterrows()
+
+    def getruntable(self, tolerance: float=0, metric: str="channel") -> RunTable:
+        """
+        Version of PixelAccess.getruntable which encodes the image a strip at a time. Only the runs of the whole image are kept
+        in memory, never all of its pixels.
+
+        Falls back to the per-pixel implementation if NumPy is not available.
+        """
+        if not _has_numpy:
+            return super().getruntable(tolerance, metric)
+        table = RunTable()
+        for strip_table in self._strip_tables(tolerance, metric):
+            table.extend(strip_table)
+        stats.record("runs", table.run_count())
+        return table
+
+
+# The channel layouts assumed for arrays with each number of channels, see PixelAccessBuffer.
+_default_layouts = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+
+
+def _parse_layout(layout: str) -> Tuple[Tuple[int, int, int], Optional[int]]:
+    """
+    Work out which bytes of a pixel laid out as layout (see PixelAccessBuffer) are its red, green and blue, and its alpha (None 
+    if there is none). Greyscale layouts use the grey byte for all three.
+    """
+    if not layout or not set(layout) <= set("RGBLAX") or any(layout.count(channel) > 1 for channel in "RGBLA"):
+        raise ValueError("invalid channel layout {!r}".format(layout))
+    if "L" in layout and not any(channel in layout for channel in "RGB"):
+        colour = (layout.index("L"),) * 3
+    elif "L" not in layout and all(channel in layout for channel in "RGB"):
+        colour = tuple(layout.index(channel) for channel in "RGB")
+    else:
+        raise ValueError("channel layout {!r} must have R, G and B, or L".format(layout))
+    return colour, layout.index("A") if "A" in layout else None
+
+
+def _blend(colour: RGB, alpha: int, background: RGB) -> RGB:
+    """
+    Blend a colour with alpha onto background, rounding exactly like Pillow's paste (which flatten_alpha uses), so the result 
+    is the same as for a Pillow image.
+    """
+    blended = []
+    for value, behind in zip(colour, background):
+        value = value * alpha + behind * (255 - alpha) + 128
+        blended.append((value + (value >> 8)) >> 8)
+    return tuple(blended)
+
+
+def _rgb_array(pixels: "np.ndarray", layout: str, background: RGB) -> "np.ndarray":
+    """
+    Get the (height, width, 3) RGB pixels of a (height, width, channels) uint8 array laid out as layout. Where the red, green and
+    blue are evenly spaced (RGB, BGR, RGBA, BGRX, greyscale, ...) this is a view of pixels rather than a copy, unless there is 
+    alpha to blend with background.
+    """
+    (red, green, blue), alpha = _parse_layout(layout)
+    if red == green == blue:
+        rgb = np.broadcast_to(pixels[:, :, red:red + 1], pixels.shape[:2] + (3,))
+    elif green - red == blue - green:
+        step = green - red
+        stop = blue + step
+        rgb = pixels[:, :, red:stop if stop >= 0 else None:step]
+    else:
+        rgb = pixels[:, :, [red, green, blue]]
+    if alpha is None:
+        return rgb
+    # Same rounding as _blend.
+    opacity = pixels[:, :, alpha:alpha + 1].astype(np.uint32)
+    blended = rgb * opacity + np.asarray(background, dtype=np.uint32) * (255 - opacity) + 128
+    return ((blended + (blended >> 8)) >> 8).astype(np.uint8)
+
+
+class PixelAccessArray(PixelAccess):
+    """
+    Pixel access for a NumPy array of 8-bit pixels, without copying it. Transparent pixels are blended with a background 
+    colour (default is white), like PixelAccessPillow.
+    """
+    def __init__(self, pixels: "np.ndarray", layout: Optional[str]=None, background: RGB=(255, 255, 255), 
+            strip_pixels: int=1 << 20):
+        """
+        pixels is a (height, width, channels) or (height, width) uint8 array, laid out as layout (see PixelAccessBuffer). 
+        Without a layout, 1, 2, 3 and 4 channels are L, LA, RGB and RGBA. Any strides work, so a crop or a channel of a bigger 
+        array can be used as it is.
+
+        The runs are worked out a strip of rows about strip_pixels pixels big at a time, so besides the array, the memory used 
+        is proportional to the width of the image.
+        """
+        super().__init__()
+        if not _has_numpy:
+            raise NotImplementedError("PixelAccessArray needs NumPy")
+        pixels = np.asarray(pixels)
+        if pixels.dtype != np.uint8:
+            raise TypeError("pixels must be 8-bit (uint8), not {}".format(pixels.dtype))
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, np.newaxis]
+        if pixels.ndim != 3:
+            raise ValueError("pixels must be a (height, width, channels) or (height, width) array")
+        self._layout = layout if layout is not None else _default_layouts.get(pixels.shape[2], "")
+        _parse_layout(self._layout)
+        if len(self._layout) != pixels.shape[2]:
+            raise ValueError("channel layout {!r} does not match {!s} channels".format(self._layout, pixels.shape[2]))
+        self._pixels = pixels
+        self._background = tuple(background)
+        self._strip_rows = max(1, strip_pixels // max(1, pixels.shape[1]))
+        stats.record("pixels", pixels.shape[0] * pixels.shape[1])
+
+    def getsize(self) -> Tuple[int, int]:
+        return self._pixels.shape[1], self._pixels.shape[0]
+
+    def getrgbarray(self, top: int=0, bottom: Optional[int]=None) -> "np.ndarray":
+        """
+        Get rows top to bottom (default all of them) as a (height, width, 3) RGB array, blended with the background if there is
+        alpha. This is a view of the array where it can be.
+        """
+        return _rgb_array(self._pixels[top:bottom], self._layout, self._background)
+
+    def getpixel(self, x, y) -> RGB:
+        colour, alpha = _parse_layout(self._layout)
+        pixel = self._pixels[y, x].tolist()
+        rgb = tuple(pixel[index] for index in colour)
+        return _blend(rgb, pixel[alpha], self._background) if alpha is not None else rgb
+
+    def _strip_tables(self, tolerance: float, metric: str) -> Iterator[RunTable]:
+        height = self._pixels.shape[0]
+        for top in range(0, height, self._strip_rows):
+            with stats.stage("runs"):
+                table = _encode_rgb_array(self.getrgbarray(top, top + self._strip_rows), tolerance, metric)
+            yield table
+
+    def itercontiguousrows(self, tolerance: float=0, metric: str="channel") -> Iterator[List[Tuple[int, RGB]]]:
+        """
+        Vectorised version of PixelAccess.itercontiguousrows, one strip at a time.
+        """
+        for table in self._strip_tables(tolerance, metric):
+            yield from table.iterrows()
+
+    def getruntable(self, tolerance: float=0, metric: str="channel") -> RunTable:
+        """
+        Vectorised version of PixelAccess.getruntable, see _encode_rgb_array.
+        """
+        table = RunTable()
+        if self._pixels.shape[1] > 0:
+            for strip_table in self._strip_tables(tolerance, metric):
+                table.extend(strip_table)
+        else:
+            table.row_offsets.extend(itertools.repeat(0, self._pixels.shape[0]))
+        stats.record("runs", table.run_count())
+        return table
+
+    def getcontiguousrows(self, tolerance: float=0, metric: str="channel") -> List[Union[Tuple[int, RGB], RowDivider]]:
+        return self.getruntable(tolerance, metric).tolist()
+
+
+class PixelAccessBuffer(PixelAccess):
+    """
+    Pixel access for raw 8-bit pixels in anything supporting the buffer protocol (bytes, bytearray, array.array, mmap, 
+    memoryview, ...), such as frames from a camera or video decoder, without copying them. Transparent pixels are blended with 
+    a background colour (default is white), like PixelAccessPillow.
+
+        pixels = PixelAccessBuffer(frame, 640, 480, "BGRX")
+        write_html_css(pixels.getruntable(), html_file, css_file)
+    """
+    def __init__(self, buffer: Any, width: int, height: int, layout: str="RGB", stride: Optional[int]=None, offset: int=0, 
+            background: RGB=(255, 255, 255), strip_pixels: int=1 << 20):
+        """
+        layout is the order of the bytes of each pixel: R, G, B and A for red, green, blue and alpha, L for grey (instead of R, 
+        G and B) and X for a byte which is ignored, e.g. "RGB", "BGRA", "RGBX" or "L". Rows start stride bytes apart (default 
+        width * len(layout), i.e. no padding), and the first starts offset bytes into the buffer.
+
+        With NumPy, the runs are worked out with PixelAccessArray on a view of the buffer. Without it, one row at a time in 
+        pure Python.
+        """
+        super().__init__()
+        _parse_layout(layout)
+        channels = len(layout)
+        stride = stride if stride is not None else width * channels
+        if width < 0 or height < 0 or stride < width * channels or offset < 0:
+            raise ValueError("invalid size, stride or offset")
+        self._view = memoryview(buffer).cast("B")
+        if height > 0 and width > 0 and len(self._view) < offset + (height - 1) * stride + width * channels:
+            raise ValueError("buffer is too small for a {!s}x{!s} {} image".format(width, height, layout))
+        self._size = (width, height)
+        self._layout = layout
+        self._stride = stride
+        self._offset = offset
+        self._background = tuple(background)
+        self._array = None
+        if _has_numpy:
+            pixels = np.ndarray(
+                (height, width, channels), np.uint8, self._view if width > 0 and height > 0 else None, offset, 
+                (stride, channels, 1)
+            )
+            self._array = PixelAccessArray(pixels, layout, background, strip_pixels)
+        else:
+            stats.record("pixels", width * height)
+
+    def getsize(self) -> Tuple[int, int]:
+        return self._size
+
+    def _row_colours(self, y: int) -> Iterator[RGB]:
+        """
+        Iterate over the colours of the pixels on row y.
+        """
+        channels = len(self._layout)
+        start = self._offset + y * self._stride
+        row = self._view[start:start + self._size[0] * channels]
+        (red, green, blue), alpha = _parse_layout(self._layout)
+        colours = zip(row[red::channels], row[green::channels], row[blue::channels])
+        if alpha is not None:
+            return map(_blend, colours, row[alpha::channels], itertools.repeat(self._background))
+        return colours
+
+    def getpixel(self, x, y) -> RGB:
+        if self._array is not None:
+            return self._array.getpixel(x, y)
+        if not (0 <= x < self._size[0] and 0 <= y < self._size[1]):
+            raise IndexError("pixel ({!s}, {!s}) is out of range".format(x, y))
+        return next(itertools.islice(self._row_colours(y), x, None))
+
+    def _row_runs(self, y: int, tolerance: float=0, metric: str="channel") -> List[Tuple[int, RGB]]:
+        """
+        Version of PixelAccess._row_runs which reads the whole row at once.
+        """
+        if tolerance > 0:
+            return self._row_runs_tolerant(y, tolerance, metric)
+        return [(sum(1 for _ in run), colour) for colour, run in itertools.groupby(self._row_colours(y))]
+
+    def itercontiguousrows(self, tolerance: float=0, metric: str="channel") -> Iterator[List[Tuple[int, RGB]]]:
+        if self._array is not None:
+            return self._array.itercontiguousrows(tolerance, metric)
+        return super().itercontiguousrows(tolerance, metric)
+
+    def getruntable(self, tolerance: float=0, metric: str="channel") -> RunTable:
+        if self._array is not None:
+            return self._array.getruntable(tolerance, metric)
+        with stats.stage("runs"):
+            table = super().getruntable(tolerance, metric)
+        stats.record("runs", table.run_count())
+        return table
+
+    def getcontiguousrows(self, tolerance: float=0, metric: str="channel") -> List[Union[Tuple[int, RGB], RowDivider]]:
+        if self._array is not None:
+            return self._array.getcontiguousrows(tolerance, metric)
+        return super().getcontiguousrows(tolerance, metric)
+
+
+# PAM tuple types and the channel layouts they are read as.
+_pam_layouts = {
+    "BLACKANDWHITE": "L",
+    "GRAYSCALE": "L",
+    "RGB": "RGB",
+    "BLACKANDWHITE_ALPHA": "LA",
+    "GRAYSCALE_ALPHA": "LA",
+    "RGB_ALPHA": "RGBA",
+}
+
+
+def _read_exactly(f, size: int) -> bytes:
+    """
+    Read size bytes from f, which may be a pipe that gives them in pieces. Raises ValueError if it ends first.
+    """
+    chunks = []
+    while size > 0:
+        chunk = f.read(size)
+        if not chunk:
+            raise ValueError("file ends in the middle of the image")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_netpbm_header(f) -> Tuple[int, int, int, str]:
+    """
+    Read the header of a binary PGM (P5), PPM (P6) or PAM (P7) file from f, leaving f at the start of the pixels. Returns the 
+    width, height, maxval and channel layout.
+    """
+    magic = f.read(2)
+    if magic in (b"P5", b"P6"):
+        # Whitespace separated numbers, with comments from # to the end of the line, then one whitespace byte.
+        numbers = []
+        token = b""
+        while len(numbers) < 3:
+            byte = f.read(1)
+            if not byte:
+                raise ValueError("file ends in the middle of the header")
+            if byte == b"#":
+                while byte not in (b"\n", b"\r", b""):
+                    byte = f.read(1)
+            if byte.isspace():
+                if token:
+                    numbers.append(int(token))
+                    token = b""
+            elif byte.isdigit():
+                token += byte
+            else:
+                raise ValueError("invalid header")
+        width, height, maxval = numbers
+        layout = "L" if magic == b"P5" else "RGB"
+    elif magic == b"P7":
+        fields = {}
+        tuple_type = None
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError("file ends in the middle of the header")
+            words = line.split(b"#", 1)[0].split()
+            if not words:
+                continue
+            if words[0] == b"ENDHDR":
+                break
+            if words[0] == b"TUPLTYPE":
+                tuple_type = b" ".join(words[1:]).decode("ascii", "replace")
+            elif len(words) == 2 and words[0] in (b"WIDTH", b"HEIGHT", b"DEPTH", b"MAXVAL"):
+                fields[words[0].decode("ascii")] = int(words[1])
+        if set(fields) != {"WIDTH", "HEIGHT", "DEPTH", "MAXVAL"}:
+            raise ValueError("PAM header needs WIDTH, HEIGHT, DEPTH and MAXVAL")
+        width, height, maxval = fields["WIDTH"], fields["HEIGHT"], fields["MAXVAL"]
+        layout = _pam_layouts.get(tuple_type, _default_layouts.get(fields["DEPTH"]))
+        if layout is None or len(layout) != fields["DEPTH"]:
+            raise ValueError("unsupported PAM tuple type {!r} with depth {!s}".format(tuple_type, fields["DEPTH"]))
+    else:
+        raise ValueError("not a binary PGM, PPM or PAM file")
+    if not 0 < maxval < 65536:
+        raise ValueError("invalid maxval {!s}".format(maxval))
+    return width, height, maxval, layout
+
+
+class PixelAccessNetpbm(PixelAccess):
+    """
+    Pure Python streaming reader for binary PGM (P5), PPM (P6) and PAM (P7) files, which are what tools like ffmpeg and 
+    ImageMagick write raw frames as. Only a strip of rows is read at a time, so any size of image can be converted with 
+    itercontiguousrows (and write_html_css_two_pass), and it works without PIL.
+
+        with open("frame.ppm", "rb") as f:
+            pixels = PixelAccessNetpbm(f)
+            write_html_css_two_pass(pixels.itercontiguousrows, html_file, css_file)
+
+    Samples with a maxval other than 255 (including 16-bit ones) are scaled to 0-255, rounding to the nearest. PAM files with 
+    alpha are blended with a background colour (default is white), like PixelAccessPillow.
+    """
+    def __init__(self, f, background: RGB=(255, 255, 255), strip_pixels: int=1 << 20):
+        """
+        f is a binary file, read from where it is. Files which cannot seek (like pipes) can only be read through once, by one 
+        call of itercontiguousrows, getcontiguousrows or getruntable.
+        """
+        super().__init__()
+        self._file = f
+        self._background = tuple(background)
+        self._width, self._height, self._maxval, self._layout = _read_netpbm_header(f)
+        self._sample_bytes = 1 if self._maxval < 256 else 2
+        self._row_bytes = self._width * len(self._layout) * self._sample_bytes
+        self._strip_rows = max(1, strip_pixels // max(1, self._width))
+        try:
+            self._data_offset = f.tell()
+        except (AttributeError, OSError):
+            self._data_offset = None
+        self._position = 0  # Row f is at, when it cannot seek.
+        self._scale = None
+        if self._maxval != 255 and self._sample_bytes == 1:
+            # Samples above maxval are invalid, and clamped.
+            self._scale = bytes((min(value, self._maxval) * 255 + self._maxval // 2) // self._maxval for value in range(256))
+        self._cached_strip = (0, 0, None)
+        stats.record("pixels", self._width * self._height)
+
+    def getsize(self) -> Tuple[int, int]:
+        return self._width, self._height
+
+    def getlayout(self) -> str:
+        """
+        Get the channel layout of the file's pixels (L, LA, RGB or RGBA), see PixelAccessBuffer.
+        """
+        return self._layout
+
+    def _to_8_bit(self, data: bytes) -> bytes:
+        """
+        Scale samples with a maxval other than 255 to 0-255.
+        """
+        if self._sample_bytes == 2:
+            if _has_numpy:
+                samples = np.minimum(np.frombuffer(data, dtype=">u2"), self._maxval).astype(np.uint32)
+                return ((samples * 255 + self._maxval // 2) // self._maxval).astype(np.uint8).tobytes()
+            samples = array.array("H", data)
+            if sys.byteorder == "little":
+                samples.byteswap()
+            return bytes((min(value, self._maxval) * 255 + self._maxval // 2) // self._maxval for value in samples)
+        if self._scale is not None:
+            return data.translate(self._scale)
+        return data
+
+    def getstrip(self, top: int, bottom: int) -> PixelAccessBuffer:
+        """
+        Read rows top to bottom of the image, as a PixelAccessBuffer of 8-bit samples.
+        """
+        with stats.stage("decode"):
+            if self._data_offset is not None:
+                self._file.seek(self._data_offset + top * self._row_bytes)
+            elif top != self._position:
+                raise ValueError("can only read a file which cannot seek once, from the top down")
+            data = self._to_8_bit(_read_exactly(self._file, (bottom - top) * self._row_bytes))
+            self._position = bottom
+        # The pixels of the whole image were already counted, so the strip should not record its own.
+        with stats.paused():
+            return PixelAccessBuffer(data, self._width, bottom - top, self._layout, background=self._background)
+
+    def _strips(self) -> Iterator[Tuple[int, int]]:
+        for top in range(0, self._height, self._strip_rows):
+            yield top, min(self._height, top + self._strip_rows)
+
+    def getpixel(self, x, y) -> RGB:
+        top, bottom, strip = self._cached_strip
+        if not top <= y < bottom:
+            if not 0 <= y < self._height:
+                raise IndexError("row {!s} is out of range".format(y))
+            top = y - y % self._strip_rows
+            bottom = min(self._height, top + self._strip_rows)
+            strip = self.getstrip(top, bottom)
+            self._cached_strip = (top, bottom, strip)
+        return strip.getpixel(x, y - top)
+
+    def itercontiguousrows(self, tolerance: float=0, metric: str="channel") -> Iterator[List[Tuple[int, RGB]]]:
+        """
+        Version of PixelAccess.itercontiguousrows which reads and encodes the file a strip at a time.
+        """
+        if self._data_offset is None and self._position != 0:
+            raise ValueError("can only read a file which cannot seek once, from the top down")
+        for top, bottom in self._strips():
+            yield from self.getstrip(top, bottom).itercontiguousrows(tolerance, metric)
+
+    def getruntable(self, tolerance: float=0, metric: str="channel") -> RunTable:
+        """
+        Version of PixelAccess.getruntable which reads and encodes the file a strip at a time. Only the runs of the whole 
+        image are kept in memory, never all of its pixels.
+        """
+        table = RunTable()
+        for top, bottom in self._strips():
+            table.extend(self.getstrip(top, bottom).getruntable(tolerance, metric))
+        stats.record("runs", table.run_count())
+        return table
@@ -1,7 +1,10 @@
-from PIL import Image
 """
 Based off of https://stackoverflow.com/questions/9166400/convert-rgba-png-to-rgb-with-pil 
 """
+try:
+    from PIL import Image
+except ImportError:  # Only needed for Pillow images, see data.PixelAccessBuffer and friends for the rest.
+    from .._dummy_pil import Image
 
 def alpha_composite(front, back):
     """Alpha composite two RGBA images.
@@ -26,7 +29,7 @@ def alpha_composite(front, back):
     result[rgb] = (front[rgb] * falpha + back[rgb] * balpha * (1 - falpha)) / result[alpha]
     np.seterr(**old_setting)
     result[alpha] *= 255
-    np.clip(result, 0, 255)
+    result = np.clip(result, 0, 255)
     # astype('uint8') maps np.nan and np.inf to 0
     result = result.astype('uint8')
     result = Image.fromarray(result, 'RGBA')
@@ -49,3 +52,165 @@ def pure_pil_alpha_to_background_colour_img(image, colour=(255, 255, 255)):
     background = Image.new('RGB', image.size, colour)
     background.paste(image, mask=image.split()[3])  # 3 is the alpha channel
     return background
+
+
+
+def has_transparency(image):
+    """Whether an image has transparency that needs flattening: an alpha band, or a palette/greyscale/RGB image with a
+    transparent colour.
+
+    Keyword Arguments:
+    image -- PIL Image object
+
+    """
+    return 'A' in image.getbands() or 'a' in image.mode or "transparency" in image.info
+
+
+# Modes paste can use directly as a mask, taking the alpha from the last band.
+_mask_modes = ("LA", "RGBA")
+
+
+def flatten_alpha(image, colour=(255, 255, 255), tile_pixels=1 << 20):
+    """Flatten an image with transparency (RGBA, LA, P with a transparent colour, ...) onto a background colour, giving an RGB
+    image.
+
+    Gives exactly the same result as pure_pil_alpha_to_background_colour_img (it is the same integer blend in Pillow's paste),
+    but the image is used as its own mask instead of being split into bands, and it is done in horizontal tiles of about
+    tile_pixels pixels. Modes other than RGBA and LA are converted to RGBA one tile at a time, so apart from the output nothing 
+    bigger than a tile is allocated (which is the whole image, if it fits in one tile), and this also works for very large 
+    images.
+
+    Keyword Arguments:
+    image -- PIL Image object
+    colour -- Tuple r, g, b (default 255, 255, 255)
+    tile_pixels -- Rough number of pixels per tile (default 1048576)
+
+    """
+    image.load()
+    width, height = image.size
+    background = Image.new('RGB', image.size, colour)
+    tile_rows = max(1, tile_pixels // max(1, width))
+    for top in range(0, height, tile_rows):
+        box = (0, top, width, min(height, top + tile_rows))
+        tile = image if tile_rows >= height else image.crop(box)
+        if tile.mode not in _mask_modes:
+            tile = tile.convert('RGBA')
+        background.paste(tile, box[:2], tile)
+    return background
+
+
+def _pil_constant(enum_name, name):
+    """
+    Get a Pillow constant from its enum (Pillow 9.1+), or from the Image module on older versions.
+    """
+    enum = getattr(Image, enum_name, None)
+    if enum is not None:
+        return getattr(enum, name)
+    return getattr(Image, name)
+
+
+# Quantization method names as used on the command line, with the name of the Pillow constant for each.
+# "pillow" leaves the choice to Pillow (currently median cut for RGB images).
+quantize_methods = {
+    "median-cut": "MEDIANCUT",
+    "max-coverage": "MAXCOVERAGE",
+    "octree": "FASTOCTREE",
+    "libimagequant": "LIBIMAGEQUANT",
+    "pillow": None,
+}
+
+
+def check_quantize_method(method):
+    """Raise a RuntimeError if Pillow cannot quantize with method (libimagequant is only there if Pillow was built with it).
+
+    Keyword Arguments:
+    method -- One of the keys of quantize_methods
+
+    """
+    if method == "libimagequant":
+        from PIL import features
+        if not features.check("libimagequant"):
+            raise RuntimeError("quantizing with libimagequant needs a Pillow built with libimagequant")
+
+
+def quantize(image, colours, method="median-cut", dither=False):
+    """Reduce an RGB image to at most colours distinct colours.
+
+    Fewer colours mean longer runs of the same colour, and a smaller palette, so the generated table gets much smaller.
+    Dithering looks closer to the original but breaks runs up again, so it is off by default.
+    "libimagequant" only works if Pillow was built with it.
+
+    Keyword Arguments:
+    image -- PIL RGB Image object
+    colours -- Number of colours to reduce to (2 to 256)
+    method -- One of the keys of quantize_methods (default "median-cut")
+    dither -- Whether to use Floyd-Steinberg dithering (default False)
+
+    """
+    if not 2 <= colours <= 256:
+        raise ValueError("colours must be between 2 and 256")
+    pil_method = quantize_methods[method]
+    quantized = image.quantize(
+        colors=colours,
+        method=_pil_constant("Quantize", pil_method) if pil_method is not None else None,
+        dither=_pil_constant("Dither", "FLOYDSTEINBERG" if dither else "NONE"),
+    )
+    return quantized.convert("RGB")
+
+
+# Resampling filter names as used on the command line, with the name of the Pillow constant for each.
+resample_filters = {
+    "box": "BOX",
+    "lanczos": "LANCZOS",
+    "nearest": "NEAREST",
+}
+
+
+def fit_size(size, width=None, height=None):
+    """Get the size an image of the given size is scaled to so it fits within width and height (either can be None for no 
+    limit), keeping its aspect ratio. Images are never made bigger, or smaller than 1x1.
+
+    Keyword Arguments:
+    size -- Tuple width, height of the image
+    width -- Largest width, or None (default None)
+    height -- Largest height, or None (default None)
+
+    """
+    if size[0] == 0 or size[1] == 0:
+        return tuple(size)
+    scale = 1.0
+    if width is not None:
+        scale = min(scale, width / size[0])
+    if height is not None:
+        scale = min(scale, height / size[1])
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def draft(image, size):
+    """Ask Pillow to decode an image at a smaller scale, if it can do that while the image is still at least size. JPEGs can be 
+    decoded at 1/2, 1/4 or 1/8 scale, which is much faster and takes less memory than decoding them whole and scaling them 
+    down. Does nothing for other formats, or images which are already loaded.
+
+    Keyword Arguments:
+    image -- PIL Image object, opened but not loaded
+    size -- Tuple width, height the image will be scaled down to
+
+    """
+    if getattr(image, "tile", None) and size[0] > 0 and size[1] > 0 and tuple(size) != image.size:
+        image.draft(None, size)
+
+
+def downscale(image, size, method="box"):
+    """Scale an image down to size with a resampling filter. Lanczos first shrinks the image by whole factors with Pillow's 
+    reduce, which is much faster and looks the same.
+
+    Keyword Arguments:
+    image -- PIL Image object
+    size -- Tuple width, height to scale to
+    method -- One of the keys of resample_filters (default "box")
+
+    """
+    if tuple(size) == image.size:
+        return image
+    resample = _pil_constant("Resampling", resample_filters[method])
+    return image.resize(size, resample, reducing_gap=3.0 if method == "lanczos" else None)
@@ -0,0 +1,137 @@
+"""
+Palettes shared by many images, so a page of thumbnails (or a whole site) needs only one stylesheet for their colours.
+
+A SharedPalette is one Huffman palette built from the colour counts of every image, and the class name which scopes its
+stylesheet. Tables written with table_class set to that class (see write_html_css) have no css of their own, and use the shared
+stylesheet instead. The palette can be saved as JSON and loaded again later, so more images can use a stylesheet which browsers
+already have cached:
+
+    shared = SharedPalette.build(table.colour_counts() for table in tables)
+    for table in tables:
+        write_html_css(table, html_file, css_file, palette=shared.colours, table_class=shared.class_name)
+    css_file.write(shared.css())
+    with open("palette.json", "w") as f:
+        shared.save(f)
+"""
+from . import data, rgb_to_html, _counts_to_palette, _render_css
+from ._typing import *
+import hashlib
+import json
+import string
+
+default_class = "tableimage"
+_palette_version = 1
+
+
+class SharedPalette(object):
+    """
+    A mapping of colours to css class names (colours), shared by every table with the class class_name.
+    """
+    def __init__(self, colours: Dict[data.RGB, str], class_name: str=default_class):
+        self.colours = colours
+        self.class_name = class_name
+
+    @classmethod
+    def build(cls, counts: Iterable[Dict[data.RGB, int]], class_name: str=default_class) -> "SharedPalette":
+        """
+        Build the palette from the colour counts of each image (like data.RunTable.colour_counts), added up so the most used
+        colours over all of them get the shortest names.
+        """
+        return cls(_counts_to_palette(_add_counts(counts)), class_name)
+
+    def missing(self, count: Dict[data.RGB, int]) -> Dict[data.RGB, int]:
+        """
+        Get the counts of the colours which are not in the palette yet.
+        """
+        return {colour: pixels for colour, pixels in count.items() if colour not in self.colours}
+
+    def extend(self, counts: Iterable[Dict[data.RGB, int]]) -> int:
+        """
+        Add the colours of images which are not in the palette yet, keeping the names of the colours already there so
+        stylesheets made from it before still work for the images which used them. Returns the number of colours added.
+
+        The new colours get their own Huffman names with a number on the end. Names from _counts_to_palette are only letters, so
+        they never clash with them, and the number is picked so they do not clash with colours added before either.
+        """
+        missing = self.missing(_add_counts(counts))
+        if len(missing) == 0:
+            return 0
+        names = _counts_to_palette(missing)
+        used = set(self.colours.values())
+        suffix = 0
+        while any(name + str(suffix) in used for name in names.values()):
+            suffix += 1
+        for colour, name in names.items():
+            self.colours[colour] = name + str(suffix)
+        return len(missing)
+
+    def scope(self, minify: bool=False) -> str:
+        return ('.' if minify else 'table.') + self.class_name
+
+    def css(self, pixel_size: int=3, minify: bool=False) -> str:
+        """
+        Render the stylesheet for every table with the class, like the css write_html_css writes for a single table.
+        """
+        return "".join(_render_css(self.colours, "", pixel_size, minify, self.scope(minify)))
+
+    def todict(self) -> Dict[str, Any]:
+        return {
+            "version": _palette_version,
+            "class": self.class_name,
+            "colours": {rgb_to_html(colour): name for colour, name in self.colours.items()},
+        }
+
+    def key(self, colours: Optional[Iterable[data.RGB]]=None) -> str:
+        """
+        Get a hash of the palette, which changes whenever the class or the name of any colour does. If colours is given, only the
+        names of those colours (such as the colours of one image) count.
+        """
+        if colours is None:
+            colours = self.colours.keys()
+        names = sorted((rgb_to_html(colour), self.colours[colour]) for colour in colours)
+        return hashlib.sha256(json.dumps([self.class_name, names]).encode("utf-8")).hexdigest()
+
+    def save(self, f):
+        """
+        Write the palette to the text file f as JSON.
+        """
+        json.dump(self.todict(), f, indent=1)
+        f.write("\n")
+
+    @classmethod
+    def load(cls, f) -> "SharedPalette":
+        """
+        Read a palette written by save from the text file f. Raises ValueError if it is not one.
+        """
+        stored = json.load(f)
+        if not isinstance(stored, dict) or stored.get("version") != _palette_version:
+            raise ValueError("not a tableimage palette (or from a different version)")
+        colours = {}
+        try:
+            for colour, name in stored["colours"].items():
+                colours[data.unpack_rgb(int(colour.lstrip("#"), 16))] = name
+            class_name = stored["class"]
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise ValueError("broken palette: {}".format(e))
+        if not is_class_name(class_name) or not all(is_class_name(name) for name in colours.values()):
+            raise ValueError("broken palette: invalid css class name")
+        return cls(colours, class_name)
+
+
+def _add_counts(counts: Iterable[Dict[data.RGB, int]]) -> Dict[data.RGB, int]:
+    total = {}
+    for count in counts:
+        for colour, pixels in count.items():
+            total[colour] = total.get(colour, 0) + pixels
+    return total
+
+
+def is_class_name(name: str) -> bool:
+    """
+    Check name can be used as a css class without escaping: letters, digits, - and _, not starting with a digit (or - and a
+    digit).
+    """
+    allowed = string.ascii_letters + string.digits + "-_"
+    if not isinstance(name, str) or not name.lstrip("-") or name.lstrip("-")[0] in string.digits:
+        return False
+    return all(character in allowed for character in name)
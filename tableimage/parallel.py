@@ -0,0 +1,115 @@
+"""
+Converting a single (very large) image using several processes, by splitting it into horizontal bands of pixel rows.
+
+Each band is run-length encoded in a worker process. The colour counts of the bands are then merged to build the palette for 
+the whole image, and the bands are rendered into <tr> chunks in the workers again, which are written out in order.
+"""
+from . import data, random_table_id, _sink_writer, _counts_to_palette, _table_start, _render_rows, _iter_columns, _render_css, \
+    _rowspans, _cell_count, _counting_writer
+from . import stats
+from ._typing import *
+import concurrent.futures
+import os
+from PIL import Image
+
+
+def _encode_band(job: Tuple[int, int, bytes, float, str]) -> Tuple[data.RunTable, Dict[data.RGB, int]]:
+    """
+    Worker process side of the first pass: run-length encode a band of RGB pixels and count its colours.
+    """
+    width, height, pixels, tolerance, metric = job
+    table = data.PixelAccessPillow(Image.frombytes("RGB", (width, height), pixels)).getruntable(tolerance, metric)
+    return table, table.colour_counts()
+
+
+def _render_band(job: Tuple[data.RunTable, Optional[Dict[data.RGB, str]], bool, int, Optional[List[List[int]]], bool]) -> str:
+    """
+    Worker process side of the second pass: render the rows of an encoded band into html.
+    """
+    table, palette, no_css, pixel_size, rowspans, minify = job
+    return "".join(_render_rows(_iter_columns(table), palette, no_css, pixel_size, rowspans, minify))
+
+
+def _band_jobs(image: Image.Image, bands: int, tolerance: float, metric: str) -> Iterator[Tuple[int, int, bytes, float, str]]:
+    """
+    Split an RGB image into (at most) bands horizontal bands, as jobs for _encode_band.
+    """
+    width, height = image.size
+    band_height = max(1, -(-height // bands))
+    for top in range(0, height, band_height):
+        bottom = min(height, top + band_height)
+        yield width, bottom - top, image.crop((0, top, width, bottom)).tobytes(), tolerance, metric
+
+
+def write_html_css_banded(pixels: data.PixelAccessPillow, html_sink: Any, css_sink: Any, no_css: bool=False, 
+        pixel_size: int=3, table_id: Optional[str]=None, bands: Optional[int]=None, 
+        executor: Optional[concurrent.futures.Executor]=None, tolerance: float=0, metric: str="channel", 
+        merge_rows: bool=False, minify: bool=False) -> int:
+    """
+    Same as write_html_css, but the image is split into bands which are encoded and rendered in parallel. Given the same table_id, 
+    the output is exactly the same as write_html_css(pixels.getruntable(tolerance, metric), ...).
+
+    With merge_rows, cells can be merged across bands, so the rowspans are worked out for the whole image between the passes.
+
+    Returns the number of <td> cells written.
+
+    bands is the number of bands to split the image into (default: one per CPU). executor is used to run the workers, if it is None 
+    a process pool is created for the duration of the call.
+    """
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor() as own_executor:
+            return write_html_css_banded(
+                pixels, html_sink, css_sink, no_css, pixel_size, table_id, bands, own_executor, tolerance, metric, merge_rows,
+                minify
+            )
+
+    write_html = _sink_writer(html_sink)
+    write_css = _sink_writer(css_sink)
+    collector = stats.active()
+    if collector is not None:
+        write_html = _counting_writer(write_html, collector, "html_bytes")
+        write_css = _counting_writer(write_css, collector, "css_bytes")
+    bands = bands if bands is not None else (os.cpu_count() or 1)
+
+    with stats.stage("runs"):
+        encoded = list(executor.map(_encode_band, _band_jobs(pixels.getrgbimage(), bands, tolerance, metric)))
+    stats.record("runs", sum(table.run_count() for table, _ in encoded))
+
+    palette = None
+    if not no_css:
+        # Merge the counts band by band, so colours stay in the order they first appear in the whole image, just like 
+        # data.RunTable.colour_counts, and the Huffman palette comes out the same.
+        with stats.stage("palette"):
+            count = {}
+            for _, band_count in encoded:
+                for colour, pixel_count in band_count.items():
+                    count[colour] = count.get(colour, 0) + pixel_count
+            palette = _counts_to_palette(count)
+        stats.record("colours", len(palette))
+        table_id = table_id if table_id is not None else random_table_id()
+
+    band_rowspans = [None] * len(encoded)
+    if merge_rows:
+        rowspans = _rowspans(row for table, _ in encoded for row in table.iterrows())
+        cells = _cell_count(rowspans)
+        top = 0
+        for index, (table, _) in enumerate(encoded):
+            band_rowspans[index] = rowspans[top:top + table.getheight()]
+            top += table.getheight()
+        del rowspans
+    else:
+        cells = sum(table.run_count() for table, _ in encoded)
+
+    with stats.stage("render"):
+        write_html(_table_start(no_css, table_id, minify, pixels.getsize()[0] if pixels.getsize()[1] > 0 else 0, pixel_size))
+        jobs = (
+            (table, palette, no_css, pixel_size, rowspans, minify) for (table, _), rowspans in zip(encoded, band_rowspans)
+        )
+        for html in executor.map(_render_band, jobs):
+            write_html(html)
+        write_html('</table>' if minify else '</table>\n')
+
+        if not no_css:
+            write_css("".join(_render_css(palette, table_id, pixel_size, minify)))
+    stats.record("cells", cells)
+    return cells
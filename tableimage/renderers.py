@@ -0,0 +1,267 @@
+"""
+Output formats other than tables, which browsers can lay out and paint much faster for large images.
+
+Every format is a Renderer, fed by the same rowlists/run tables and palettes as write_html_css, and registered in renderers by the
+name used with --format:
+
+    renderers.renderers["svg"](pixel_size=2).write(table, html_file, css_file)
+"""
+from . import data, stats, write_html_css, random_table_id, _sink_writer, _counting_writer, _iter_columns, _rowspans, \
+    _iter_rows, _to_palette, _html_colour
+from ._typing import *
+import abc
+import base64
+import itertools
+import json
+
+
+def _size(rowlist: data.RowList) -> Tuple[int, int]:
+    """
+    Get the (width, height) of the image a rowlist (or data.RunTable) holds.
+    """
+    if isinstance(rowlist, data.RunTable):
+        return rowlist.getwidth(), rowlist.getheight()
+    width = sum(count for count, _ in next(_iter_rows(rowlist), []))
+    return width, sum(1 for item in rowlist if isinstance(item, data.RowDivider))
+
+
+def _rgb(colour: Union[data.RGB, int]) -> data.RGB:
+    """
+    Get a colour from _iter_columns as an (R, G, B) tuple.
+    """
+    return data.unpack_rgb(colour) if isinstance(colour, int) else colour
+
+
+class Renderer(abc.ABC):
+    """
+    Turns the runs of an image into html, and css for the formats which use it. pixel_size is how many html pixels each image
+    pixel takes up. no_css puts the colours straight into the html. merge_rows merges runs on consecutive rows into one element
+    where the format can. minify makes the output as small as possible, where the format supports it.
+    """
+    name = None
+    # Whether merge_rows makes any difference.
+    merges_rows = True
+
+    def __init__(self, no_css: bool=False, pixel_size: int=3, merge_rows: bool=False, minify: bool=False):
+        self.no_css = no_css
+        self.pixel_size = pixel_size
+        self.merge_rows = merge_rows
+        self.minify = minify
+
+    @abc.abstractmethod
+    def write(self, rowlist: data.RowList, html_sink: Any, css_sink: Any, element_id: Optional[str]=None,
+            palette: Optional[Dict[data.RGB, str]]=None) -> int:
+        """
+        Write the image in rowlist (or a data.RunTable) to html_sink and css_sink, like write_html_css. element_id is the id
+        given to the outermost element (random if None), and palette is the css class names to use, if already known.
+
+        Returns the number of elements written.
+        """
+
+    def _writers(self, html_sink: Any, css_sink: Any) -> Tuple[Callable[[str], Any], Callable[[str], Any]]:
+        """
+        Get writers for the sinks, counting the bytes written if stats are being collected.
+        """
+        write_html = _sink_writer(html_sink)
+        write_css = _sink_writer(css_sink)
+        collector = stats.active()
+        if collector is not None:
+            write_html = _counting_writer(write_html, collector, "html_bytes")
+            write_css = _counting_writer(write_css, collector, "css_bytes")
+        return write_html, write_css
+
+    def _palette(self, rowlist: data.RowList, palette: Optional[Dict[data.RGB, str]]) -> Optional[Dict[data.RGB, str]]:
+        """
+        Get the palette for rowlist when using css, building it if it is not known yet.
+        """
+        if self.no_css:
+            return None
+        if palette is None:
+            with stats.stage("palette"):
+                palette = _to_palette(rowlist)
+        stats.record("colours", len(palette))
+        return palette
+
+    def _cells(self, rowlist: data.RowList) -> Iterator[Tuple[int, int, int, Union[data.RGB, int], int]]:
+        """
+        Iterate over the elements to draw, as (x, y, count, colour, rows), where rows is how many rows it covers (always 1
+        without merge_rows).
+        """
+        rowspans = _rowspans(_iter_rows(rowlist)) if self.merge_rows else itertools.repeat(None)
+        for y, ((counts, colours), row_spans) in enumerate(zip(_iter_columns(rowlist), rowspans)):
+            x = 0
+            for count, colour, span in zip(counts, colours, row_spans if row_spans is not None else itertools.repeat(1)):
+                if span > 0:
+                    yield x, y, count, colour, span
+                x += count
+
+
+class TableRenderer(Renderer):
+    """
+    The original <table> output, see write_html_css. table_class makes the tables use a shared stylesheet.
+    """
+    name = "table"
+
+    def __init__(self, no_css: bool=False, pixel_size: int=3, merge_rows: bool=False, minify: bool=False,
+            table_class: Optional[str]=None):
+        super().__init__(no_css, pixel_size, merge_rows, minify)
+        self.table_class = table_class
+
+    def write(self, rowlist: data.RowList, html_sink: Any, css_sink: Any, element_id: Optional[str]=None,
+            palette: Optional[Dict[data.RGB, str]]=None) -> int:
+        return write_html_css(
+            rowlist, html_sink, css_sink, self.no_css, self.pixel_size, element_id, self.merge_rows, palette, self.minify,
+            self.table_class
+        )
+
+
+class CanvasRenderer(Renderer):
+    """
+    A <canvas> painted by a small inline script from a run-length payload. The runs are encoded as pairs of LEB128 varints
+    (length, index of the colour) in base64, which is decoded and drawn with one fillRect per run. Colours are numbered in the
+    order they are first seen, so the payload is streamed out as the rows are read, and the colours are written after it.
+
+    Needs javascript, never uses css (so no_css makes no difference) and does not merge rows.
+    """
+    name = "canvas"
+    merges_rows = False
+
+    _script_end = (
+        'var e=document.getElementById(i),g=e.getContext("2d"),x=0,y=0,k=0;e.width=w*p;e.height=h*p;'
+        'function v(){var n=0,s=0,b;do{b=d.charCodeAt(k++);n+=(b&127)*Math.pow(2,s);s+=7}while(b&128);return n}'
+        'while(k<d.length){var n=v();g.fillStyle=c[v()];g.fillRect(x*p,y*p,n*p,p);x+=n;if(x>=w){x=0;y++}}'
+        '})();</script>\n'
+    )
+
+    @staticmethod
+    def _varint(value: int, out: bytearray):
+        while value > 0x7f:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    def write(self, rowlist: data.RowList, html_sink: Any, css_sink: Any, element_id: Optional[str]=None,
+            palette: Optional[Dict[data.RGB, str]]=None) -> int:
+        write_html, _ = self._writers(html_sink, css_sink)
+        element_id = element_id if element_id is not None else random_table_id()
+        width, height = _size(rowlist)
+        indices = {}
+        with stats.stage("render"):
+            write_html('<canvas id="{}" style="image-rendering:pixelated;"></canvas>\n'.format(element_id))
+            write_html('<script>(function(){var d=atob("')
+            payload = bytearray()
+            for counts, colours in _iter_columns(rowlist):
+                for count, colour in zip(counts, colours):
+                    index = indices.get(colour)
+                    if index is None:
+                        index = indices[colour] = len(indices)
+                    self._varint(count, payload)
+                    self._varint(index, payload)
+                # base64 can only be joined up in blocks of 3 bytes.
+                if len(payload) >= 48*1024:
+                    cut = len(payload) - len(payload) % 3
+                    write_html(base64.b64encode(payload[:cut]).decode("ascii"))
+                    del payload[:cut]
+            write_html(base64.b64encode(payload).decode("ascii"))
+            hex_colours = [_html_colour(colour, True) for colour in indices]
+            write_html('"),c={},w={!s},h={!s},p={!s},i="{}";'.format(
+                json.dumps(hex_colours, separators=(",", ":")), width, height, self.pixel_size, element_id
+            ))
+            write_html(self._script_end)
+        stats.record("colours", len(indices))
+        stats.record("elements", 2)
+        return 2
+
+
+class GridRenderer(Renderer):
+    """
+    A css grid with one column and row per pixel, and one element per run spanning its columns (and with merge_rows, rows).
+    Unlike a table, the browser does not have to work out the column widths from the cells.
+    """
+    name = "grid"
+
+    def write(self, rowlist: data.RowList, html_sink: Any, css_sink: Any, element_id: Optional[str]=None,
+            palette: Optional[Dict[data.RGB, str]]=None) -> int:
+        write_html, write_css = self._writers(html_sink, css_sink)
+        palette = self._palette(rowlist, palette)
+        element_id = element_id if element_id is not None else random_table_id()
+        width, height = _size(rowlist)
+        grid = 'display:grid;grid-template-columns:repeat({!s},{!s}px);grid-auto-rows:{!s}px;'.format(
+            max(1, width), self.pixel_size, self.pixel_size
+        )
+        elements = 0
+        hex_colours = {}
+        with stats.stage("render"):
+            if self.no_css:
+                write_html('<div style="{}">\n'.format(grid))
+            else:
+                write_html('<div id="{}">\n'.format(element_id))
+            for x, y, count, colour, rows in self._cells(rowlist):
+                style = ''
+                if count > 1:
+                    style += 'grid-column:span {!s};'.format(count)
+                if rows > 1:
+                    style += 'grid-row:span {!s};'.format(rows)
+                if self.no_css:
+                    hex_colour = hex_colours.get(colour)
+                    if hex_colour is None:
+                        hex_colour = hex_colours[colour] = _html_colour(colour)
+                    write_html('<i style="background:{};{}"></i>\n'.format(hex_colour, style))
+                elif style:
+                    write_html('<i class="{}" style="{}"></i>\n'.format(palette[_rgb(colour)], style))
+                else:
+                    write_html('<i class="{}"></i>\n'.format(palette[_rgb(colour)]))
+                elements += 1
+            write_html('</div>\n')
+            if not self.no_css:
+                write_css('div#{}{{{}}}\n'.format(element_id, grid))
+                write_css("".join(
+                    'div#{}>i.{}{{background:{};}}\n'.format(element_id, cssclass, _html_colour(colour))
+                    for colour, cssclass in palette.items()
+                ))
+        stats.record("elements", elements)
+        return elements
+
+
+class SVGRenderer(Renderer):
+    """
+    An inline <svg> with one <rect> per run (or with merge_rows, per block of identical runs on consecutive rows).
+    """
+    name = "svg"
+
+    def write(self, rowlist: data.RowList, html_sink: Any, css_sink: Any, element_id: Optional[str]=None,
+            palette: Optional[Dict[data.RGB, str]]=None) -> int:
+        write_html, write_css = self._writers(html_sink, css_sink)
+        palette = self._palette(rowlist, palette)
+        element_id = element_id if element_id is not None else random_table_id()
+        width, height = _size(rowlist)
+        size = self.pixel_size
+        elements = 0
+        hex_colours = {}
+        with stats.stage("render"):
+            write_html('<svg xmlns="http://www.w3.org/2000/svg" id="{}" width="{!s}" height="{!s}" shape-rendering="crispEdges">\n'
+                    .format(element_id, width*size, height*size))
+            for x, y, count, colour, rows in self._cells(rowlist):
+                if self.no_css:
+                    hex_colour = hex_colours.get(colour)
+                    if hex_colour is None:
+                        hex_colour = hex_colours[colour] = _html_colour(colour)
+                    paint = 'fill="{}"'.format(hex_colour)
+                else:
+                    paint = 'class="{}"'.format(palette[_rgb(colour)])
+                write_html('<rect x="{!s}" y="{!s}" width="{!s}" height="{!s}" {}/>\n'.format(
+                    x*size, y*size, count*size, rows*size, paint
+                ))
+                elements += 1
+            write_html('</svg>\n')
+            if not self.no_css:
+                write_css("".join(
+                    'svg#{} rect.{}{{fill:{};}}\n'.format(element_id, cssclass, _html_colour(colour))
+                    for colour, cssclass in palette.items()
+                ))
+        stats.record("elements", elements)
+        return elements
+
+
+# Renderers by name.
+renderers = {renderer.name: renderer for renderer in (TableRenderer, CanvasRenderer, GridRenderer, SVGRenderer)}
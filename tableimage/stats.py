@@ -0,0 +1,134 @@
+"""
+Lightweight instrumentation of the conversion pipeline.
+
+The library times its stages (decoding, alpha flattening, run extraction, palette building, rendering, ...) and records counters
+(pixels, runs, colours, output bytes, ...) into whatever Stats collector is active. When none is active, every hook is a single
+context variable lookup, so leaving the hooks in costs next to nothing.
+
+    with stats.collecting("image.png") as collected:
+        write_html_css(data.PixelAccessPillow(image).getruntable(), html, css)
+    print(collected.format())
+"""
+from ._typing import *
+import contextlib
+import contextvars
+import json
+import time
+
+_active = contextvars.ContextVar("tableimage_stats", default=None)
+
+_null_stage = contextlib.nullcontext()
+
+
+class Stats(object):
+    """
+    Collected timings and counters for one conversion.
+
+    stages maps the name of each stage to its wall-clock and CPU time in seconds (summed, if the stage ran more than once).
+    counters maps names to values, such as the number of pixels or runs.
+    """
+    def __init__(self, name: str=""):
+        self.name = name
+        self.stages = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        Context manager timing the code inside it as stage name.
+        """
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            timing = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            timing["wall"] += time.perf_counter() - wall
+            timing["cpu"] += time.process_time() - cpu
+
+    def record(self, name: str, value: Any):
+        """
+        Set counter name to value.
+        """
+        self.counters[name] = value
+
+    def add(self, name: str, value: int):
+        """
+        Add value to counter name.
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def todict(self) -> Dict[str, Any]:
+        return {"name": self.name, "stages": self.stages, "counters": self.counters}
+
+    def tojson(self) -> str:
+        """
+        Format the stats as a single line of JSON.
+        """
+        return json.dumps(self.todict(), sort_keys=True)
+
+    def format(self) -> str:
+        """
+        Format the stats as human readable text.
+        """
+        lines = ["{}:".format(self.name or "<image>")]
+        for name, value in self.counters.items():
+            lines.append("  {}: {}".format(name, value))
+        for name, timing in self.stages.items():
+            lines.append("  {}: {:.4f}s wall, {:.4f}s cpu".format(name, timing["wall"], timing["cpu"]))
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def collecting(name: str="", callback: Optional[Callable[[Stats], Any]]=None) -> Iterator[Stats]:
+    """
+    Context manager making a new Stats collector active for the code inside it. If callback is given, it is called with the
+    collected Stats at the end.
+    """
+    collected = Stats(name)
+    token = _active.set(collected)
+    try:
+        yield collected
+    finally:
+        _active.reset(token)
+    if callback is not None:
+        callback(collected)
+
+
+@contextlib.contextmanager
+def paused() -> Iterator[None]:
+    """
+    Context manager turning collection off for the code inside it, such as when building the pieces of an image which has 
+    already counted its pixels itself.
+    """
+    token = _active.set(None)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def active() -> Optional[Stats]:
+    """
+    Get the active Stats collector, or None if nothing is being collected.
+    """
+    return _active.get()
+
+
+def stage(name: str):
+    """
+    Context manager timing the code inside it as stage name of the active collector, if there is one.
+    """
+    collector = _active.get()
+    if collector is None:
+        return _null_stage
+    return collector.stage(name)
+
+
+def record(name: str, value: Any):
+    """
+    Set counter name of the active collector, if there is one.
+    """
+    collector = _active.get()
+    if collector is not None:
+        collector.record(name, value)
@@ -0,0 +1,107 @@
+"""
+Tests for delta frames, which only have the runs that changed since the frame before.
+"""
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from tableimage import animation, data
+
+
+def _table(rows):
+    table = data.RunTable()
+    for row in rows:
+        table.append_row(row)
+    return table
+
+
+def _pixels(rows):
+    return [[colour for count, colour in row for _ in range(count)] for row in rows]
+
+
+def _image(pixels):
+    image = Image.new("RGB", (len(pixels[0]), len(pixels)))
+    image.putdata([colour for row in pixels for colour in row])
+    return image
+
+
+def test_unchanged_frame_is_none():
+    table = _table([[(2, (1, 2, 3)), (1, (4, 5, 6))], [(3, (7, 8, 9))]])
+    assert animation._delta_rows(table, _table(table.iterrows())) is None
+
+
+def test_unchanged_runs_are_gaps():
+    previous = _table([
+        [(3, (0, 0, 0))],
+        [(1, (1, 1, 1)), (1, (2, 2, 2)), (1, (3, 3, 3))],
+        [(3, (0, 0, 0))],
+        [(3, (0, 0, 0))],
+    ])
+    table = _table([
+        [(3, (0, 0, 0))],
+        [(1, (1, 1, 1)), (1, (9, 9, 9)), (1, (3, 3, 3))],
+        [(1, (0, 0, 0)), (2, (5, 5, 5))],
+        [(3, (0, 0, 0))],
+    ])
+    assert animation._delta_rows(previous, table) == [
+        # An unchanged row is one gap.
+        [(3, None)],
+        [(1, None), (1, (9, 9, 9)), (1, None)],
+        # A run which starts in the same place with the same colour but is shorter has changed.
+        [(1, (0, 0, 0)), (2, (5, 5, 5))],
+        # The unchanged row at the bottom is left out.
+    ]
+
+
+def test_gaps_next_to_each_other_are_joined():
+    previous = _table([[(1, (1, 1, 1)), (1, (2, 2, 2)), (2, (3, 3, 3))]])
+    table = _table([[(1, (1, 1, 1)), (1, (2, 2, 2)), (1, (3, 3, 3)), (1, (4, 4, 4))]])
+    assert animation._delta_rows(previous, table) == [[(2, None), (1, (3, 3, 3)), (1, (4, 4, 4))]]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_delta_on_top_of_previous_is_the_frame(seed):
+    rng = random.Random(seed)
+    width, height = rng.randrange(1, 9), rng.randrange(1, 7)
+    colours = [(rng.randrange(256), 0, 0) for _ in range(3)]
+    first = [[rng.choice(colours) for _ in range(width)] for _ in range(height)]
+    second = [row[:] for row in first]
+    for _ in range(rng.randrange(1, 4)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        w, h = rng.randrange(1, width - x + 1), rng.randrange(1, height - y + 1)
+        colour = rng.choice(colours)
+        for row in second[y:y + h]:
+            row[x:x + w] = [colour] * w
+    previous, table = (data.PixelAccessPillow(_image(pixels)).getruntable() for pixels in (first, second))
+    rows = animation._delta_rows(previous, table)
+    if rows is None:
+        assert first == second
+        return
+    assert all(sum(count for count, _ in row) == width for row in rows)
+    # No two gaps next to each other, and the last row has something in it.
+    assert not any(a[1] is None and b[1] is None for row in rows for a, b in zip(row, row[1:]))
+    assert any(colour is not None for _, colour in rows[-1])
+    # Painting the delta over the frame before gives the frame.
+    painted = [row[:] for row in first]
+    for y, pixels in enumerate(_pixels(rows)):
+        for x, colour in enumerate(pixels):
+            if colour is not None:
+                painted[y][x] = colour
+    assert painted == second
+
+
+@pytest.mark.parametrize("no_css", [False, True])
+def test_gaps_are_rendered_transparent(no_css):
+    previous = _table([[(1, (255, 0, 0)), (1, (0, 255, 0))], [(2, (255, 0, 0))]])
+    table = _table([[(1, (255, 0, 0)), (1, (0, 0, 255))], [(2, (255, 0, 0))]])
+    html, css = io.StringIO(), io.StringIO()
+    animation.write_html_css_frames([previous, table], [100, 100], html, css, no_css, table_id="anim", delta=True)
+    delta = html.getvalue().split("<table")[2]
+    if no_css:
+        assert 'background:transparent' in delta
+    else:
+        assert 'class="_"' in delta
+        # The gap class has no rule, so nothing is painted.
+        assert "td._ " not in css.getvalue()
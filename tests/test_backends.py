@@ -0,0 +1,108 @@
+"""
+Tests that the pixel access backends which do not need Pillow give the same runs and pixels as PixelAccessPillow.
+"""
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from tableimage import data
+
+
+_WIDTH, _HEIGHT = 13, 9
+
+_MATCHING = [(0, "channel"), (20, "channel"), (10, "cie76")]
+
+
+def _noisy(mode, seed=0):
+    """
+    An image with a few colours in blocks and some noise, so it has both long and short runs.
+    """
+    rng = random.Random(seed)
+    channels = len(mode)
+    colours = [tuple(rng.randrange(256) for _ in range(channels)) for _ in range(4)]
+    pixels = []
+    for y in range(_HEIGHT):
+        for x in range(_WIDTH):
+            if rng.random() < 0.2:
+                pixels.append(tuple(rng.randrange(256) for _ in range(channels)))
+            else:
+                pixels.append(colours[(x // 4 + y // 3) % len(colours)])
+    image = Image.new(mode, (_WIDTH, _HEIGHT))
+    image.putdata([pixel[0] for pixel in pixels] if channels == 1 else pixels)
+    return image
+
+
+def _check(pixels, image, background=(255, 255, 255)):
+    """
+    Check pixels gives the same pixels and runs as PixelAccessPillow does for image.
+    """
+    expected = data.PixelAccessPillow(image, background)
+    assert pixels.getsize() == expected.getsize()
+    for y in range(_HEIGHT):
+        for x in range(_WIDTH):
+            assert pixels.getpixel(x, y) == expected.getpixel(x, y)
+    for tolerance, metric in _MATCHING:
+        table = expected.getruntable(tolerance, metric)
+        assert pixels.getruntable(tolerance, metric).tolist() == table.tolist()
+        assert list(pixels.itercontiguousrows(tolerance, metric)) == list(table.iterrows())
+        assert pixels.getcontiguousrows(tolerance, metric) == table.tolist()
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "no-numpy"])
+def numpy(request, monkeypatch):
+    """
+    Run the test with and without NumPy.
+    """
+    if not request.param:
+        monkeypatch.setattr(data, "_has_numpy", False)
+    return request.param
+
+
+def test_ppm(numpy):
+    image = _noisy("RGB")
+    ppm = io.BytesIO()
+    image.save(ppm, "PPM")
+    # Strips of 2 rows, so there are several.
+    _check(data.PixelAccessNetpbm(io.BytesIO(ppm.getvalue()), strip_pixels=2 * _WIDTH), image)
+
+
+def test_16_bit_pgm(numpy):
+    image = _noisy("L")
+    # Each sample v is v * 257 in 16 bits, which scales back to exactly v.
+    samples = b"".join((value * 257).to_bytes(2, "big") for value in image.tobytes())
+    pgm = b"P5\n# 16-bit\n%d %d\n65535\n" % (_WIDTH, _HEIGHT) + samples
+    _check(data.PixelAccessNetpbm(io.BytesIO(pgm), strip_pixels=2 * _WIDTH), image)
+
+
+def test_pam_with_alpha(numpy):
+    image = _noisy("RGBA")
+    header = b"P7\nWIDTH %d\nHEIGHT %d\nDEPTH 4\nMAXVAL 255\nTUPLTYPE RGB_ALPHA\nENDHDR\n" % (_WIDTH, _HEIGHT)
+    pixels = data.PixelAccessNetpbm(io.BytesIO(header + image.tobytes()), background=(10, 200, 30), strip_pixels=2 * _WIDTH)
+    _check(pixels, image, (10, 200, 30))
+
+
+def test_bgrx_buffer_with_stride_and_offset(numpy):
+    image = _noisy("RGB")
+    rgb = image.tobytes()
+    offset, stride = 5, _WIDTH * 4 + 3
+    buffer = bytearray(b"\xaa" * offset)
+    for y in range(_HEIGHT):
+        for x in range(_WIDTH):
+            r, g, b = rgb[(y * _WIDTH + x) * 3:(y * _WIDTH + x) * 3 + 3]
+            buffer += bytes((b, g, r, 0x55))
+        buffer += b"\xcc" * (stride - _WIDTH * 4)
+    _check(data.PixelAccessBuffer(buffer, _WIDTH, _HEIGHT, "BGRX", stride, offset, strip_pixels=2 * _WIDTH), image)
+
+
+@pytest.mark.parametrize("mode", ["L", "LA", "RGB", "RGBA"])
+def test_array(numpy, mode):
+    image = _noisy(mode)
+    if numpy:
+        np = pytest.importorskip("numpy")
+        pixels = data.PixelAccessArray(np.asarray(image), strip_pixels=2 * _WIDTH)
+    else:
+        # PixelAccessArray needs NumPy, PixelAccessBuffer is how the same pixels are read without it.
+        pixels = data.PixelAccessBuffer(image.tobytes(), _WIDTH, _HEIGHT, mode)
+    _check(pixels, image)
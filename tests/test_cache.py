@@ -0,0 +1,65 @@
+"""
+Tests for the on-disk conversion cache.
+"""
+import os
+
+from PIL import Image
+
+from tableimage import cache, data
+
+
+def _table(width, seed):
+    table = data.RunTable()
+    for y in range(4):
+        table.append_row([(width, ((seed * 7 + y) % 256, seed % 256, y))])
+    return table
+
+
+def _cache_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+    )
+
+
+def test_evict_only_walks_when_too_big(tmp_path, monkeypatch):
+    conversion_cache = cache.ConversionCache(str(tmp_path), max_size=1 << 20)
+    walks = []
+    real_walk = os.walk
+    monkeypatch.setattr(os, "walk", lambda *args, **kwargs: walks.append(args) or real_walk(*args, **kwargs))
+    for seed in range(50):
+        conversion_cache.put_runs("{:064x}".format(seed), _table(10, seed), {})
+    assert len(walks) == 1
+
+
+def test_evict_keeps_under_max_size(tmp_path):
+    conversion_cache = cache.ConversionCache(str(tmp_path), max_size=2000)
+    for seed in range(50):
+        conversion_cache.put_runs("{:064x}".format(seed), _table(10, seed), {})
+    assert _cache_size(str(tmp_path)) <= 2000
+    assert conversion_cache.get_runs("{:064x}".format(49)) is not None
+
+
+def test_broken_runs_entry_is_a_miss(tmp_path):
+    conversion_cache = cache.ConversionCache(str(tmp_path))
+    key = "{:064x}".format(1)
+    conversion_cache.put_runs(key, _table(10, 1), {(1, 0, 0): "a"})
+    path = conversion_cache._path(key, ".runs")
+    with open(path, "rb") as f:
+        stored = f.read()
+    for cut in (0, 10, len(stored) - 5):
+        with open(path, "wb") as f:
+            f.write(stored[:cut])
+        assert conversion_cache.get_runs(key) is None
+        assert not os.path.exists(path)
+
+
+def test_image_key_hashes_in_strips(monkeypatch):
+    image = Image.new("RGB", (300, 200))
+    image.putdata([(x % 256, y % 256, (x * y) % 256) for y in range(200) for x in range(300)])
+    whole = cache.image_key(image, {"a": 1})
+    monkeypatch.setattr(cache, "_hash_strip_pixels", 7 * 300)  # 7 rows, which does not divide 200.
+    assert cache.image_key(image, {"a": 1}) == whole
+    monkeypatch.setattr(cache, "_hash_strip_pixels", 1)
+    assert cache.image_key(image, {"a": 1}) == whole
+    image.putpixel((299, 199), (1, 2, 3))
+    assert cache.image_key(image, {"a": 1}) != whole
@@ -0,0 +1,91 @@
+"""
+Tests for the command line (python -m tableimage), run in a subprocess.
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+from PIL import Image, features
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(*args, cwd):
+    return subprocess.run(
+        [sys.executable, "-m", "tableimage", *args], cwd=cwd, capture_output=True, text=True,
+        env=dict(os.environ, PYTHONPATH=_root)
+    )
+
+
+def test_missing_image_keeps_output(tmp_path):
+    Image.new("RGB", (4, 4), (255, 0, 0)).save(tmp_path / "a.png")
+    (tmp_path / "out.html").write_text("keep")
+    result = _run("a.png", "missing.png", "--combined", "out.html", "--no-cache", cwd=tmp_path)
+    assert result.returncode == 2
+    assert "can't open 'missing.png'" in result.stderr
+    assert "Traceback" not in result.stderr
+    assert (tmp_path / "out.html").read_text() == "keep"
+
+
+def test_same_image_twice_gets_two_ids(tmp_path):
+    Image.new("RGB", (4, 4), (255, 0, 0)).save(tmp_path / "a.png")
+    for jobs in ("1", "2"):
+        result = _run(
+            "a.png", "a.png", "--combined", "out.html", "--cache-dir", str(tmp_path / "cache"), "--jobs", jobs, cwd=tmp_path
+        )
+        assert result.returncode == 0, result.stderr
+        ids = re.findall(r'<table[^>]* id="([^"]+)"', (tmp_path / "out.html").read_text())
+        assert len(ids) == 2 and ids[0] != ids[1]
+
+
+def test_missing_libimagequant_is_an_argument_error(tmp_path):
+    if features.check("libimagequant"):
+        pytest.skip("Pillow was built with libimagequant")
+    Image.new("RGB", (4, 4), (255, 0, 0)).save(tmp_path / "a.png")
+    (tmp_path / "out.html").write_text("keep")
+    result = _run("a.png", "--colours", "8", "--quantize-method", "libimagequant", "--combined", "out.html", cwd=tmp_path)
+    assert result.returncode == 2
+    assert "libimagequant" in result.stderr and "Traceback" not in result.stderr
+    assert (tmp_path / "out.html").read_text() == "keep"
+
+
+def test_stats_with_jobs_are_json_lines_in_order(tmp_path):
+    names = []
+    for number in range(5):
+        name = "{}.png".format(number)
+        Image.new("RGB", (30, 20 + number), (number * 40, 0, 0)).save(tmp_path / name)
+        names.append(name)
+    result = _run(*names, "--combined", "out.html", "--no-cache", "--jobs", "2", "--stats", "json", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    records = [json.loads(line) for line in result.stderr.splitlines()]
+    assert [record["name"] for record in records] == names
+    assert [record["counters"]["pixels"] for record in records] == [30 * (20 + number) for number in range(5)]
+
+
+def test_merge_rows_reports_with_jobs_are_in_order(tmp_path):
+    names = []
+    for number in range(5):
+        name = "{}.png".format(number)
+        Image.new("RGB", (30, 20 + number), (number * 40, 0, 0)).save(tmp_path / name)
+        names.append(name)
+    result = _run(*names, "--combined", "out.html", "--no-cache", "--jobs", "2", "--merge-rows", cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert [line.split(" (")[0] for line in result.stderr.splitlines()] == [
+        "{}: 1 cells instead of {!s}".format(name, 20 + number) for number, name in enumerate(names)
+    ]
+
+
+def test_batch_failures_name_the_error_not_the_file_object(tmp_path):
+    (tmp_path / "in").mkdir()
+    Image.new("RGB", (4, 4), (255, 0, 0)).save(tmp_path / "in" / "a.png")
+    (tmp_path / "in" / "bad.png").write_bytes(b"not an image")
+    result = _run("--input-dir", "in", "--output-dir", "out", "--summary", "summary.json", "--no-cache", cwd=tmp_path)
+    assert result.returncode == 1
+    bad = os.path.join("in", "bad.png")
+    assert "failed: {}: UnidentifiedImageError: cannot identify image file\n".format(bad) in result.stderr + "\n"
+    assert "<_io" not in result.stderr
+    summary = json.loads((tmp_path / "summary.json").read_text())
+    assert summary["failed"] == {bad: "UnidentifiedImageError: cannot identify image file"}
@@ -0,0 +1,82 @@
+"""
+Tests that CompressedSink output decompresses back to what was written.
+"""
+import gzip
+import io
+
+import pytest
+
+from tableimage import compress, rowlist_to_html_css, write_html_css, data
+
+
+def _decompress(method, compressed):
+    if method == "gzip":
+        return gzip.decompress(compressed)
+    if method == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(compressed)
+    import brotli
+    return brotli.decompress(compressed)
+
+
+def _table():
+    rowlist = []
+    for y in range(40):
+        for x in range(0, 60, 3):
+            rowlist.append((3, ((x * 7 + y) % 256, (y * 13) % 256, 128)))
+        rowlist.append(data.RowDivider())
+    return rowlist
+
+
+@pytest.fixture(params=sorted(compress.methods))
+def method(request):
+    if not compress.methods[request.param][2]:
+        pytest.skip("{} is not installed".format(request.param))
+    return request.param
+
+
+@pytest.mark.parametrize("threaded", [True, False])
+def test_round_trip(method, threaded):
+    html, css = rowlist_to_html_css(_table(), table_id="tbl")
+    compressed_html, compressed_css = io.BytesIO(), io.BytesIO()
+    # Small chunks, so there are many of them for the thread to get through.
+    with compress.CompressedSink(compressed_html, method, threaded=threaded, chunk_size=1000, max_chunks=2) as html_sink, \
+            compress.CompressedSink(compressed_css, method, threaded=threaded, chunk_size=1000, max_chunks=2) as css_sink:
+        write_html_css(_table(), html_sink, css_sink, table_id="tbl")
+    assert _decompress(method, compressed_html.getvalue()).decode("utf-8") == html
+    assert _decompress(method, compressed_css.getvalue()).decode("utf-8") == css
+    assert html_sink.stats.counters["input_bytes"] == len(html)
+    assert html_sink.stats.counters["output_bytes"] == len(compressed_html.getvalue())
+
+
+def test_empty(method):
+    compressed = io.BytesIO()
+    with compress.CompressedSink(compressed, method):
+        pass
+    assert _decompress(method, compressed.getvalue()) == b""
+
+
+class _FailingFile(object):
+    """
+    A binary file which fails after a few writes, like a full disk.
+    """
+    def __init__(self, writes):
+        self.writes = writes
+
+    def write(self, data):
+        if self.writes == 0:
+            raise OSError("no space left")
+        self.writes -= 1
+        return len(data)
+
+
+@pytest.mark.parametrize("threaded", [True, False])
+def test_write_error_is_raised(threaded):
+    # A compression level of 0 stores the data, so every chunk is written out.
+    sink = compress.CompressedSink(_FailingFile(2), "gzip", 0, threaded=threaded, chunk_size=100, max_chunks=1)
+    with pytest.raises(OSError, match="no space left"):
+        with sink:
+            for _ in range(1000):
+                sink.write("x" * 50)
+    # The thread stopped compressing but finished, so closing again does nothing.
+    sink.close()
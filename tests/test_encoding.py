@@ -0,0 +1,62 @@
+"""
+Tests that _encoding gives optimal, prefix-free Huffman codes for alphabets of any size.
+"""
+import heapq
+import random
+import string
+
+import pytest
+
+from tableimage import _encoding
+
+
+def _reference_cost(weights, k):
+    """
+    The weighted code length of an optimal k-ary code, from the textbook Huffman algorithm padded with zero-weight dummies.
+    """
+    heap = list(weights) + [0] * ((k - 1 - (len(weights) - 1) % (k - 1)) % (k - 1))
+    heapq.heapify(heap)
+    cost = 0
+    while len(heap) > 1:
+        merged = sum(heapq.heappop(heap) for _ in range(k))
+        cost += merged
+        heapq.heappush(heap, merged)
+    return cost
+
+
+def _check_prefix_free(codes, alphabet):
+    words = sorted(codes.values())
+    assert len(set(words)) == len(words)
+    assert all(word and set(word) <= set(alphabet) for word in words)
+    for word, following in zip(words, words[1:]):  # Sorted, so a prefix comes straight before a word starting with it.
+        assert not following.startswith(word)
+
+
+@pytest.mark.parametrize("alphabet", ["01", "abc", string.ascii_letters])
+@pytest.mark.parametrize("seed", range(25))
+def test_optimal_and_prefix_free(alphabet, seed):
+    rng = random.Random(seed)
+    count = {item: rng.choice([1, rng.randrange(1, 100), rng.randrange(1, 10000)]) for item in range(rng.randrange(2, 300))}
+    codes = _encoding(count, alphabet)
+    assert codes.keys() == count.keys()
+    _check_prefix_free(codes, alphabet)
+    assert sum(count[item] * len(code) for item, code in codes.items()) == _reference_cost(count.values(), len(alphabet))
+
+
+@pytest.mark.parametrize("alphabet", ["01", "abc", string.ascii_letters])
+def test_single_colour(alphabet):
+    assert _encoding({"only": 5}, alphabet) == {"only": alphabet[0]}
+    assert _encoding({}, alphabet) == {}
+
+
+@pytest.mark.parametrize("alphabet", ["01", "abc", string.ascii_letters])
+def test_no_more_items_than_letters(alphabet):
+    for n in range(2, len(alphabet) + 1):
+        codes = _encoding({item: item + 1 for item in range(n)}, alphabet)
+        assert all(len(code) == 1 for code in codes.values())
+        _check_prefix_free(codes, alphabet)
+
+
+def test_alphabet_needs_two_letters():
+    with pytest.raises(ValueError):
+        _encoding({"a": 1, "b": 2}, "aa")
@@ -0,0 +1,47 @@
+"""
+Tests that flatten_alpha gives exactly what pure_pil_alpha_to_background_colour_img did, whatever the mode and tile size.
+"""
+import random
+
+import pytest
+from PIL import Image
+
+from tableimage.imagemanipulation import flatten_alpha, pure_pil_alpha_to_background_colour_img
+
+
+def _random_image(mode, size, seed):
+    rng = random.Random(seed)
+    width, height = size
+    if mode == "RGBA":
+        return Image.frombytes(mode, size, bytes(rng.randrange(256) for _ in range(width * height * 4)))
+    if mode == "LA":
+        return Image.frombytes(mode, size, bytes(rng.randrange(256) for _ in range(width * height * 2)))
+    if mode == "PA":
+        image = Image.frombytes(mode, size, bytes(rng.randrange(256) for _ in range(width * height * 2)))
+        image.putpalette(bytes(rng.randrange(256) for _ in range(768)))
+        return image
+    # P with one transparent colour.
+    image = Image.frombytes("P", size, bytes(rng.randrange(16) for _ in range(width * height)))
+    image.putpalette(bytes(rng.randrange(256) for _ in range(48)))
+    image.info["transparency"] = 3
+    return image
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "LA", "PA", "P"])
+@pytest.mark.parametrize("tile_pixels", [1, 37, 100, 1 << 20])
+@pytest.mark.parametrize("colour", [(255, 255, 255), (12, 200, 99)])
+def test_matches_reference(mode, tile_pixels, colour):
+    # 10 wide and 23 high, so tiles of 3 and 10 rows do not divide the height evenly.
+    image = _random_image(mode, (10, 23), seed=sum(map(ord, mode)))
+    expected = pure_pil_alpha_to_background_colour_img(image.convert("RGBA"), colour)
+    flattened = flatten_alpha(image, colour, tile_pixels)
+    assert flattened.mode == "RGB"
+    assert flattened.tobytes() == expected.tobytes()
+
+
+def test_palette_image_bigger_than_a_tile():
+    image = _random_image("P", (64, 50), seed=5)
+    assert image.size[0] * image.size[1] > 1000
+    expected = pure_pil_alpha_to_background_colour_img(image.convert("RGBA"), (0, 0, 0))
+    for tile_pixels in (64, 1000, 64 * 7):
+        assert flatten_alpha(image, (0, 0, 0), tile_pixels).tobytes() == expected.tobytes()
@@ -0,0 +1,100 @@
+"""
+Tests that tables written with merge_rows still cover every pixel exactly once, with the right colour.
+"""
+import html.parser
+import io
+import random
+import re
+
+import pytest
+
+from tableimage import write_html_css, data
+
+
+def _blocky_rowlist(width, height, seed):
+    """
+    A random image made of rectangles of a few colours, so plenty of runs line up on consecutive rows.
+    """
+    rng = random.Random(seed)
+    colours = [(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(4)]
+    pixels = [[colours[0]] * width for _ in range(height)]
+    for _ in range(rng.randrange(1, 12)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        w, h = rng.randrange(1, width - x + 1), rng.randrange(1, height - y + 1)
+        colour = rng.choice(colours)
+        for row in pixels[y:y + h]:
+            row[x:x + w] = [colour] * w
+    rowlist = []
+    for row in pixels:
+        start = 0
+        for x in range(1, width + 1):
+            if x == width or row[x] != row[start]:
+                rowlist.append((x - start, row[start]))
+                start = x
+        rowlist.append(data.RowDivider())
+    return pixels, rowlist
+
+
+def _parse_colour(value):
+    value = value.lstrip("#")
+    if len(value) == 3:
+        value = "".join(digit * 2 for digit in value)
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+class _TableParser(html.parser.HTMLParser):
+    """
+    Collects the cells of each row as (colspan, rowspan, background or class).
+    """
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "tr":
+            self.rows.append([])
+        elif tag == "td":
+            background = re.search(r"background:(#[0-9a-f]+)", attrs.get("style") or "")
+            self.rows[-1].append((
+                int(attrs.get("colspan", 1)), int(attrs.get("rowspan", 1)),
+                _parse_colour(background.group(1)) if background else attrs["class"]
+            ))
+
+    handle_startendtag = handle_starttag
+
+
+def _layout(table_html, css):
+    """
+    Lay the cells out the way browsers do, returning a grid of the colour at each pixel (and checking no pixel is covered 
+    twice).
+    """
+    classes = {name: _parse_colour(colour) for name, colour in re.findall(r"\.(\w+) ?\{background:(#[0-9a-f]+)", css)}
+    parser = _TableParser()
+    parser.feed(table_html)
+    grid = {}
+    for y, row in enumerate(parser.rows):
+        x = 0
+        for colspan, rowspan, colour in row:
+            while (x, y) in grid:  # Skip columns covered by cells from rows above.
+                x += 1
+            for dy in range(rowspan):
+                for dx in range(colspan):
+                    assert (x + dx, y + dy) not in grid, "pixel covered twice"
+                    grid[x + dx, y + dy] = classes.get(colour, colour)
+            x += colspan
+    return grid
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("no_css", [False, True])
+@pytest.mark.parametrize("minify", [False, True])
+def test_merge_rows_covers_every_pixel_once(seed, no_css, minify):
+    width, height = 1 + seed % 7 * 3, 1 + seed * 5 % 11
+    pixels, rowlist = _blocky_rowlist(width, height, seed)
+    html_sink = io.StringIO()
+    css_sink = io.StringIO()
+    cells = write_html_css(rowlist, html_sink, css_sink, no_css=no_css, table_id="t", merge_rows=True, minify=minify)
+    grid = _layout(html_sink.getvalue(), css_sink.getvalue())
+    assert grid == {(x, y): pixels[y][x] for y in range(height) for x in range(width)}
+    assert cells <= sum(1 for run in rowlist if not isinstance(run, data.RowDivider))
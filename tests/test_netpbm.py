@@ -0,0 +1,22 @@
+"""
+Tests for reading PPM/PGM/PAM files with PixelAccessNetpbm.
+"""
+import io
+
+from tableimage import data, stats
+
+
+def _ppm(width, height):
+    pixels = bytes((x * 40 % 256, y * 30 % 256, (x + y) % 256)[c] for y in range(height) for x in range(width) for c in range(3))
+    return b"P6\n%d %d\n255\n" % (width, height) + pixels
+
+
+def test_strips_do_not_count_pixels():
+    with stats.collecting() as collected:
+        # Strips of 3 rows, so there are several.
+        pixels = data.PixelAccessNetpbm(io.BytesIO(_ppm(7, 10)), strip_pixels=21)
+        table = pixels.getruntable()
+        pixels.getpixel(6, 9)
+    assert collected.counters["pixels"] == 70
+    assert collected.counters["runs"] == table.run_count()
+    assert table.getheight() == 10
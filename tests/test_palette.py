@@ -0,0 +1,72 @@
+"""
+Tests for palettes shared by many images.
+"""
+import io
+import json
+
+import pytest
+
+from tableimage import palette, write_html_css, data
+
+
+_FIRST = {(255, 0, 0): 10, (0, 255, 0): 5, (0, 0, 255): 1}
+_SECOND = {(255, 0, 0): 3, (1, 2, 3): 7, (4, 5, 6): 2}
+
+
+def test_extend_keeps_existing_names():
+    shared = palette.SharedPalette.build([_FIRST])
+    before = dict(shared.colours)
+    assert shared.extend([_SECOND]) == 2
+    assert {colour: shared.colours[colour] for colour in before} == before
+    assert set(shared.colours) == set(_FIRST) | set(_SECOND)
+    assert len(set(shared.colours.values())) == len(shared.colours)
+    assert all(palette.is_class_name(name) for name in shared.colours.values())
+    assert shared.extend([_FIRST, _SECOND]) == 0
+
+
+def test_extend_suffixes_clashing_names():
+    shared = palette.SharedPalette.build([_FIRST])
+    # Each extend names its new colours from scratch, so they would get the same names every time without a different suffix.
+    for step in range(5):
+        shared.extend([{(step, step, 100): 1, (step, step, 200): 1}])
+    assert len(shared.colours) == len(_FIRST) + 10
+    assert len(set(shared.colours.values())) == len(shared.colours)
+    assert all(palette.is_class_name(name) for name in shared.colours.values())
+
+
+def test_save_load_round_trip():
+    shared = palette.SharedPalette.build([_FIRST], "thumbs")
+    shared.extend([_SECOND])
+    f = io.StringIO()
+    shared.save(f)
+    f.seek(0)
+    loaded = palette.SharedPalette.load(f)
+    assert loaded.colours == shared.colours
+    assert loaded.class_name == "thumbs"
+    assert loaded.key() == shared.key()
+    assert loaded.css() == shared.css()
+
+
+@pytest.mark.parametrize("stored", [
+    [],
+    {"version": 0, "class": "tableimage", "colours": {}},
+    {"version": 1, "colours": {}},
+    {"version": 1, "class": "tableimage", "colours": {"red": "a"}},
+    {"version": 1, "class": "tableimage", "colours": {"#ff0000": "a b"}},
+    {"version": 1, "class": "1up", "colours": {}},
+])
+def test_load_rejects_broken_palettes(stored):
+    with pytest.raises(ValueError):
+        palette.SharedPalette.load(io.StringIO(json.dumps(stored)))
+
+
+def test_tables_use_shared_stylesheet():
+    rowlist = [(2, (255, 0, 0)), (1, (1, 2, 3)), data.RowDivider()]
+    shared = palette.SharedPalette.build([_FIRST, _SECOND])
+    html, css = io.StringIO(), io.StringIO()
+    write_html_css(rowlist, html, css, table_id="tbl", palette=shared.colours, table_class=shared.class_name)
+    assert css.getvalue() == ""
+    assert 'class="tableimage"' in html.getvalue()
+    for colour in ((255, 0, 0), (1, 2, 3)):
+        assert 'class="{}"'.format(shared.colours[colour]) in html.getvalue()
+        assert "table.tableimage td.{} ".format(shared.colours[colour]) in shared.css()
@@ -0,0 +1,48 @@
+"""
+Tests that converting an image in bands gives exactly the same output as converting it in one go.
+"""
+import concurrent.futures
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from tableimage import data, parallel, write_html_css
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def _noisy_blocks(width, height, seed):
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height))
+    for y in range(height):
+        for x in range(width):
+            base = ((x // 5) * 50 % 256, (y // 4) * 70 % 256, 120)
+            image.putpixel((x, y), tuple(min(255, channel + rng.randrange(6)) for channel in base))
+    return image
+
+
+@pytest.mark.parametrize("bands", [1, 2, 3, 7])
+@pytest.mark.parametrize("no_css", [False, True])
+@pytest.mark.parametrize("merge_rows", [False, True])
+@pytest.mark.parametrize("minify", [False, True])
+@pytest.mark.parametrize("tolerance", [0, 8])
+def test_banded_matches_serial(executor, bands, no_css, merge_rows, minify, tolerance):
+    # 23 rows, which none of the band counts above 1 divide evenly.
+    pixels = data.PixelAccessPillow(_noisy_blocks(31, 23, seed=bands))
+    serial_html, serial_css = io.StringIO(), io.StringIO()
+    serial_cells = write_html_css(
+        pixels.getruntable(tolerance), serial_html, serial_css, no_css, 3, "t", merge_rows, minify=minify
+    )
+    banded_html, banded_css = io.StringIO(), io.StringIO()
+    banded_cells = parallel.write_html_css_banded(
+        pixels, banded_html, banded_css, no_css, 3, "t", bands, executor, tolerance, "channel", merge_rows, minify
+    )
+    assert banded_html.getvalue() == serial_html.getvalue()
+    assert banded_css.getvalue() == serial_css.getvalue()
+    assert banded_cells == serial_cells
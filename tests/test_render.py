@@ -0,0 +1,115 @@
+"""
+Tests that tables rendered from cached fragments are the same as formatting every cell on its own.
+"""
+import io
+
+import pytest
+
+from tableimage import (
+    _rowspans, _Strings, _table_start, _to_palette, rgb_to_html, write_html_css, write_html_css_two_pass, data
+)
+
+
+_ROWS = [
+    [(3, (255, 0, 0)), (1, (17, 34, 51)), (2, (0, 0, 0))],
+    [(3, (255, 0, 0)), (1, (17, 34, 51)), (2, (0, 0, 0))],
+    [(1, (1, 2, 3)), (2, (255, 0, 0)), (3, (0, 0, 0))],
+    [(6, (17, 34, 51))],
+    [(6, (17, 34, 51))],
+    [(1, (300, -5, 12)), (5, (1, 2, 3))],
+]
+
+
+def _rowlist(rows):
+    rowlist = []
+    for row in rows:
+        rowlist.extend(row)
+        rowlist.append(data.RowDivider())
+    return rowlist
+
+
+def _reference(rows, no_css, pixel_size, table_id, merge_rows, minify):
+    """
+    Render the table and css the straightforward way, formatting every cell and rule on its own.
+    """
+    rowlist = _rowlist(rows)
+    palette = None if no_css else _to_palette(rowlist)
+    rowspans = _rowspans(rows) if merge_rows else [[1] * len(row) for row in rows]
+    quote = '' if minify else '"'
+    html = [_table_start(no_css, table_id, minify, sum(count for count, _ in rows[0]), pixel_size)]
+    for row, row_spans in zip(rows, rowspans):
+        if no_css:
+            style = 'height:{!s}px'.format(pixel_size) if minify else '"height:{!s}px;"'.format(pixel_size)
+            html.append('<tr style={}>'.format(style) if minify else '<tr style={}>\n'.format(style))
+        else:
+            html.append('<tr>' if minify else '<tr>\n')
+        for (count, colour), span in zip(row, row_spans):
+            if span == 0:
+                continue
+            spans = ''
+            if count > 1:
+                spans += ' colspan={0}{1!s}{0}'.format(quote, count)
+            if span > 1:
+                spans += ' rowspan={0}{1!s}{0}'.format(quote, span)
+            if no_css and minify:
+                html.append('<td style=background:{}{}>'.format(rgb_to_html(colour, True), spans))
+            elif no_css:
+                html.append('<td style="background:{};width:{!s}px;"{}/>\n'.format(rgb_to_html(colour), count*pixel_size, spans))
+            elif minify:
+                html.append('<td class={}{}>'.format(palette[colour], spans))
+            else:
+                html.append('<td style="width:{!s}px;" class="{}"{}/>\n'.format(count*pixel_size, palette[colour], spans))
+        if not minify:
+            html.append('</tr>\n')
+    html.append('</table>' if minify else '</table>\n')
+
+    css = []
+    if not no_css:
+        if minify:
+            css.append('#{0} tr{{height:{1!s}px}}#{0} col{{width:{1!s}px}}'.format(table_id, pixel_size))
+            for colour, cssclass in palette.items():
+                css.append('#{} .{}{{background:{}}}'.format(table_id, cssclass, rgb_to_html(colour, True)))
+        else:
+            css.append('table#{} tr{{height:{!s}px;}}\n'.format(table_id, pixel_size))
+            for colour, cssclass in palette.items():
+                css.append('table#{} td.{} {{background:{}; }}\n'.format(table_id, cssclass, rgb_to_html(colour)))
+    return "".join(html), "".join(css)
+
+
+@pytest.mark.parametrize("no_css", [False, True])
+@pytest.mark.parametrize("minify", [False, True])
+@pytest.mark.parametrize("merge_rows", [False, True])
+@pytest.mark.parametrize("pixel_size", [1, 3])
+def test_matches_straightforward_render(no_css, minify, merge_rows, pixel_size):
+    expected = _reference(_ROWS, no_css, pixel_size, "tbl", merge_rows, minify)
+    html, css = io.StringIO(), io.StringIO()
+    write_html_css(_rowlist(_ROWS), html, css, no_css, pixel_size, "tbl", merge_rows, minify=minify)
+    assert (html.getvalue(), css.getvalue()) == expected
+
+    html, css = io.StringIO(), io.StringIO()
+    write_html_css_two_pass(lambda: iter(_ROWS), html, css, no_css, pixel_size, "tbl", merge_rows, minify=minify)
+    assert (html.getvalue(), css.getvalue()) == expected
+
+
+@pytest.mark.parametrize("no_css", [False, True])
+@pytest.mark.parametrize("minify", [False, True])
+@pytest.mark.parametrize("merge_rows", [False, True])
+def test_run_table_matches_straightforward_render(no_css, minify, merge_rows):
+    # A RunTable keeps colours packed, so it cannot hold the out of range colour on the last row.
+    rows = _ROWS[:-1]
+    html, css = io.StringIO(), io.StringIO()
+    write_html_css(data.RunTable.from_rowlist(_rowlist(rows)), html, css, no_css, 3, "tbl", merge_rows, minify=minify)
+    assert (html.getvalue(), css.getvalue()) == _reference(rows, no_css, 3, "tbl", merge_rows, minify)
+
+
+def test_strings_are_worked_out_once_and_cleared_when_full():
+    calls = []
+
+    def function(key):
+        calls.append(key)
+        return str(key)
+    strings = _Strings(function, max_size=2)
+    assert [strings[1], strings[2], strings[1]] == ["1", "2", "1"]
+    assert calls == [1, 2]
+    assert strings[3] == "3"
+    assert dict(strings) == {3: "3"}
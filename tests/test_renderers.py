@@ -0,0 +1,83 @@
+"""
+Tests for the renderers other than tables.
+"""
+import base64
+import io
+import json
+import random
+import re
+
+import pytest
+
+from tableimage import data, renderers
+
+
+def _varints(payload):
+    values, value, shift = [], 0, 0
+    for byte in payload:
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            values.append(value)
+            value, shift = 0, 0
+    assert shift == 0, "payload ends in the middle of a varint"
+    return values
+
+
+def _hex_colour(value):
+    value = value.lstrip("#")
+    if len(value) == 3:
+        value = "".join(digit * 2 for digit in value)
+    return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def _decode_canvas(html):
+    """
+    Turn the canvas renderer's payload back into (width, height, rows of (count, colour) runs), like the inline script does.
+    """
+    match = re.search(r'atob\("([A-Za-z0-9+/=]*)"\),c=(\[.*?\]),w=(\d+),h=(\d+),p=(\d+),', html)
+    colours = [_hex_colour(colour) for colour in json.loads(match.group(2))]
+    width, height = int(match.group(3)), int(match.group(4))
+    values = _varints(base64.b64decode(match.group(1)))
+    rows, row, x = [], [], 0
+    for count, index in zip(values[::2], values[1::2]):
+        row.append((count, colours[index]))
+        x += count
+        if x >= width:
+            rows.append(row)
+            row, x = [], 0
+    assert row == [] and len(values) % 2 == 0
+    return width, height, rows
+
+
+def _noisy_table(width, height, seed):
+    rng = random.Random(seed)
+    table = data.RunTable()
+    for y in range(height):
+        if y % 5 == 0:  # A run long enough for a varint of more than one byte.
+            table.append_row([(width, (y, 0, 0))])
+            continue
+        row, x = [], 0
+        while x < width:
+            count = min(width - x, rng.choice([1, 1, 2, 3]))
+            row.append((count, (rng.randrange(256), rng.randrange(256), rng.randrange(256))))
+            x += count
+        table.append_row(row)
+    return table
+
+
+@pytest.mark.parametrize("width, height", [(1, 1), (7, 3), (300, 200)])
+def test_canvas_payload_decodes_to_runs(width, height):
+    # 300x200 has tens of thousands of runs and colours, so the payload is written in several blocks and the colour indices
+    # take up to three bytes.
+    table = _noisy_table(width, height, 0)
+    html = io.StringIO()
+    assert renderers.renderers["canvas"](pixel_size=2).write(table, html, io.StringIO(), "cnv") == 2
+    assert _decode_canvas(html.getvalue()) == (width, height, list(table.iterrows()))
+
+
+def test_canvas_payload_from_rowlist():
+    table = _noisy_table(9, 4, 1)
+    html = io.StringIO()
+    renderers.renderers["canvas"]().write(table.tolist(), html, io.StringIO(), "cnv")
+    assert _decode_canvas(html.getvalue()) == (9, 4, list(table.iterrows()))
@@ -0,0 +1,82 @@
+"""
+Tests that the runs found with NumPy are the same as the ones found one pixel at a time in pure Python.
+"""
+import random
+
+import pytest
+from PIL import Image
+
+from tableimage import data
+
+np = pytest.importorskip("numpy")
+
+
+_MATCHING = [(0, "channel"), (1, "channel"), (40, "channel"), (5, "cie76"), (25, "cie76")]
+
+_SIZES = [(1, 1), (1, 17), (17, 1), (23, 19)]
+
+
+def _random_image(width, height, seed):
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height))
+    image.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(width * height)])
+    return image
+
+
+def _close_image(width, height, seed):
+    """
+    A random image where neighbouring pixels are close in colour, so tolerant runs are neither all one pixel nor all one run.
+    """
+    rng = random.Random(seed)
+    pixels = []
+    for _ in range(height):
+        colour = [rng.randrange(256) for _ in range(3)]
+        for _ in range(width):
+            colour = [min(255, max(0, value + rng.randrange(-12, 13))) for value in colour]
+            pixels.append(tuple(colour))
+    image = Image.new("RGB", (width, height))
+    image.putdata(pixels)
+    return image
+
+
+def _flat_image(width, height, seed):
+    return Image.new("RGB", (width, height), (seed * 40 % 256, 7, 200))
+
+
+def _pure_python(image, tolerance, metric):
+    """
+    The runs worked out one pixel at a time, as PixelAccess does without NumPy.
+    """
+    pixels = data.PixelAccessPillow(image)
+    table = data.RunTable()
+    for row in data.PixelAccess.itercontiguousrows(pixels, tolerance, metric):
+        table.append_row(row)
+    return table
+
+
+@pytest.mark.parametrize("make_image", [_random_image, _close_image, _flat_image])
+@pytest.mark.parametrize("size", _SIZES, ids=lambda size: "{}x{}".format(*size))
+@pytest.mark.parametrize("tolerance, metric", _MATCHING)
+def test_encode_rgb_array_matches_pure_python(make_image, size, tolerance, metric):
+    for seed in range(3):
+        image = make_image(*size, seed)
+        table = data._encode_rgb_array(np.asarray(image), tolerance, metric)
+        assert table == _pure_python(image, tolerance, metric)
+        assert data.PixelAccessPillow(image).getcontiguousrows(tolerance, metric) == table.tolist()
+
+
+@pytest.mark.parametrize("make_image", [_random_image, _close_image, _flat_image])
+@pytest.mark.parametrize("size", _SIZES, ids=lambda size: "{}x{}".format(*size))
+def test_run_table_matches_pure_python(make_image, size, monkeypatch):
+    image = make_image(*size, 1)
+    table = data._encode_rgb_array(np.asarray(image))
+    rowlist = table.tolist()
+    # The same buffers whether they are copied in bulk from NumPy or built up one run at a time.
+    assert table == data.RunTable.from_rowlist(rowlist)
+    assert table == data.RunTable.from_arrays(list(table.lengths), list(table.colours), list(table.row_offsets))
+    assert list(table) == rowlist
+    assert [run for row in table.iterrows() for run in row + [data.RowDivider()]] == rowlist
+    assert (table.getwidth(), table.getheight(), len(table)) == (size[0], size[1], len(rowlist))
+    counts = table.colour_counts()
+    monkeypatch.setattr(data, "_has_numpy", False)
+    assert list(table.colour_counts().items()) == list(counts.items())
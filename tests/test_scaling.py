@@ -0,0 +1,54 @@
+"""
+Tests for scaling images down with PixelAccessPillow (width, height and max_cells).
+"""
+import random
+
+import pytest
+from PIL import Image
+
+from tableimage import data
+
+
+def _blocky_image(width, height, seed=0):
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height))
+    for y in range(0, height, 4):
+        for x in range(0, width, 4):
+            image.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (x, y, x + 4, y + 4))
+    return image
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "no-numpy"])
+def numpy_enabled(request, monkeypatch):
+    if request.param and not data._has_numpy:
+        pytest.skip("NumPy is not installed")
+    monkeypatch.setattr(data, "_has_numpy", request.param)
+    return request.param
+
+
+def _covers(table, size):
+    assert table.getheight() == size[1]
+    assert all(sum(length for length, _ in row) == size[0] for row in table.iterrows())
+
+
+def test_width_and_height(numpy_enabled):
+    pixels = data.PixelAccessPillow(_blocky_image(64, 32), width=16)
+    assert pixels.getsize() == (16, 8)
+    _covers(pixels.getruntable(), (16, 8))
+    pixels = data.PixelAccessPillow(_blocky_image(64, 32), width=16, height=4)
+    assert pixels.getsize() == (8, 4)
+
+
+@pytest.mark.parametrize("max_cells", [1, 10, 100, 10000])
+def test_max_cells(numpy_enabled, max_cells):
+    pixels = data.PixelAccessPillow(_blocky_image(40, 40), max_cells=max_cells)
+    table = pixels.getruntable()
+    assert table.run_count() <= max_cells
+    _covers(table, pixels.getsize())
+
+
+def test_contiguous_rows_with_max_cells(numpy_enabled):
+    image = _blocky_image(40, 24)
+    rows = data.PixelAccessPillow(image, max_cells=50).getcontiguousrows()
+    assert sum(isinstance(run, data.RowDivider) for run in rows) > 0
+    assert list(data.PixelAccessPillow(image, max_cells=50).itercontiguousrows())
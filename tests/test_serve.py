@@ -0,0 +1,86 @@
+"""
+Tests for the conversion server, run on an ephemeral port with a real worker process.
+"""
+import asyncio
+import contextlib
+import io
+
+from PIL import Image
+
+from tableimage._exec import serve
+
+
+def _png():
+    image = Image.new("RGB", (4, 3), (255, 0, 0))
+    image.putpixel((1, 1), (0, 0, 255))
+    f = io.BytesIO()
+    image.save(f, "PNG")
+    return f.getvalue()
+
+
+class _GatedPool(serve.WorkerPool):
+    """
+    WorkerPool which holds on to every request until gate is set, so the server's slots stay full.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gate = asyncio.Event()
+        self.borrowed = asyncio.Event()
+
+    @contextlib.asynccontextmanager
+    async def worker(self):
+        self.borrowed.set()
+        await self.gate.wait()
+        async with super().worker() as worker:
+            yield worker
+
+
+async def _post(port, body, query=""):
+    """
+    POST body to /convert, returning the status and the (still chunked) body of the response.
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"POST /convert%s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n" % (query.encode(), len(body)))
+    writer.write(body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, rest = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ")[1]), rest
+
+
+async def _serving(pool, check, max_queue):
+    await pool.start()
+    try:
+        server = serve.ConversionServer(pool, max_concurrency=1, max_queue=max_queue, max_body=1 << 20, timeout=10)
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        async with listener:
+            await asyncio.wait_for(check(listener.sockets[0].getsockname()[1], pool), 60)
+    finally:
+        pool.close()
+
+
+def test_converts_image():
+    async def check(port, pool):
+        status, body = await _post(port, _png(), "?no_css=1")
+        assert status == 200
+        assert b"<table" in body and b"background:#0000ff" in body
+        status, body = await _post(port, b"not an image")
+        assert status == 400
+        assert b"UnidentifiedImageError" in body
+    asyncio.run(_serving(serve.WorkerPool(1), check, 4))
+
+
+def test_503_when_queue_is_full():
+    async def check(port, pool):
+        first = asyncio.ensure_future(_post(port, _png()))
+        # The first request has the only slot, and nothing can wait for it.
+        await pool.borrowed.wait()
+        status, body = await _post(port, _png())
+        assert status == 503
+        assert b"too many conversions" in body
+        pool.gate.set()
+        status, body = await first
+        assert status == 200
+        assert b"<style>" in body
+    asyncio.run(_serving(_GatedPool(1), check, 0))